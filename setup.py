@@ -25,6 +25,7 @@ setup(
         'beautifulsoup4==4.11.1',
         'lxml>=4.9.1, <=4.9.2',
         'pyppeteer==1.0.2',
+        'soupsieve>1.2',
     ],
     entry_points={
         'console_scripts': [
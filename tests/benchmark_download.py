@@ -0,0 +1,63 @@
+"""使用本地模拟的微信读书网站基准测试`download`的吞吐量.
+
+需要安装Chromium(第一次运行pyppeteer时会自动下载).
+
+Example:
+    ```shell
+    python tests/benchmark_download.py --latency 0.05 --failure-rate 0.1
+    ```
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from mock_weread import MockWeRead
+
+sys.path.insert(0, str(Path(__file__).absolute().parents[1]))
+from weread import check, download  # noqa: E402
+
+RDATA_FILE = Path(__file__).parent / 'assets' / '怦然心动（精装纪念版）.rdata.zip'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rdata-file', default=RDATA_FILE,
+                        help='作为数据源的原始数据文件.')
+    parser.add_argument('--name', default='怦然心动', help='下载的图书名称.')
+    parser.add_argument('--latency', type=float, default=0,
+                        help='章节接口和图片的响应延迟(秒).')
+    parser.add_argument('--failure-rate', type=float, default=0,
+                        help='章节接口和图片返回500错误的概率.')
+    parser.add_argument('--delay', type=float, default=0,
+                        help='传递给`download`的延时(秒).')
+    parser.add_argument('--seed', type=int, default=0, help='注入失败使用的随机种子.')
+    args = parser.parse_args()
+
+    with MockWeRead([args.rdata_file],
+                    latency=args.latency,
+                    failure_rate=args.failure_rate,
+                    seed=args.seed) as server, \
+            TemporaryDirectory() as temp_dir:
+        os.environ['WEREAD_URL'] = server.url
+        chapter_count = len(next(iter(server.books.values())).chapter_infos)
+
+        start_time = time.perf_counter()
+        rdata_file_path = asyncio.run(download(args.name,
+                                               Path(temp_dir, 'book.rdata.zip'),  # noqa: E501
+                                               headless=True,
+                                               delay=args.delay,
+                                               profile_dir=Path(temp_dir, 'profile')))  # noqa: E501
+        elapsed_time = time.perf_counter() - start_time
+
+        print(f'章节: {chapter_count}, 耗时: {elapsed_time:.2f}s, '
+              f'吞吐量: {chapter_count / elapsed_time:.2f}章/s')
+        print(f'请求: {server.requests}')
+        print(f'完整性检查: {check(rdata_file_path)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""基准测试`generate`在展示详细信息时日志的额外开销.
+
+交替运行安静模式和详细模式的`generate`, 比较两者的中位数耗时;
+日志通过`setup_logging`配置的队列在后台线程中输出.
+
+Example:
+    ```shell
+    python tests/benchmark_logging.py --repeat 5 --json-lines
+    ```
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+sys.path.insert(0, str(Path(__file__).absolute().parents[1]))
+from weread import generate, setup_logging  # noqa: E402
+from weread.log import shutdown_logging  # noqa: E402
+
+RDATA_FILE = Path(__file__).parent / 'assets' / '怦然心动（精装纪念版）.rdata.zip'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rdata-file', default=RDATA_FILE,
+                        help='用于生成ePub文件的原始数据文件.')
+    parser.add_argument('--repeat', type=int, default=5, help='每种模式运行的次数.')
+    parser.add_argument('--json-lines', action='store_true',
+                        help='使用JSON Lines格式输出日志.')
+    args = parser.parse_args()
+
+    with open(os.devnull, 'w') as devnull, TemporaryDirectory() as temp_dir:
+        setup_logging(json_lines=args.json_lines, stream=devnull)
+        epub_file = Path(temp_dir, 'book.epub')
+
+        timings = {False: [], True: []}
+        for i in range(args.repeat):
+            # 交替两种模式的先后顺序, 减少缓存和频率变化的影响.
+            for verbose in ((False, True) if i % 2 == 0 else (True, False)):
+                start_time = time.perf_counter()
+                generate(args.rdata_file, verbose, output=epub_file, workers=1)  # noqa: E501
+                timings[verbose].append(time.perf_counter() - start_time)
+
+        quiet = statistics.median(timings[False])
+        verbose = statistics.median(timings[True])
+        shutdown_logging()  # 输出队列中剩余的日志后再关闭文件.
+        print(f'安静模式: {quiet:.3f}s, 详细模式: {verbose:.3f}s, '
+              f'额外开销: {(verbose / quiet - 1) * 100:+.2f}%')
+
+
+if __name__ == '__main__':
+    main()
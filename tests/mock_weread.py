@@ -0,0 +1,284 @@
+"""本地模拟的微信读书网站, 用于离线测试和基准测试`download`.
+
+模拟网站使用原始数据文件作为数据源, 提供:
+    - 登录页(已登录状态, 包含头像导航栏和扫码登录图片)和书架(`a.shelfBook`);
+    - 阅读器页面, `#app`上挂载类似Vue的store(`bookInfo`, `chapterInfos`,
+      `chapterContentHtml`, `chapterContentStyles`),
+      `#routerView`上挂载`changeChapter`;
+    - 章节接口和图片, 支持设置延迟和注入失败;
+    - 章节内容延迟加载, 切换章节时先更新uid, 再更新章节内容.
+
+Example:
+    ```shell
+    python tests/mock_weread.py tests/assets/怦然心动（精装纪念版）.rdata.zip
+    ```
+"""
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Union
+from zipfile import ZipFile
+
+# 1x1像素的透明PNG图片, 用作扫码登录图片.
+_QRCODE_PNG = ('data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAQAAAC1'
+               'HAwCAAAAC0lEQVR42mNkYAAAAAYAAjCB0C8AAAAASUVORK5CYII=')
+
+_HOME_HTML = '''<!DOCTYPE html>
+<html>
+<head><meta charset="UTF-8"><title>微信读书</title></head>
+<body>
+  <div class="wr_avatar navBar_avatar"></div>
+  <img alt="扫码登录" src="{qrcode}">
+  <a class="bookshelf_preview_header_link" href="javascript:void(0)">我的书架</a>
+  <div class="shelf">{shelf_books}</div>
+</body>
+</html>'''
+
+_READER_HTML = '''<!DOCTYPE html>
+<html>
+<head><meta charset="UTF-8"><title>{title}</title></head>
+<body>
+  <div id="app">
+    <div id="routerView"><div class="readerChapterContent"></div></div>
+  </div>
+  <script>
+    const state = {{ reader: {reader} }};
+    const content = document.querySelector('.readerChapterContent');
+
+    function render() {{
+      content.innerHTML = state.reader.chapterContentHtml.join('');
+      content.querySelectorAll('img[data-src]').forEach((img) => {{
+        img.src = img.dataset.src;
+      }});
+    }}
+
+    document.getElementById('app').__vue__ = {{ $store: {{ state }} }};
+    function loadContent(chapterUid) {{
+      const xhr = new XMLHttpRequest();
+      xhr.open('GET', '/api/chapter/{book_id}/' + chapterUid, false);
+      xhr.send();
+      if (xhr.status !== 200) {{
+        return false;  // 模拟网络错误, 保持当前章节.
+      }}
+      state.reader.chapterContentHtml = JSON.parse(xhr.responseText);
+      render();
+      return true;
+    }}
+
+    document.getElementById('routerView').__vue__ = {{
+      changeChapter({{ chapterUid }}) {{
+        const chapter = state.reader.chapterInfos.find(
+          (chapter) => chapter.chapterUid === chapterUid
+        );
+        if ({content_delay} > 0) {{
+          // uid先更新, 章节内容稍后才加载完成.
+          state.reader.currentChapter = chapter;
+          setTimeout(() => loadContent(chapterUid), {content_delay});
+        }} else if (loadContent(chapterUid)) {{
+          state.reader.currentChapter = chapter;
+        }}
+      }}
+    }};
+    render();
+  </script>
+</body>
+</html>'''
+
+
+class _Book(object):
+    """模拟网站中的单本图书, 数据来自原始数据文件.
+
+    Args:
+        rdata_file: str or os.PathLike,
+            原始数据文件.
+    """
+    def __init__(self, rdata_file: Union[str, os.PathLike]):
+        self.rdata = ZipFile(rdata_file)
+        self.book_info = json.loads(self.rdata.read('content.json'))
+        self.chapter_infos = json.loads(self.rdata.read('toc.json'))
+        self.styles = self.rdata.read('Styles/stylesheet.css').decode()
+        self.book_id = str(self.book_info['bookId'])
+        self.lock = threading.Lock()
+
+    def read(self, name: str) -> bytes:
+        with self.lock:  # ZipFile不能在多个线程中同时读取.
+            return self.rdata.read(name)
+
+    def chapter_pages(self, uid: int, url: str) -> List[str]:
+        """章节内容的html, 分成两页并将图片地址替换成模拟网站的地址."""
+        html = self.read(f'Text/chapter-{uid}.html').decode()
+        html = re.sub(r'data-src="[^"]*/([^"/]+)"',
+                      rf'data-src="{url}/wrepub/\1"',
+                      html)
+        middle = html.find('\n', len(html) // 2) + 1 or len(html)
+
+        return [html[:middle], html[middle:]]
+
+    def reader_state(self, url: str) -> Dict:
+        """阅读器的初始状态."""
+        book_info = dict(self.book_info, cover=f'{url}/cover/s_{self.book_id}.jpg')  # noqa: E501
+        first_chapter = self.chapter_infos[0]
+
+        return {
+            'bookInfo': book_info,
+            'chapterInfos': self.chapter_infos,
+            'chapterContentStyles': self.styles,
+            'currentChapter': first_chapter,
+            'chapterContentHtml': self.chapter_pages(first_chapter['chapterUid'], url)  # noqa: E501
+        }
+
+
+class MockWeRead(object):
+    """本地模拟的微信读书网站.
+
+    Example:
+        ```python
+        with MockWeRead(['怦然心动.rdata.zip'], latency=0.01) as server:
+            os.environ['WEREAD_URL'] = server.url
+            asyncio.run(download('怦然心动',
+                                 headless=True,
+                                 profile_dir='./profile'))
+        ```
+
+    Args:
+        rdata_files: list of str or os.PathLike,
+            作为数据源的原始数据文件.
+        latency: float, default=0,
+            章节接口和图片的响应延迟(秒).
+        failure_rate: float, default=0,
+            章节接口和图片返回500错误的概率.
+        seed: int, default=None,
+            注入失败使用的随机种子.
+        content_delay: float, default=0,
+            切换章节时, 章节的uid更新之后章节内容延迟加载的时间(秒).
+    """
+    def __init__(self,
+                 rdata_files: List[Union[str, os.PathLike]],
+                 latency: float = 0,
+                 failure_rate: float = 0,
+                 seed: Optional[int] = None,
+                 content_delay: float = 0):
+        self.books = {book.book_id: book for book in map(_Book, rdata_files)}
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.content_delay = content_delay
+        self.random = random.Random(seed)
+        self.requests = {'chapter': 0, 'image': 0, 'failure': 0}
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        daemon=True)
+
+    @property
+    def url(self) -> str:
+        """模拟网站的地址."""
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self) -> 'MockWeRead':
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        for book in self.books.values():
+            book.rdata.close()
+
+    def __enter__(self) -> 'MockWeRead':
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _inject(self, kind: str) -> bool:
+        """模拟延迟并判断是否注入失败."""
+        self.requests[kind] += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if self.random.random() < self.failure_rate:
+            self.requests['failure'] += 1
+            return True
+
+        return False
+
+    def _handler(self) -> type:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, body: Union[str, bytes], content_type: str):
+                if isinstance(body, str):
+                    body = body.encode()
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('Cache-Control', 'max-age=3600')
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                path = self.path.split('?')[0]
+                parts = path.strip('/').split('/')
+                try:
+                    if path == '/':
+                        shelf_books = ''.join(
+                            f'<a class="shelfBook" href="{server.url}/web/reader/{book.book_id}">'  # noqa: E501
+                            f'{book.book_info["title"]}</a>'
+                            for book in server.books.values()
+                        )
+                        self._send(_HOME_HTML.format(qrcode=_QRCODE_PNG,
+                                                     shelf_books=shelf_books),
+                                   'text/html; charset=utf-8')
+                    elif parts[:2] == ['web', 'reader']:
+                        book = server.books[parts[2]]
+                        reader = json.dumps(book.reader_state(server.url))
+                        self._send(_READER_HTML.format(
+                            title=book.book_info['title'],
+                            book_id=book.book_id,
+                            content_delay=int(server.content_delay * 1000),
+                            reader=reader.replace('</', '<\\/')
+                        ), 'text/html; charset=utf-8')
+                    elif parts[:2] == ['api', 'chapter']:
+                        if server._inject('chapter'):
+                            return self.send_error(500)
+                        book = server.books[parts[2]]
+                        pages = book.chapter_pages(int(parts[3]), server.url)
+                        self._send(json.dumps(pages), 'application/json')
+                    elif parts[0] == 'cover':
+                        if server._inject('image'):
+                            return self.send_error(500)
+                        book = server.books[parts[1][2:].split('.')[0]]  # `o_图书ID.jpg`.  # noqa: E501
+                        self._send(book.read('Images/coverpage.jpg'),
+                                   'image/jpeg')
+                    elif parts[0] == 'wrepub':
+                        if server._inject('image'):
+                            return self.send_error(500)
+                        for book in server.books.values():
+                            if f'Images/{parts[1]}.jpg' in book.rdata.namelist():  # noqa: E501
+                                return self._send(book.read(f'Images/{parts[1]}.jpg'),  # noqa: E501
+                                                  'image/jpeg')
+                        self.send_error(404)
+                    else:
+                        self.send_error(404)
+                except (KeyError, ValueError, IndexError):
+                    self.send_error(404)
+
+        return Handler
+
+
+if __name__ == '__main__':
+    with MockWeRead(sys.argv[1:]) as mock_server:
+        print(f'模拟的微信读书网站: {mock_server.url}')
+        print(f'使用`WEREAD_URL={mock_server.url}`运行`download`.')
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,43 @@
+"""创建用于测试的小型原始数据文件."""
+import json
+import os
+from zipfile import ZIP_DEFLATED, ZIP_STORED, ZipFile
+
+RDATA_FILE = 'tests/assets/怦然心动（精装纪念版）.rdata.zip'
+
+
+def small_rdata(rdata_file, chapters=3):
+    """使用测试图书的元信息, 样式表, 封面和开头几个短小的章节创建原始数据文件.
+
+    最后一章引用一张图片`Images/figure.jpg`, 完整生成只需要很短的时间.
+
+    Args:
+        rdata_file: str or os.PathLike,
+            创建的原始数据文件.
+        chapters: int, default=3,
+            保留的章节数量.
+
+    Return:
+        保留的章节信息.
+    """
+    with ZipFile(RDATA_FILE) as source, \
+            ZipFile(rdata_file, 'w', ZIP_DEFLATED) as rdata:
+        chapter_infos = json.loads(source.read('toc.json'))[:chapters]
+        rdata.writestr('content.json', source.read('content.json'))
+        rdata.writestr('toc.json', json.dumps(chapter_infos))
+        rdata.writestr('Styles/stylesheet.css',
+                       source.read('Styles/stylesheet.css'))
+        rdata.writestr('Images/coverpage.jpg',
+                       source.read('Images/coverpage.jpg'),
+                       compress_type=ZIP_STORED)
+        rdata.writestr('Images/figure.jpg',
+                       b'\xff\xd8\xff' + os.urandom(1024) + b'\xff\xd9',
+                       compress_type=ZIP_STORED)
+        for i, chapter_info in enumerate(chapter_infos):
+            chapter_file = f'Text/chapter-{chapter_info["chapterUid"]}.html'
+            html = source.read(chapter_file)
+            if i == len(chapter_infos) - 1:
+                html += b'<img data-src="https://res.weread.qq.com/figure"/>'
+            rdata.writestr(chapter_file, html)
+
+    return chapter_infos
@@ -0,0 +1,114 @@
+"""测试批量下载的任务队列功能."""
+import asyncio
+import json
+import time
+from pathlib import Path
+from zipfile import ZIP_DEFLATED, ZipFile
+
+import weread.core.batch as batch_module
+from weread import download_many
+
+
+class FakeBrowser(object):
+    def __init__(self):
+        self.closed = False
+
+    async def close(self):
+        self.closed = True
+
+
+def _mock_browser(monkeypatch, book_urls):
+    """替换启动浏览器和查找图书, 不需要真实的浏览器和微信读书账户."""
+    browser = FakeBrowser()
+
+    async def _launch_browser(headless, incognito, profile_dir):
+        return browser, None
+
+    async def _find_books(page, names):
+        return {name: url for name, url in book_urls.items() if name in names}
+
+    monkeypatch.setattr(batch_module, '_launch_browser', _launch_browser)
+    monkeypatch.setattr(batch_module, '_find_books', _find_books)
+
+    return browser
+
+
+class TestBatch(object):
+    def test_download_many_quota(self, tmp_path):
+        """测试超出每日配额时只加入任务队列, 不启动浏览器."""
+        queue_file = tmp_path / 'weread-queue.json'
+        queue_file.write_text(json.dumps({'jobs': [
+            {'name': f'图书{i}', 'status': 'done', 'started_at': time.time(),
+             'finished_at': time.time(), 'rdata_file': None, 'error': None}
+            for i in range(3)
+        ]}), encoding='utf-8')
+
+        assert asyncio.run(download_many(['怦然心动', '图书0'],
+                                         queue_file=queue_file,
+                                         info=True)) == []
+
+        jobs = json.loads(queue_file.read_text(encoding='utf-8'))['jobs']
+        assert [job['name'] for job in jobs] == ['图书0', '图书1', '图书2', '怦然心动']  # noqa: E501
+        assert jobs[-1]['status'] == 'pending'
+
+    def test_download_many_retry(self, tmp_path, monkeypatch):
+        """测试下载失败时关闭并删除不完整的原始数据文件, 再次运行时重新下载失败的任务."""
+        queue_file = tmp_path / 'weread-queue.json'
+        _mock_browser(monkeypatch, {'怦然心动': 'https://weread/book'})
+        opened = []
+
+        async def _download_text(page, book_url, rdata_file_path,
+                                 rate_limiter, verbose, rdata_dir):
+            rdata_file_path = Path(rdata_dir, '怦然心动.rdata.zip')
+            rdata_file = ZipFile(rdata_file_path, 'w', ZIP_DEFLATED)
+            rdata_file.writestr('Text/chapter-1.html', '<p>第一章</p>')
+            opened.append(rdata_file)
+            return rdata_file, rdata_file_path, {}, set()
+
+        def _save_book_failed(rdata_file, *args):
+            raise ConnectionResetError('连接被重置')
+
+        monkeypatch.setattr(batch_module, '_download_text', _download_text)
+        monkeypatch.setattr(batch_module, '_save_book', _save_book_failed)
+        assert asyncio.run(download_many(['怦然心动'],
+                                         rdata_dir=tmp_path,
+                                         queue_file=queue_file,
+                                         interval=0,
+                                         cache_images=False)) == []
+        jobs = json.loads(queue_file.read_text(encoding='utf-8'))['jobs']
+        assert jobs[0]['status'] == 'failed'
+        assert jobs[0]['error'] == '连接被重置'
+        assert opened[0].fp is None
+        assert not (tmp_path / '怦然心动.rdata.zip').exists()
+
+        # 再次运行时, 失败的任务重新等待下载.
+        monkeypatch.setattr(batch_module, '_save_book',
+                            lambda rdata_file, *args: rdata_file.close())
+        rdata_file_path = (tmp_path / '怦然心动.rdata.zip').absolute()
+        assert asyncio.run(download_many(['怦然心动'],
+                                         rdata_dir=tmp_path,
+                                         queue_file=queue_file,
+                                         interval=0,
+                                         cache_images=False)) == [rdata_file_path]  # noqa: E501
+        jobs = json.loads(queue_file.read_text(encoding='utf-8'))['jobs']
+        assert jobs[0]['status'] == 'done'
+        assert jobs[0]['error'] is None
+        assert jobs[0]['rdata_file'] == str(rdata_file_path)
+        assert ZipFile(rdata_file_path).namelist() == ['Text/chapter-1.html']
+
+    def test_download_many_not_found(self, tmp_path, monkeypatch):
+        """测试书架中没有找到的图书记录为失败, 不占用每日配额."""
+        queue_file = tmp_path / 'weread-queue.json'
+        browser = _mock_browser(monkeypatch, {})
+
+        assert asyncio.run(download_many(['不存在的图书'],
+                                         rdata_dir=tmp_path,
+                                         queue_file=queue_file,
+                                         daily_quota=1,
+                                         cache_images=False)) == []
+        jobs = json.loads(queue_file.read_text(encoding='utf-8'))['jobs']
+        assert jobs[0]['status'] == 'failed'
+        assert jobs[0]['error'] == 'not found'
+        assert jobs[0]['started_at'] is None
+        assert list(tmp_path.iterdir()) == [queue_file]
+        assert browser.closed
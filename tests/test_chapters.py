@@ -0,0 +1,31 @@
+"""测试逐章遍历原始数据文件功能."""
+import json
+from zipfile import ZipFile
+
+from weread import iter_chapters
+
+
+class TestChapters(object):
+    def test_iter_chapters(self):
+        """测试逐章遍历原始数据文件."""
+        rdata_file = 'tests/assets/怦然心动（精装纪念版）.rdata.zip'
+        chapter_infos = json.loads(ZipFile(rdata_file).read('toc.json'))
+        namelist = ZipFile(rdata_file).namelist()
+
+        chapters = iter_chapters(rdata_file)
+        chapter = next(chapters)
+        assert chapter.uid == chapter_infos[0]['chapterUid']
+        assert chapter.title == chapter_infos[0]['title']
+        assert chapter.content.startswith('<?xml')
+        assert 'data-wr-co' not in chapter.content
+        chapters.close()
+
+        # 测试纯文本格式.
+        chapters = list(iter_chapters(rdata_file, mode='text'))
+        assert [chapter.uid for chapter in chapters] == [
+            chapter_info['chapterUid'] for chapter_info in chapter_infos
+        ]
+        for chapter in chapters:
+            assert '<' not in chapter.content
+            for image in chapter.images:
+                assert image in namelist
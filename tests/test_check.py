@@ -1,7 +1,21 @@
 """测试检查功能."""
+import asyncio
+import json
+from zipfile import ZIP_STORED, ZipFile
+
 import pytest
 
-from weread import check
+from weread import AsyncProgress, acheck, check
+
+RDATA_FILE = 'tests/assets/怦然心动（精装纪念版）.rdata.zip'
+
+
+def _corrupt_rdata(rdata_file, corrupted_files):
+    """复制原始数据文件, 并替换部分文件的内容."""
+    with ZipFile(RDATA_FILE) as source, ZipFile(rdata_file, 'w') as target:
+        for file in source.infolist():
+            data = source.read(file)
+            target.writestr(file, corrupted_files.get(file.filename, lambda data: data)(data))  # noqa: E501
 
 
 class TestCheck(object):
@@ -22,3 +36,92 @@ class TestCheck(object):
             check('./book.rdata.zip')
         assert pytest_exit.type is SystemExit
         assert pytest_exit.value.code == 1
+
+    def test_acheck(self):
+        """测试异步检查rdata文件的完整性."""
+        async def _acheck():
+            progress = AsyncProgress()
+            task = asyncio.create_task(acheck(
+                rdata_file='tests/assets/怦然心动（精装纪念版）.rdata.zip',
+                progress=progress
+            ))
+            progress_list = [item async for item in progress]
+
+            return await task, progress_list
+
+        status, progress_list = asyncio.run(_acheck())
+        assert status is True
+        assert progress_list[-1].current == progress_list[-1].total
+        assert len(progress_list) == progress_list[-1].total
+
+    def test_check_deep(self, tmp_path):
+        """测试深度校验原始数据文件, 并生成JSON格式的校验报告."""
+        report_file = tmp_path / 'report.json'
+        assert check(RDATA_FILE,
+                     verbose=True,
+                     deep=True,
+                     workers=4,
+                     report_file=report_file) is True
+        report = json.loads(report_file.read_text(encoding='utf-8'))
+        assert report['status'] is True
+        assert report['files'] == 22
+        assert report['errors'] == []
+
+        # 图片被截断, 章节不是合法的UTF-8文本(CRC仍然正确).
+        rdata_file = tmp_path / 'corrupted.rdata.zip'
+        _corrupt_rdata(rdata_file, {
+            'Images/coverpage.jpg': lambda data: data[:len(data) // 2],
+            'Text/chapter-2.html': lambda data: data[:-1] + b'\xff'
+        })
+        assert check(rdata_file) is True  # 文件名都存在, 普通检查无法发现.
+        assert check(rdata_file, deep=True, report_file=report_file) is False
+        report = json.loads(report_file.read_text(encoding='utf-8'))
+        assert [error['file'] for error in report['errors']] == ['Text/chapter-2.html', 'Images/coverpage.jpg']  # noqa: E501
+
+    def test_check_deep_crc(self, tmp_path):
+        """测试深度校验发现CRC错误."""
+        rdata_file = tmp_path / 'corrupted.rdata.zip'
+        with ZipFile(RDATA_FILE) as source, ZipFile(rdata_file, 'w') as target:
+            for file in source.infolist():
+                data = source.read(file)
+                file.compress_type = ZIP_STORED
+                target.writestr(file, data)
+            file = target.getinfo('Styles/stylesheet.css')
+
+        # 修改未压缩的样式表中的一个字节(跳过30字节的文件头, 文件名和扩展字段).
+        with open(rdata_file, 'r+b') as fp:
+            fp.seek(file.header_offset + 30 + len(file.filename) + len(file.extra) + 8)  # noqa: E501
+            byte = fp.read(1)
+            fp.seek(-1, 1)
+            fp.write(bytes([byte[0] ^ 0x01]))
+
+        status = asyncio.run(acheck(rdata_file, deep=True, report_file='-'))
+        assert status is False
+
+    def test_check_deep_corrupted_chapter(self, tmp_path):
+        """测试逐章检查读到损坏的章节时不中断, 深度校验仍然保存报告."""
+        rdata_file = tmp_path / 'corrupted.rdata.zip'
+        with ZipFile(RDATA_FILE) as source, ZipFile(rdata_file, 'w') as target:
+            for file in source.infolist():
+                data = source.read(file)
+                file.compress_type = ZIP_STORED
+                target.writestr(file, data)
+            file = target.getinfo('Text/chapter-2.html')
+
+        # 修改未压缩的章节中的一个字节.
+        with open(rdata_file, 'r+b') as fp:
+            fp.seek(file.header_offset + 30 + len(file.filename) + len(file.extra) + 8)  # noqa: E501
+            byte = fp.read(1)
+            fp.seek(-1, 1)
+            fp.write(bytes([byte[0] ^ 0x01]))
+
+        report_file = tmp_path / 'report.json'
+        assert check(rdata_file, deep=True, report_file=report_file) is False
+        report = json.loads(report_file.read_text(encoding='utf-8'))
+        assert report['status'] is False
+        assert [error['file'] for error in report['errors']] == ['Text/chapter-2.html']  # noqa: E501
+
+        report_file.unlink()
+        assert asyncio.run(acheck(rdata_file, deep=True,
+                                  report_file=report_file)) is False
+        assert report_file.exists()
@@ -0,0 +1,91 @@
+"""测试下载功能中不依赖微信读书网站的部分."""
+import importlib
+import io
+import json
+import socket
+from urllib.error import URLError
+from zipfile import ZipFile
+
+from mock_weread import MockWeRead
+
+from weread import RateLimiter
+from weread.core.download import _download_images
+from weread.core.progress import ProgressTracker
+
+RDATA_FILE = 'tests/assets/怦然心动（精装纪念版）.rdata.zip'
+# `weread.core.download`会被同名的函数覆盖, 需要通过导入获取模块.
+download_module = importlib.import_module('weread.core.download')
+
+
+class TestDownload(object):
+    def test_download_images_cached(self, tmp_path):
+        """测试浏览器已经加载的图片直接写入原始数据文件."""
+        image_urls = ['https://res.weread.qq.com/wrepub/epub_1_2',
+                      'https://wfqqreader-1252317822.image.myqcloud.com/cover/o_1']  # noqa: E501
+        cached_images = {url: url.encode() for url in image_urls}
+
+        events = []
+        with ZipFile(tmp_path / 'book.rdata.zip', 'w') as rdata_file:
+            _download_images(image_urls, rdata_file, True, cached_images,
+                             tracker=ProgressTracker('images', events.append))
+
+        with ZipFile(tmp_path / 'book.rdata.zip') as rdata_file:
+            assert rdata_file.read('Images/epub_1_2.jpg') == image_urls[0].encode()  # noqa: E501
+            assert rdata_file.read('Images/coverpage.jpg') == image_urls[1].encode()  # noqa: E501
+        assert [event.kind for event in events] == ['start', 'advance', 'advance', 'end']  # noqa: E501
+        assert events[-1].bytes == sum(map(len, cached_images.values()))
+
+    def test_download_images_retry(self, tmp_path):
+        """测试服务器错误时降速重试下载图片."""
+        with ZipFile(RDATA_FILE) as rdata_file:
+            book_id = json.loads(rdata_file.read('content.json'))['bookId']
+            coverpage = rdata_file.read('Images/coverpage.jpg')
+
+        rate_limiter = RateLimiter(rate=100, max_rate=100, jitter=0)
+        with MockWeRead([RDATA_FILE], failure_rate=0.5, seed=1) as server:
+            with ZipFile(tmp_path / 'book.rdata.zip', 'w') as rdata_file:
+                _download_images([f'{server.url}/cover/o_{book_id}.jpg'],
+                                 rdata_file,
+                                 True,
+                                 rate_limiter=rate_limiter)
+            failures = server.requests['failure']
+
+        with ZipFile(tmp_path / 'book.rdata.zip') as rdata_file:
+            assert rdata_file.read('Images/coverpage.jpg') == coverpage
+        assert failures > 0
+        assert rate_limiter.failures == failures
+        assert rate_limiter.rate < 100
+
+    def test_download_images_network_error(self, tmp_path, monkeypatch):
+        """测试网络错误和下载中途断开时重试, 不留下不完整的图片."""
+        image = b'\xff\xd8\xff' + bytes(range(256)) * 8 + b'\xff\xd9'
+
+        class BrokenResponse(io.BytesIO):
+            def read(self, size=-1):
+                if self.tell() > 0:
+                    raise ConnectionResetError('connection reset by peer')
+                return super().read(16)
+
+        failures = [URLError('temporary failure in name resolution'),
+                    socket.timeout('timed out'),
+                    BrokenResponse(image)]
+
+        def fake_urlopen(url, timeout=None):
+            response = failures.pop(0) if failures else io.BytesIO(image)
+            if isinstance(response, Exception):
+                raise response
+            return response
+
+        monkeypatch.setattr(download_module, 'urlopen', fake_urlopen)
+        rate_limiter = RateLimiter(rate=100, max_rate=100, jitter=0)
+        with ZipFile(tmp_path / 'book.rdata.zip', 'w') as rdata_file:
+            _download_images(['https://res.weread.qq.com/wrepub/epub_1_2'],
+                             rdata_file,
+                             False,
+                             rate_limiter=rate_limiter)
+
+        with ZipFile(tmp_path / 'book.rdata.zip') as rdata_file:
+            assert rdata_file.namelist() == ['Images/epub_1_2.jpg']
+            assert rdata_file.read('Images/epub_1_2.jpg') == image
+        assert rate_limiter.failures == 3
+        assert rate_limiter.rate < 100
@@ -0,0 +1,67 @@
+"""测试导出纯文本和Markdown文件功能."""
+import json
+from io import BytesIO
+from zipfile import ZipFile
+
+import pytest
+
+from small_rdata import small_rdata
+
+from weread import export, export_many
+
+RDATA_FILE = 'tests/assets/怦然心动（精装纪念版）.rdata.zip'
+
+
+class TestExport(object):
+    def test_export(self, tmp_path):
+        """测试导出纯文本和Markdown文件."""
+        chapter_infos = json.loads(ZipFile(RDATA_FILE).read('toc.json'))
+
+        export_file_path = export(RDATA_FILE, tmp_path / 'book.txt',
+                                  verbose=True, info=True)
+        assert export_file_path == (tmp_path / 'book.txt').absolute()
+        text = export_file_path.read_text(encoding='utf-8')
+        assert '<' not in text
+        # 章节按照toc.json的顺序导出.
+        positions = [text.index(chapter_info['title'] + '\n')
+                     for chapter_info in chapter_infos]
+        assert positions == sorted(positions)
+
+        # Markdown的标题来自toc.json, 章节开头重复的标题被跳过.
+        output = BytesIO()
+        assert export(RDATA_FILE, output, fmt='md') is None
+        markdown = output.getvalue().decode('utf-8')
+        for chapter_info in chapter_infos:
+            heading = '#' * chapter_info['level'] + ' ' + chapter_info['title']
+            assert heading + '\n' in markdown
+        assert 'Chapter 01　下潜' not in markdown
+
+        # 不支持的格式.
+        with pytest.raises(SystemExit) as pytest_exit:
+            export(RDATA_FILE, tmp_path / 'book.pdf', fmt='pdf')
+        assert pytest_exit.value.code == 1
+        assert list(tmp_path.iterdir()) == [tmp_path / 'book.txt']
+
+    def test_export_many(self, tmp_path):
+        """测试使用多进程批量导出, 跳过导出失败的图书."""
+        library = tmp_path / 'v1.2'  # 目录名中的`.`不影响导出文件的路径.
+        library.mkdir()
+        rdata_file = library / 'book.rdata.zip'
+        small_rdata(rdata_file)
+        broken_file = library / 'broken.rdata.zip'
+        broken_file.write_bytes(b'broken')
+
+        export_file_paths = export_many([rdata_file, broken_file],
+                                        tmp_path / 'corpus',
+                                        fmt='md',
+                                        workers=2,
+                                        verbose=True,
+                                        info=True)
+        assert export_file_paths == [(tmp_path / 'corpus/book.md').absolute()]
+        assert not (tmp_path / 'corpus/broken.md.part').exists()
+
+        # 默认保存在原始数据文件所在的目录.
+        assert export_many([rdata_file.absolute()]) == [
+            (library / 'book.txt').absolute()
+        ]
+        assert export(rdata_file.absolute(), fmt='md') == (library / 'book.md').absolute()  # noqa: E501
@@ -1,7 +1,32 @@
 """测试生成ePub文件功能."""
+import asyncio
+import importlib
+import json
+import os
+import tracemalloc
+from io import BytesIO, RawIOBase
+from pathlib import Path
+from zipfile import ZIP_DEFLATED, ZIP_STORED, ZipFile
+
 import pytest
+import soupsieve
+from bs4 import BeautifulSoup
+
+from small_rdata import small_rdata
 
-from weread import generate
+from weread import (
+    AsyncProgress,
+    EpubBuild,
+    agenerate,
+    generate,
+    pack,
+    validate_epub
+)
+from weread.core.generate import (
+    _ZIPFILE_INTERNALS,
+    _EpubFile,
+    _generate_navigation
+)
 
 
 class TestGenerate(object):
@@ -22,3 +47,436 @@ class TestGenerate(object):
             generate('./book.rdata.zip')
         assert pytest_exit.type is SystemExit
         assert pytest_exit.value.code == 1
+
+    def test_generate_output(self, tmp_path):
+        """测试生成ePub文件到指定路径和二进制流."""
+        rdata_file = tmp_path / 'book.rdata.zip'
+        small_rdata(rdata_file)
+
+        # 指定保存路径.
+        build = generate(rdata_file, output=tmp_path / 'book.epub')
+        assert build == EpubBuild(tmp_path / 'book.epub', None, False)
+        epub_file_path = build.path
+        assert ZipFile(epub_file_path).testzip() is None
+
+        # 可以seek的二进制流.
+        stream = BytesIO()
+        assert generate(rdata_file, output=stream).path is None
+        assert ZipFile(stream).namelist() == ZipFile(epub_file_path).namelist()
+
+        # 不能seek的二进制流(比如管道和socket).
+        class UnseekableStream(RawIOBase):
+            def __init__(self):
+                self.buffer = BytesIO()
+
+            def writable(self):
+                return True
+
+            def write(self, b):
+                return self.buffer.write(b)
+
+        stream = UnseekableStream()
+        assert generate(rdata_file, output=stream).path is None
+        assert ZipFile(stream.buffer).testzip() is None
+
+    def test_generate_deterministic(self, tmp_path):
+        """测试可复现构建, 以及原始数据文件没有变化时跳过生成."""
+        rdata_file = 'tests/assets/怦然心动（精装纪念版）.rdata.zip'
+
+        # 原始数据文件中的文件顺序不同, 生成的ePub文件仍然逐字节相同.
+        reordered_file = tmp_path / 'reordered.rdata.zip'
+        with ZipFile(rdata_file) as source, ZipFile(reordered_file, 'w') as target:  # noqa: E501
+            for file in reversed(source.infolist()):
+                target.writestr(file.filename, source.read(file))
+
+        build = generate(rdata_file,
+                         output=tmp_path / 'book.epub',
+                         deterministic=True)
+        rebuild = generate(reordered_file,
+                           output=tmp_path / 'rebuild.epub',
+                           deterministic=True)
+        assert isinstance(build, EpubBuild)
+        assert build.digest == rebuild.digest
+        assert build.skipped is False
+        assert build.path.read_bytes() == rebuild.path.read_bytes()
+        assert {file.date_time for file in ZipFile(build.path).infolist()} == {(1980, 1, 1, 0, 0, 0)}  # noqa: E501
+
+        # 没有变化时跳过生成.
+        mtime = build.path.stat().st_mtime_ns
+        assert generate(rdata_file,
+                        output=tmp_path / 'book.epub',
+                        deterministic=True) == build._replace(skipped=True)
+        assert build.path.stat().st_mtime_ns == mtime
+
+    def test_generate_navigation(self):
+        """测试按照章节和锚点的层级生成嵌套的toc.ncx和nav.xhtml."""
+        chapter_infos = [
+            {'chapterUid': 1, 'title': '第一部分', 'level': 1, 'anchors': []},
+            {'chapterUid': 2, 'title': '第一章', 'level': 2, 'anchors': [
+                {'title': '第一节', 'anchor': 'a1', 'level': 3},
+                {'title': '第二节', 'anchor': 'a2', 'level': 3}
+            ]},
+            {'chapterUid': 3, 'title': '第二章', 'level': 2},
+            {'chapterUid': 4, 'title': '没有保存的章节', 'level': 1},
+            {'chapterUid': 5, 'title': '第二部分', 'level': 1, 'anchors': [
+                {'title': '跳跃的层级', 'anchor': 'b1', 'level': 4}
+            ]}
+        ]
+        chapter_paths = [f'Text/chapter-{uid}.html' for uid in (1, 2, 3, 5)]
+        toc_ncx, nav_xhtml = _generate_navigation(chapter_infos,
+                                                  chapter_paths,
+                                                  'book-id',
+                                                  '图书')
+
+        ncx = BeautifulSoup(toc_ncx, features='xml')
+        assert ncx.find('meta', attrs={'name': 'dtb:depth'})['content'] == '3'
+        nav_points = ncx.navMap.find_all('navPoint', recursive=False)
+        assert [point.navLabel.text.strip() for point in nav_points] == ['第一部分', '第二部分']  # noqa: E501
+        chapter = nav_points[0].find_all('navPoint', recursive=False)[0]
+        assert [point.content['src'] for point in chapter.find_all('navPoint')] == [  # noqa: E501
+            'Text/chapter-2.xhtml#a1', 'Text/chapter-2.xhtml#a2'
+        ]
+        assert [int(point['playOrder']) for point in ncx.find_all('navPoint')] == list(range(1, 8))  # noqa: E501
+
+        nav = BeautifulSoup(nav_xhtml, features='xml')
+        assert nav.nav['epub:type'] == 'toc'
+        items = nav.nav.ol.find_all('li', recursive=False)
+        assert len(items) == 2
+        assert [a['href'] for a in items[0].find_all('a')] == [
+            'Text/chapter-1.xhtml', 'Text/chapter-2.xhtml',
+            'Text/chapter-2.xhtml#a1', 'Text/chapter-2.xhtml#a2',
+            'Text/chapter-3.xhtml'
+        ]
+        assert items[1].ol.li.a['href'] == 'Text/chapter-5.xhtml#b1'
+
+    def test_generate_spine_order(self, tmp_path):
+        """测试章节的uid不随目录递增时, spine和目录仍然按照toc.json的顺序排列."""
+        rdata_file = tmp_path / 'book.rdata.zip'
+        with ZipFile('tests/assets/怦然心动（精装纪念版）.rdata.zip') as source, \
+                ZipFile(rdata_file, 'w', ZIP_DEFLATED) as rdata:
+            chapter_infos = json.loads(source.read('toc.json'))
+            # 第i章的uid为100 - i, 并按照uid的自然顺序写入原始数据文件.
+            uids = {chapter_info['chapterUid']: 100 - i
+                    for i, chapter_info in enumerate(chapter_infos)}
+            for file in sorted(source.infolist(), key=lambda x: x.filename):
+                name = file.filename
+                if name == 'toc.json':
+                    continue
+                if name.startswith('Text/'):
+                    uid = int(name[len('Text/chapter-'):-len('.html')])
+                    name = f'Text/chapter-{uids[uid]}.html'
+                rdata.writestr(name, source.read(file))
+            for chapter_info in chapter_infos:
+                chapter_info['chapterUid'] = uids[chapter_info['chapterUid']]
+            rdata.writestr('toc.json', json.dumps(chapter_infos))
+
+        expected = [f'text-chapter-{100 - i}' for i in range(len(chapter_infos))]  # noqa: E501
+        epub_file_path = generate(rdata_file, output=tmp_path / 'book.epub').path  # noqa: E501
+        with ZipFile(epub_file_path) as epub:
+            content_opf = BeautifulSoup(epub.read('OEBPS/content.opf'),
+                                        features='xml')
+            toc_ncx = BeautifulSoup(epub.read('OEBPS/toc.ncx'), features='xml')
+        itemrefs = [itemref['idref'] for itemref in content_opf.find_all('itemref')]  # noqa: E501
+        assert itemrefs == ['text-coverpage'] + expected
+        sources = [point.content['src'] for point in toc_ncx.find_all('navPoint')]  # noqa: E501
+        assert sources[0] == 'Text/chapter-100.xhtml'
+        assert validate_epub(epub_file_path) == []
+
+    def test_parallel_deflate(self):
+        """测试并行压缩按照写入顺序生成与单线程压缩逐字节相同的文件."""
+        entries = [(f'OEBPS/Text/chapter-{i}.xhtml', f'<p>第{i}章</p>' * i * 100)
+                   for i in range(50)]
+
+        def _write(stream, workers):
+            with _EpubFile(stream, deterministic=True, workers=workers) as epub_file:  # noqa: E501
+                epub_file.writestr('mimetype', 'application/epub+zip', ZIP_STORED)  # noqa: E501
+                for name, data in entries:
+                    epub_file.writestr(name, data)
+            return stream
+
+        serial = _write(BytesIO(), 1).getvalue()
+        parallel = _write(BytesIO(), 4).getvalue()
+        assert parallel == serial
+        with ZipFile(BytesIO(parallel)) as epub_file:
+            assert epub_file.testzip() is None
+            assert epub_file.namelist() == ['mimetype'] + [name for name, _ in entries]  # noqa: E501
+            assert epub_file.read(entries[-1][0]).decode() == entries[-1][1]
+
+        # 不能seek的二进制流.
+        class UnseekableStream(RawIOBase):
+            def __init__(self):
+                self.buffer = BytesIO()
+
+            def writable(self):
+                return True
+
+            def write(self, b):
+                return self.buffer.write(b)
+
+        stream = _write(UnseekableStream(), 4)
+        assert ZipFile(stream.buffer).testzip() is None
+
+    def test_copyraw(self, tmp_path):
+        """测试复制压缩后的数据, 压缩方式, CRC和压缩数据与源文件相同."""
+        with ZipFile(tmp_path / 'source.zip', 'w', ZIP_DEFLATED) as source:
+            source.writestr('OEBPS/Images/cover.jpg', os.urandom(4096),
+                            compress_type=ZIP_STORED)
+            source.writestr('OEBPS/Text/chapter-1.xhtml', '<p>第1章</p>' * 1000)
+
+        with ZipFile(tmp_path / 'source.zip') as source, \
+                _EpubFile(tmp_path / 'book.epub', workers=2) as epub_file:
+            epub_file.writestr('mimetype', 'application/epub+zip', ZIP_STORED)
+            for file in source.infolist():
+                epub_file.copyraw(source, file)
+            epub_file.writestr('OEBPS/Text/chapter-2.xhtml', '<p>第2章</p>' * 1000)  # noqa: E501
+            assert epub_file.bytes_written > 0
+
+        with ZipFile(tmp_path / 'source.zip') as source, \
+                ZipFile(tmp_path / 'book.epub') as epub_file:
+            assert epub_file.testzip() is None
+            assert epub_file.namelist() == ['mimetype',
+                                            'OEBPS/Images/cover.jpg',
+                                            'OEBPS/Text/chapter-1.xhtml',
+                                            'OEBPS/Text/chapter-2.xhtml']
+            for file in source.infolist():
+                copied = epub_file.getinfo(file.filename)
+                assert copied.compress_type == file.compress_type
+                assert copied.compress_size == file.compress_size
+                assert copied.CRC == file.CRC
+                assert epub_file.read(file.filename) == source.read(file)
+
+    def test_zipfile_internals(self, monkeypatch):
+        """测试当前Python版本的ZipFile提供追加压缩后数据依赖的内部属性."""
+        with ZipFile(BytesIO(), 'w') as zip_file:
+            for name in _ZIPFILE_INTERNALS:
+                assert hasattr(zip_file, name), name
+            assert zip_file.start_dir == zip_file.fp.tell() == 0
+
+        # 缺少内部属性时拒绝写入, 不会生成损坏的ePub文件.
+        generate_module = importlib.import_module('weread.core.generate')
+        monkeypatch.setattr(generate_module, '_ZIPFILE_INTERNALS',
+                            _ZIPFILE_INTERNALS + ('_missing',))
+        with pytest.raises(RuntimeError):
+            _EpubFile(BytesIO())
+
+    def test_copy_large_asset(self, tmp_path):
+        """测试复制大图片时内存占用有上限, 不会一次读入整个文件."""
+        # 只保留第一章, 并加入一张大图片.
+        rdata_file = tmp_path / 'book.rdata.zip'
+        image_size = 32 * 1024 * 1024
+        with ZipFile('tests/assets/怦然心动（精装纪念版）.rdata.zip') as source, \
+                ZipFile(rdata_file, 'w', ZIP_DEFLATED) as rdata:
+            chapter_info = json.loads(source.read('toc.json'))[0]
+            rdata.writestr('toc.json', json.dumps([chapter_info]))
+            for name in ('content.json', 'Styles/stylesheet.css',
+                         'Images/coverpage.jpg',
+                         f'Text/chapter-{chapter_info["chapterUid"]}.html'):
+                rdata.writestr(name, source.read(name))
+            with rdata.open('Images/big.jpg', 'w', force_zip64=True) as fp:
+                for _ in range(image_size // (1024 * 1024)):
+                    fp.write(os.urandom(1024 * 1024))
+
+        tracemalloc.start()
+        try:
+            epub_file_path = generate(rdata_file, workers=1).path
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        assert peak < image_size // 4
+        with ZipFile(epub_file_path) as epub:
+            assert epub.getinfo('OEBPS/Images/big.jpg').file_size == image_size  # noqa: E501
+            assert epub.testzip() is None
+
+    def test_optimize_css(self, tmp_path, monkeypatch):
+        """测试清理没有被章节使用的样式规则, 并复用选择器匹配结果的缓存."""
+        # 只保留第一章, 并在样式表中加入没有被使用的规则.
+        rdata_file = tmp_path / 'book.rdata.zip'
+        with ZipFile('tests/assets/怦然心动（精装纪念版）.rdata.zip') as source, \
+                ZipFile(rdata_file, 'w', ZIP_DEFLATED) as rdata:
+            chapter_info = json.loads(source.read('toc.json'))[0]
+            rdata.writestr('toc.json', json.dumps([chapter_info]))
+            for name in ('content.json', 'Images/coverpage.jpg',
+                         f'Text/chapter-{chapter_info["chapterUid"]}.html'):
+                rdata.writestr(name, source.read(name))
+            rdata.writestr('Styles/stylesheet.css',
+                           '/* 阅读器的样式. */\n'
+                           '.readerChapterContent .content {\n'
+                           '    text-indent: 2em;\n}\n'
+                           '.readerChapterContent .unused, body > div {\n'
+                           '    margin: 0 ;\n}\n'
+                           '.readerChapterContent .unused:hover { color: red }\n'  # noqa: E501
+                           '@media print { .unused { color: black } }\n'
+                           '@font-face { font-family: "A B"; src: url("a.ttf") }\n')  # noqa: E501
+
+        cache_file = tmp_path / 'css-cache.db'
+        build = generate(rdata_file,
+                         output=tmp_path / 'book.epub',
+                         deterministic=True,
+                         optimize_css=True,
+                         css_cache_file=cache_file)
+        with ZipFile(build.path) as epub:
+            stylesheet = epub.read('OEBPS/Styles/stylesheet.css').decode()
+            assert epub.namelist()[-2] == 'OEBPS/Styles/stylesheet.css'
+        assert stylesheet == ('.readerChapterContent .content{text-indent:2em}'
+                              'body>div{margin:0}'
+                              '@font-face{font-family:"A B";src:url("a.ttf")}')
+        assert validate_epub(build.path) == []
+
+        # 优化样式表的摘要不同, 不会跳过生成.
+        assert build.digest != generate(rdata_file,
+                                        output=tmp_path / 'plain.epub',
+                                        deterministic=True).digest
+
+        # 重新生成时直接使用缓存的匹配结果.
+        def _select_one(*_):
+            raise AssertionError('没有使用缓存的匹配结果.')
+
+        monkeypatch.setattr(soupsieve.SoupSieve, 'select_one', _select_one)
+        rebuild = generate(rdata_file,
+                           output=tmp_path / 'rebuild.epub',
+                           deterministic=True,
+                           optimize_css=True,
+                           css_cache_file=cache_file)
+        assert rebuild.path.read_bytes() == build.path.read_bytes()
+
+    def test_generate_update(self, tmp_path, monkeypatch):
+        """测试增量更新时只重新生成变化的章节, 结果与完整生成的ePub文件相同."""
+        rdata_file = tmp_path / 'book.rdata.zip'
+        small_rdata(rdata_file)
+        with ZipFile(rdata_file) as rdata:
+            files = [(file, rdata.read(file)) for file in rdata.infolist()]
+        chapters = [file for file, _ in files
+                    if file.filename.startswith('Text/')]
+        epub_file_path = tmp_path / 'book.epub'
+        manifest_path = tmp_path / 'book.epub.weread-manifest'
+        generate(rdata_file, output=epub_file_path, deterministic=True,
+                 update=True)
+        assert manifest_path.exists()
+
+        # 重新下载一个章节.
+        with ZipFile(rdata_file, 'w', ZIP_DEFLATED) as rdata:
+            for file, data in files:
+                if file == chapters[0]:
+                    data += '<p class="content">补充的段落.</p>'.encode()
+                rdata.writestr(file, data)
+
+        # `weread.core.generate`属性是同名的函数, 通过模块名获取模块.
+        generate_module = importlib.import_module('weread.core.generate')
+        calls = []
+        generate_chapter_xhtml = generate_module._generate_chapter_xhtml
+        monkeypatch.setattr(generate_module, '_generate_chapter_xhtml',
+                            lambda *args: calls.append(args) or
+                            generate_chapter_xhtml(*args))
+        monkeypatch.setattr(generate_module, '_generate_navigation', None)
+        build = generate(rdata_file, output=epub_file_path, deterministic=True,
+                         update=True, validate=True)
+        assert len(calls) == 1
+        monkeypatch.undo()
+
+        # 与完整生成的ePub文件逐字节相同.
+        rebuild = generate(rdata_file, output=tmp_path / 'rebuild.epub',
+                           deterministic=True)
+        assert build.path.read_bytes() == rebuild.path.read_bytes()
+        assert not (tmp_path / 'rebuild.epub.weread-manifest').exists()
+
+        # 选项不同或ePub文件被修改后完整生成, 没有变化时全部复用.
+        monkeypatch.setattr(generate_module, '_generate_chapter_xhtml',
+                            lambda *args: calls.append(args) or
+                            generate_chapter_xhtml(*args))
+        for modified, count in ((False, len(chapters)),
+                                (True, len(chapters)),
+                                (False, 0)):
+            if modified:
+                os.utime(epub_file_path, ns=(0, 0))
+            calls.clear()
+            generate(rdata_file, output=epub_file_path, update=True)
+            assert len(calls) == count
+        assert validate_epub(epub_file_path) == []
+
+    def test_generate_dir(self, tmp_path):
+        """测试生成目录形式的ePub文件, 只重写变化的文件, 并打包成ePub文件."""
+        rdata_file = tmp_path / 'book.rdata.zip'
+        small_rdata(rdata_file)
+        directory = tmp_path / 'book'
+        assert generate(rdata_file,
+                        output=directory,
+                        layout='dir').path == directory.absolute()
+        assert (directory / 'mimetype').read_text() == 'application/epub+zip'
+        stylesheet = directory / 'OEBPS/Styles/stylesheet.css'
+
+        def _mtimes():
+            return {path: path.stat().st_mtime_ns
+                    for path in directory.rglob('*')
+                    if path.is_file() and path != stylesheet}
+
+        # 修改样式表并加入已经删除的章节, 重新生成时只重写这两个文件.
+        mtimes = _mtimes()
+        stylesheet.write_text('body {}')
+        (directory / 'OEBPS/Text/chapter-99.xhtml').write_text('')
+        generate(rdata_file, output=directory, layout='dir')
+        assert not (directory / 'OEBPS/Text/chapter-99.xhtml').exists()
+        assert stylesheet.read_text() != 'body {}'
+        assert _mtimes() == mtimes
+
+        # 打包成ePub文件.
+        epub_file_path = pack(directory, verbose=True, info=True)
+        assert epub_file_path == (tmp_path / 'book.epub').absolute()
+        assert validate_epub(epub_file_path) == []
+        with ZipFile(epub_file_path) as epub_file:
+            assert len(epub_file.namelist()) == len(mtimes) + 1
+            assert epub_file.infolist()[0].compress_type == ZIP_STORED
+
+        # 可复现构建, 摘要没有变化时跳过生成, 打包时写入ePub文件的注释.
+        build = generate(rdata_file, output=directory, deterministic=True,
+                         layout='dir')
+        assert not build.skipped
+        assert generate(rdata_file, output=directory, deterministic=True,
+                        layout='dir').skipped
+        with ZipFile(pack(directory, deterministic=True)) as epub_file:
+            assert epub_file.comment.decode().endswith(build.digest)
+
+        # 目录形式的ePub文件不能写入二进制流.
+        with pytest.raises(SystemExit) as pytest_exit:
+            generate(rdata_file, output=BytesIO(), layout='dir')
+        assert pytest_exit.value.code == 1
+
+    def test_agenerate(self, tmp_path):
+        """测试异步生成ePub文件."""
+        rdata_file = tmp_path / 'book.rdata.zip'
+        rdata_file.write_bytes(
+            Path('tests/assets/怦然心动（精装纪念版）.rdata.zip').read_bytes()
+        )
+
+        async def _agenerate():
+            progress = AsyncProgress()
+            task = asyncio.create_task(agenerate(rdata_file,
+                                                 progress=progress))
+            progress_list = [item async for item in progress]
+
+            return await task, progress_list
+
+        build, progress_list = asyncio.run(_agenerate())
+        assert build == EpubBuild(tmp_path / 'book.epub', None, False)
+        assert len(progress_list) == progress_list[-1].total
+        assert len(ZipFile(build.path).namelist()) == progress_list[-1].total  # noqa: E501
+
+    def test_agenerate_cancel(self, tmp_path):
+        """测试取消异步生成ePub文件, 不会留下不完整的ePub文件."""
+        rdata_file = tmp_path / 'book.rdata.zip'
+        rdata_file.write_bytes(
+            Path('tests/assets/怦然心动（精装纪念版）.rdata.zip').read_bytes()
+        )
+
+        async def _agenerate():
+            progress = AsyncProgress()
+            task = asyncio.create_task(agenerate(rdata_file,
+                                                 progress=progress))
+            async for item in progress:
+                if item.current == 5:
+                    task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(_agenerate())
+        assert list(tmp_path.iterdir()) == [rdata_file]
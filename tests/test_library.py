@@ -0,0 +1,69 @@
+"""测试图书目录功能."""
+import os
+from io import BytesIO
+
+import pytest
+
+from small_rdata import small_rdata
+
+from weread import generate, query_library, scan_library
+
+
+class TestLibrary(object):
+    def test_library(self, tmp_path):
+        """测试扫描和查询图书目录."""
+        # 目录名中的`.`不影响同名ePub文件的路径.
+        library = tmp_path / 'v1.2' / 'library'
+        library.mkdir(parents=True)
+        rdata_file = library / 'book.rdata.zip'
+        small_rdata(rdata_file)
+        (library / 'broken.rdata.zip').write_bytes(b'broken')
+        catalog_file = tmp_path / 'weread-library.db'
+
+        assert scan_library(library, catalog_file, workers=2,
+                            verbose=True, info=True) == 1
+        assert scan_library(library, catalog_file) == 0
+
+        records = query_library(catalog_file, publisher='北京联合出版公司')
+        assert len(records) == 1
+        assert records[0].title == '怦然心动（精装纪念版）'
+        assert records[0].chapter_count == 3
+        assert records[0].epub_path is None
+        assert query_library(catalog_file, stale=True) == records
+        assert query_library(catalog_file, publisher='出版社') == []
+
+        # 生成ePub文件后更新图书目录.
+        epub_file = generate(rdata_file, catalog_file=catalog_file).path
+        assert epub_file == library / 'book.epub'
+        records = query_library(catalog_file, title='怦然心动')
+        assert records[0].epub_path == str(epub_file)
+        assert query_library(catalog_file, stale=True) == []
+
+        # 原始数据文件比ePub文件新.
+        os.utime(rdata_file, (records[0].epub_mtime + 10,) * 2)
+        assert scan_library(library, catalog_file) == 1
+        assert len(query_library(catalog_file, stale=True)) == 1
+
+        # 扫描时保留生成时指定的ePub文件路径.
+        epub_file.unlink()
+        custom_epub_file = generate(rdata_file,
+                                    output=tmp_path / 'custom.epub',
+                                    catalog_file=catalog_file).path
+        os.utime(rdata_file)
+        assert scan_library(library, catalog_file) == 1
+        records = query_library(catalog_file)
+        assert records[0].epub_path == str(custom_epub_file.absolute())
+        assert records[0].epub_mtime == custom_epub_file.stat().st_mtime
+
+        # 输出到二进制流或目录时不更新图书目录, 不会记录同目录下已经存在的ePub文件.
+        other_catalog_file = tmp_path / 'other-library.db'
+        generate(rdata_file, output=BytesIO(), catalog_file=other_catalog_file)
+        generate(rdata_file, output=tmp_path / 'book', layout='dir',
+                 catalog_file=other_catalog_file)
+        assert not other_catalog_file.exists()
+
+        # 未找到图书目录文件错误.
+        with pytest.raises(SystemExit) as pytest_exit:
+            query_library(tmp_path / 'library.db')
+        assert pytest_exit.type is SystemExit
+        assert pytest_exit.value.code == 1
@@ -0,0 +1,55 @@
+"""测试日志配置."""
+import json
+import logging
+from io import StringIO
+
+from weread import logger, setup_logging
+from weread.log import shutdown_logging
+
+
+class TestLog(object):
+    def test_import_without_configuration(self):
+        """测试导入时不配置root logger."""
+        shutdown_logging()
+        assert logger.name == 'weread'
+        assert logger.handlers == []
+        assert logger.propagate
+
+    def test_setup_logging(self):
+        """测试日志由后台线程输出, 并且不传递给root logger."""
+        root_stream = StringIO()
+        root_handler = logging.StreamHandler(root_stream)
+        logging.getLogger().addHandler(root_handler)
+        stream = StringIO()
+        try:
+            setup_logging(stream=stream)
+            logger.info('生成 %s 文件.', 'OEBPS/toc.ncx')
+            logger.debug('不会输出.')
+            shutdown_logging()
+        finally:
+            logging.getLogger().removeHandler(root_handler)
+
+        assert stream.getvalue() == '生成 OEBPS/toc.ncx 文件.\n'
+        assert root_stream.getvalue() == ''
+        assert logger.handlers == []
+
+    def test_json_lines(self):
+        """测试JSON Lines格式的日志, 包含时间和额外的字段."""
+        stream = StringIO()
+        setup_logging('debug', json_lines=True, stream=stream)
+        logger.debug('第%d章文本下载完成.', 1)
+        logger.info('生成 %s 文件.', 'book.epub', extra={'file': 'book.epub'})
+        try:
+            raise ValueError('错误')
+        except ValueError:
+            logger.exception('生成失败.')
+        shutdown_logging()
+
+        events = [json.loads(line) for line in stream.getvalue().splitlines()]
+        assert [event['level'] for event in events] == ['debug', 'info', 'error']  # noqa: E501
+        assert events[0]['message'] == '第1章文本下载完成.'
+        assert events[0]['duration'] == 0
+        assert events[1]['file'] == 'book.epub'
+        assert events[1]['duration'] >= 0
+        assert events[1]['elapsed'] >= events[0]['elapsed']
+        assert 'ValueError: 错误' in events[2]['exception']
@@ -0,0 +1,84 @@
+"""测试本地模拟的微信读书网站, 以及使用模拟网站离线下载图书."""
+import asyncio
+import json
+import os
+from urllib.error import HTTPError
+from urllib.request import urlopen
+from zipfile import ZipFile
+
+import pytest
+from mock_weread import MockWeRead
+from pyppeteer.chromium_downloader import check_chromium
+
+from weread import check, download
+
+RDATA_FILE = 'tests/assets/怦然心动（精装纪念版）.rdata.zip'
+
+
+class TestMockWeRead(object):
+    def test_mock_weread(self):
+        """测试模拟网站的书架, 阅读器页面, 章节接口和图片."""
+        with ZipFile(RDATA_FILE) as rdata_file:
+            book_info = json.loads(rdata_file.read('content.json'))
+            chapter_infos = json.loads(rdata_file.read('toc.json'))
+            coverpage = rdata_file.read('Images/coverpage.jpg')
+        book_id = book_info['bookId']
+        uid = chapter_infos[1]['chapterUid']
+
+        with MockWeRead([RDATA_FILE]) as server:
+            home = urlopen(server.url + '/').read().decode()
+            assert f'{server.url}/web/reader/{book_id}' in home
+            assert book_info['title'] in home
+
+            reader = urlopen(f'{server.url}/web/reader/{book_id}').read().decode()  # noqa: E501
+            assert 'changeChapter' in reader
+
+            pages = json.loads(urlopen(f'{server.url}/api/chapter/{book_id}/{uid}').read())  # noqa: E501
+            assert len(pages) == 2
+
+            assert urlopen(f'{server.url}/cover/o_{book_id}.jpg').read() == coverpage  # noqa: E501
+
+            with pytest.raises(HTTPError) as http_error:
+                urlopen(f'{server.url}/api/chapter/{book_id}/0')
+            assert http_error.value.code == 404
+
+    def test_mock_weread_failure(self):
+        """测试注入失败."""
+        with ZipFile(RDATA_FILE) as rdata_file:
+            book_id = json.loads(rdata_file.read('content.json'))['bookId']
+
+        with MockWeRead([RDATA_FILE], failure_rate=1) as server:
+            with pytest.raises(HTTPError) as http_error:
+                urlopen(f'{server.url}/cover/o_{book_id}.jpg')
+            assert http_error.value.code == 500
+            assert server.requests == {'chapter': 0, 'image': 1, 'failure': 1}
+
+    @pytest.mark.skipif(not check_chromium(), reason='没有安装Chromium.')
+    def test_download(self, tmp_path, monkeypatch):
+        """测试使用模拟网站离线下载图书."""
+        with MockWeRead([RDATA_FILE]) as server:
+            monkeypatch.setenv('WEREAD_URL', server.url)
+            rdata_file_path = asyncio.run(download('怦然心动',
+                                                   tmp_path / 'book.rdata.zip',  # noqa: E501
+                                                   headless=True,
+                                                   delay=0,
+                                                   profile_dir=tmp_path / 'profile'))  # noqa: E501
+
+        assert os.path.exists(rdata_file_path)
+        assert check(rdata_file_path)
+
+    @pytest.mark.skipif(not check_chromium(), reason='没有安装Chromium.')
+    def test_download_content_delay(self, tmp_path, monkeypatch):
+        """测试章节的uid先于内容更新时, 等待内容加载完成后再保存章节."""
+        with MockWeRead([RDATA_FILE], content_delay=0.3) as server:
+            monkeypatch.setenv('WEREAD_URL', server.url)
+            rdata_file_path = asyncio.run(download('怦然心动',
+                                                   tmp_path / 'book.rdata.zip',  # noqa: E501
+                                                   headless=True,
+                                                   delay=0,
+                                                   profile_dir=tmp_path / 'profile'))  # noqa: E501
+
+        with ZipFile(RDATA_FILE) as source, ZipFile(rdata_file_path) as rdata:
+            for name in source.namelist():
+                if name.startswith('Text/'):
+                    assert rdata.read(name) == source.read(name)
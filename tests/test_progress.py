@@ -0,0 +1,122 @@
+"""测试进度回调和进度条."""
+from io import StringIO
+
+import pytest
+
+from weread import ProgressEvent, check
+from weread.command_wrapper import _ProgressBar
+from weread.core.progress import (
+    Progress,
+    ProgressTracker,
+    run_steps,
+    track_steps
+)
+
+RDATA_FILE = 'tests/assets/怦然心动（精装纪念版）.rdata.zip'
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestProgress(object):
+    def test_progress_tracker(self):
+        """测试滚动吞吐量和预计剩余时间."""
+        clock = FakeClock()
+        events = []
+        tracker = ProgressTracker('images', events.append, window=5,
+                                  clock=clock)
+        tracker.start(20)
+        assert events[-1].kind == 'start'
+        assert events[-1].eta is None
+
+        for _ in range(10):
+            clock.now += 1
+            tracker.advance('image', 100)
+        assert events[-1].current == 10
+        assert events[-1].bytes == 1000
+        assert events[-1].rate == pytest.approx(1)
+        assert events[-1].byte_rate == pytest.approx(100)
+        assert events[-1].eta == pytest.approx(10)
+
+        # 吞吐量只使用覆盖最近时间窗口的采样计算(从第7秒到第12.5秒).
+        for _ in range(5):
+            clock.now += 0.5
+            tracker.advance('image', 100)
+        assert events[-1].rate == pytest.approx(8 / 5.5)
+        assert events[-1].eta == pytest.approx(5 / (8 / 5.5))
+
+        tracker.finish()
+        assert events[-1].kind == 'end'
+        assert events[-1].eta == 0
+        assert events[-1].elapsed == pytest.approx(12.5)
+
+    def test_track_steps(self):
+        """测试包装步骤生成器, 返回值和进度信息不变."""
+        def _steps():
+            for i in range(3):
+                yield Progress(i + 1, 3, f'file-{i}')
+            return 'done'
+
+        events = []
+        written = iter([0, 10, 30, 60])
+        steps = track_steps(_steps(),
+                            ProgressTracker('generate', events.append),
+                            lambda: next(written))
+        assert run_steps(steps) == 'done'
+        assert [event.kind for event in events] == ['start', 'advance', 'advance', 'advance', 'end']  # noqa: E501
+        assert [event.name for event in events[1:4]] == ['file-0', 'file-1', 'file-2']  # noqa: E501
+        assert events[-1].bytes == 60
+
+    def test_track_steps_total(self):
+        """测试先声明步骤数时, 在第一个步骤开始前开始跟踪, 用时包含第一个步骤."""
+        clock = FakeClock()
+
+        def _steps():
+            yield Progress(0, 2, '')
+            for i in range(2):
+                clock.now += 1
+                yield Progress(i + 1, 2, f'file-{i}')
+
+        events = []
+        tracker = ProgressTracker('generate', events.append, clock=clock)
+        assert list(track_steps(_steps(), tracker)) == [
+            Progress(1, 2, 'file-0'), Progress(2, 2, 'file-1')]
+        assert [event.kind for event in events] == ['start', 'advance', 'advance', 'end']  # noqa: E501
+        assert events[0].total == 2
+        assert events[1].elapsed == pytest.approx(1)
+        assert events[-1].elapsed == pytest.approx(2)
+        assert events[-1].rate == pytest.approx(1)
+
+        # 没有进度跟踪器时同样不产出步骤数的声明.
+        assert [progress.current
+                for progress in track_steps(_steps(), None)] == [1, 2]
+
+    def test_check_callback(self):
+        """测试检查原始数据文件的进度回调."""
+        events = []
+        assert check(RDATA_FILE, deep=True, callback=events.append)
+        stages = [(event.stage, event.kind) for event in events]
+        assert stages[0] == ('check', 'start')
+        assert ('check', 'end') in stages
+        assert stages[-1] == ('deep-check', 'end')
+        assert events[-1].current == events[-1].total
+        assert events[-1].bytes > 0
+
+    def test_progress_bar(self):
+        """测试将进度事件渲染为单行进度条."""
+        stream = StringIO()
+        progress_bar = _ProgressBar(stream, width=10, interval=0)
+        progress_bar(ProgressEvent('generate', 'advance', 5, 10, 'a', 0,
+                                   1, 5, 0, 1))
+        assert stream.getvalue().startswith('\r生成 █████░░░░░ 5/10  50%')
+        assert '剩余00:01' in stream.getvalue()
+        assert '\n' not in stream.getvalue()
+
+        progress_bar(ProgressEvent('generate', 'end', 10, 10, '', 2048 * 1024,
+                                   65, 5, 0, 0))
+        assert stream.getvalue().endswith('2.0MB 用时01:05\x1b[K\n')
@@ -0,0 +1,59 @@
+"""测试自适应限速器."""
+import pytest
+
+from weread import RateLimiter
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestRateLimiter(object):
+    def test_token_bucket(self):
+        """测试令牌不足时等待, 令牌随时间恢复."""
+        clock = FakeClock()
+        rate_limiter = RateLimiter(rate=0.5, burst=2, jitter=0, clock=clock)
+
+        assert rate_limiter.reserve() == 0
+        assert rate_limiter.reserve() == 0
+        assert rate_limiter.reserve() == pytest.approx(2)  # 欠账1个令牌.
+        assert rate_limiter.reserve() == pytest.approx(4)
+
+        clock.now = 10  # 恢复5个令牌, 但是不超过令牌桶的容量.
+        assert rate_limiter.reserve() == 0
+        assert rate_limiter.reserve() == 0
+        assert rate_limiter.reserve() == pytest.approx(2)
+
+    def test_jitter(self):
+        """测试随机抖动不超过请求间隔的比例."""
+        rate_limiter = RateLimiter(rate=1, burst=100, jitter=0.5)
+        wait_times = [rate_limiter.reserve() for _ in range(50)]
+
+        assert all(0 <= wait_time <= 0.5 for wait_time in wait_times)
+        assert len(set(wait_times)) > 1
+
+    def test_adaptive_rate(self):
+        """测试响应正常时加速, 响应变慢或出错时减速."""
+        rate_limiter = RateLimiter(rate=0.5,
+                                   min_rate=0.1,
+                                   max_rate=0.6,
+                                   target_latency=2,
+                                   jitter=0)
+        rate_limiter.record(0.5)
+        rate_limiter.record(0.5)
+        rate_limiter.record(0.5)
+        assert rate_limiter.rate == pytest.approx(0.6)  # 不超过最高速率.
+
+        rate_limiter.record(3)
+        assert rate_limiter.rate == pytest.approx(0.3)
+        rate_limiter.record(0.5, ok=False)
+        rate_limiter.record(0.5, ok=False)
+        assert rate_limiter.rate == pytest.approx(0.1)  # 不低于最低速率.
+        assert (rate_limiter.successes, rate_limiter.failures) == (4, 2)
+
+        with pytest.raises(ValueError):
+            RateLimiter(min_rate=2, max_rate=1)
@@ -0,0 +1,81 @@
+"""测试重新打包原始数据文件功能."""
+import os
+import shutil
+from zipfile import ZIP_DEFLATED, ZIP_STORED, ZipFile
+
+import pytest
+
+from weread import check, generate, repack, repack_many, validate_epub
+
+RDATA_FILE = 'tests/assets/怦然心动（精装纪念版）.rdata.zip'
+
+
+def _messy_rdata(rdata_file):
+    """创建包含重复文件, 没有被引用的图片和压缩过的图片的原始数据文件."""
+    with ZipFile(RDATA_FILE) as source, \
+            ZipFile(rdata_file, 'w', ZIP_DEFLATED) as rdata, \
+            pytest.warns(UserWarning, match='Duplicate name'):
+        for file in source.infolist():
+            rdata.writestr(file, source.read(file))
+        rdata.writestr('Images/orphan.jpg', b'\xff\xd8\xff' + os.urandom(65536))  # noqa: E501
+        rdata.writestr('Images/figure.jpg', b'\xff\xd8\xff' + os.urandom(1024))  # noqa: E501
+        # 重试下载追加的新版本章节, 引用了新的图片.
+        chapter = source.read('Text/chapter-2.html')
+        rdata.writestr('Text/chapter-2.html', chapter +
+                       b'<img data-src="https://res.weread.qq.com/figure"/>')
+
+
+class TestRepack(object):
+    def test_repack(self, tmp_path):
+        """测试删除重复的文件和没有被引用的图片, 图片不压缩并按照读取的顺序排列."""
+        rdata_file = tmp_path / 'book.rdata.zip'
+        _messy_rdata(rdata_file)
+
+        result = repack(rdata_file, verbose=True, info=True)
+        assert result.path == rdata_file.absolute()
+        assert result.duplicates == 1
+        assert result.orphans == ['Images/orphan.jpg']
+        assert result.size < result.original_size
+        assert not result.skipped
+        assert not (tmp_path / 'book.rdata.zip.part').exists()
+
+        with ZipFile(rdata_file) as rdata:
+            assert rdata.testzip() is None
+            names = rdata.namelist()
+            assert len(names) == len(set(names))
+            assert names[:4] == ['content.json', 'toc.json',
+                                 'Images/coverpage.jpg', 'Images/figure.jpg']
+            assert names.index('Text/chapter-9.html') < names.index('Text/chapter-10.html')  # noqa: E501
+            assert 'Images/orphan.jpg' not in names
+            assert rdata.read('Text/chapter-2.html').endswith(b'/figure"/>')
+            for file in rdata.infolist():
+                if file.filename.startswith('Images/'):
+                    assert file.compress_type == ZIP_STORED
+                else:
+                    assert file.compress_type == ZIP_DEFLATED
+
+        assert check(rdata_file)
+        epub_file_path = generate(rdata_file, output=tmp_path / 'book.epub').path  # noqa: E501
+        assert validate_epub(epub_file_path) == []
+
+        # 已经是紧凑的原始数据文件将跳过.
+        mtime = rdata_file.stat().st_mtime_ns
+        assert repack(rdata_file).skipped
+        assert rdata_file.stat().st_mtime_ns == mtime
+
+    def test_repack_many(self, tmp_path):
+        """测试使用多进程重新打包目录下的原始数据文件, 失败的文件将被跳过."""
+        library = tmp_path / 'library'
+        (library / 'sub').mkdir(parents=True)
+        _messy_rdata(library / 'a.rdata.zip')
+        shutil.copy(RDATA_FILE, library / 'sub' / 'b.rdata.zip')
+        (tmp_path / 'broken.rdata.zip').write_bytes(b'not a zip file')
+
+        results = repack_many([library, tmp_path / 'broken.rdata.zip'],
+                              workers=2,
+                              verbose=True,
+                              info=True)
+        names = [result.path.name for result in results]
+        assert names == ['a.rdata.zip', 'b.rdata.zip']
+        assert all(not result.skipped for result in results)
+        assert repack(library / 'sub' / 'b.rdata.zip').skipped
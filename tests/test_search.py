@@ -0,0 +1,83 @@
+"""测试全文搜索功能."""
+import json
+import time
+from zipfile import ZipFile
+
+import pytest
+
+from small_rdata import small_rdata
+
+from weread import build_index, iter_chapters, search
+
+
+class TestSearch(object):
+    def test_search(self, tmp_path):
+        """测试建立索引和搜索."""
+        library = tmp_path / 'library'
+        library.mkdir()
+        rdata_file = library / 'book.rdata.zip'
+        small_rdata(rdata_file)
+        index_file = tmp_path / 'weread-index.db'
+
+        assert build_index(library, index_file, verbose=True, info=True) == {
+            'indexed': 1, 'skipped': 0, 'removed': 0
+        }
+
+        # 搜索结果与章节纯文本一致.
+        chapters = list(iter_chapters(rdata_file, mode='text'))
+        texts = {c.uid: c.content for c in chapters}
+        chapter = chapters[-1]
+        query = chapter.content[100:108]
+        start = time.perf_counter()
+        results = search(query, index_file)
+        assert time.perf_counter() - start < 1
+        assert results
+        for result in results:
+            text = texts[result.chapter_uid]
+            assert text[result.offset:result.offset + len(query)] == query
+        assert (str(rdata_file), chapter.uid, chapter.title, 100) in [
+            result[:4] for result in results
+        ]
+        assert len(search('的', index_file)) > 2
+        assert len(search('的', index_file, limit=2)) == 2
+        assert search('没有这段文本的内容', index_file) == []
+
+        # 增量更新.
+        assert build_index(library, index_file)['skipped'] == 1
+        rdata_file.unlink()
+        assert build_index(library, index_file)['removed'] == 1
+        assert search(query, index_file) == []
+
+        # 未找到索引文件错误.
+        with pytest.raises(SystemExit) as pytest_exit:
+            search(query, tmp_path / 'index.db')
+        assert pytest_exit.type is SystemExit
+        assert pytest_exit.value.code == 1
+
+    def test_build_index_broken(self, tmp_path):
+        """测试目录下有损坏的原始数据文件时跳过该文件, 继续索引其他文件."""
+        library = tmp_path / 'library'
+        library.mkdir()
+        small_rdata(library / 'book.rdata.zip')
+        (library / 'broken.rdata.zip').write_bytes(b'not a zip file')
+        # 缺少toc.json和toc.json中的章节缺少标题的原始数据文件.
+        with ZipFile(library / 'book.rdata.zip') as source:
+            for name, toc in (('no-toc', None), ('no-title', [{'chapterUid': 2}])):  # noqa: E501
+                with ZipFile(library / f'{name}.rdata.zip', 'w') as rdata:
+                    for file in source.infolist():
+                        if file.filename != 'toc.json':
+                            rdata.writestr(file.filename, source.read(file))
+                    if toc is not None:
+                        rdata.writestr('toc.json', json.dumps(toc))
+        index_file = tmp_path / 'weread-index.db'
+
+        assert build_index(library, index_file) == {
+            'indexed': 1, 'skipped': 0, 'removed': 0
+        }
+        paths = {result.book for result in search('的', index_file)}
+        assert paths == {str((library / 'book.rdata.zip').absolute())}
+
+        # 损坏的文件没有被记录, 下次建立索引时重试.
+        assert build_index(library, index_file) == {
+            'indexed': 0, 'skipped': 1, 'removed': 0
+        }
@@ -0,0 +1,44 @@
+"""测试样式表优化功能."""
+from bs4 import BeautifulSoup
+
+from weread.core.styles import _StyleOptimizer
+
+XHTML = ('<html xmlns="http://www.w3.org/1999/xhtml"><body>'
+         '<div class="readerChapterContent"><p class="content">文本</p>'
+         '<a href="#note">注释</a></div></body></html>')
+
+
+class TestStyles(object):
+    def test_optimize(self):
+        """测试清理, 去重和压缩样式表."""
+        css = ('@charset "utf-8";\n'
+               'p.content , .missing { width : calc(100% - 2em) ; ; }\n'
+               'p::first-line { font-family : "Song Ti" }\n'
+               'a:hover { color: red }\n'
+               'p.weird; { color: blue }\n'
+               '.missing > p { color: green }\n'
+               '@media screen and (max-width: 600px) { .missing { x: y } }\n'
+               '@media print { a { color: black } }\n'
+               'a { color: red }\n'
+               'div { margin: 0 }\n'
+               'a { color: red }\n')
+        styles = _StyleOptimizer({'Styles/stylesheet.css': css.encode()})
+        styles.match(b'chapter', BeautifulSoup(XHTML, features='xml'))
+        styles.close()
+
+        assert styles.render() == {'Styles/stylesheet.css': (
+            '@charset "utf-8";'
+            'p.content{width:calc(100% - 2em)}'
+            'p::first-line{font-family:"Song Ti"}'
+            'a:hover{color:red}'
+            'p.weird;{color:blue}'  # 无法解析的选择器将被保留.
+            '@media print{a{color:black}}'
+            'div{margin:0}'
+            'a{color:red}'  # 完全相同的规则只保留最后一个.
+        ).encode()}
+
+    def test_undecodable(self):
+        """测试无法解码的样式表原样复制."""
+        styles = _StyleOptimizer({'Styles/stylesheet.css': b'\xff\xfe'})
+        assert styles.sizes == {}
+        assert styles.render() == {}
@@ -0,0 +1,40 @@
+"""测试检查ePub文件结构功能."""
+from zipfile import ZIP_DEFLATED, ZipFile
+
+import pytest
+
+from weread import generate, validate_epub
+
+
+class TestValidate(object):
+    def test_validate_epub(self, tmp_path):
+        """测试检查生成的ePub文件和缺少文件的ePub文件."""
+        epub_file = generate('tests/assets/怦然心动（精装纪念版）.rdata.zip',
+                             output=tmp_path / 'book.epub',
+                             validate=True).path
+        assert validate_epub(epub_file, verbose=True, info=True) == []
+
+        # 删除封面图片和一个章节, 并压缩mimetype.
+        broken_file = tmp_path / 'broken.epub'
+        with ZipFile(epub_file) as source, ZipFile(broken_file, 'w') as target:  # noqa: E501
+            for file in source.infolist():
+                if file.filename == 'mimetype':
+                    target.writestr(file.filename, source.read(file), ZIP_DEFLATED)  # noqa: E501
+                elif file.filename not in ('OEBPS/Images/coverpage.jpg',
+                                           'OEBPS/Text/chapter-3.xhtml'):
+                    target.writestr(file, source.read(file))
+
+        problems = validate_epub(broken_file, info=True)
+        assert len(problems) == 6
+        assert problems[0].startswith('mimetype')
+        assert any('OEBPS/Text/coverpage.xhtml 引用的文件 OEBPS/Images/coverpage.jpg' in problem  # noqa: E501
+                   for problem in problems)
+        assert any('OEBPS/toc.ncx 引用的文件 OEBPS/Text/chapter-3.xhtml' in problem  # noqa: E501
+                   for problem in problems)
+        assert any('OEBPS/nav.xhtml 引用的文件 OEBPS/Text/chapter-3.xhtml' in problem  # noqa: E501
+                   for problem in problems)
+
+        # 测试ePub文件传递错误.
+        with pytest.raises(SystemExit) as pytest_exit:
+            validate_epub('tests/README.md')
+        assert pytest_exit.value.code == 1
@@ -0,0 +1,60 @@
+"""测试监听目录功能."""
+import shutil
+import sys
+import threading
+
+import pytest
+
+from small_rdata import small_rdata
+
+from weread import watch
+
+
+class TestWatch(object):
+    def test_watch_polling(self, tmp_path):
+        """测试轮询监听目录, 跳过不完整和已经是最新的原始数据文件."""
+        inbox = tmp_path / 'inbox'
+        inbox.mkdir()
+        output_dir = tmp_path / 'epub'
+        small_rdata(inbox / 'book.rdata.zip')
+        # 只写入了一半的原始数据文件, 没有中央目录.
+        data = (inbox / 'book.rdata.zip').read_bytes()
+        (inbox / 'partial.rdata.zip').write_bytes(data[:len(data) // 2])
+
+        builds = watch(inbox, output_dir, workers=1, interval=0.2,
+                       polling=True, timeout=1, verbose=True, info=True)
+        assert len(builds) == 1
+        assert builds[0].path == (output_dir / 'book.epub').absolute()
+        assert not builds[0].skipped
+        assert sorted(path.name for path in output_dir.iterdir()) == ['book.epub']  # noqa: E501
+
+        # ePub文件已经是最新的.
+        builds = watch(inbox, output_dir, workers=1, interval=0.2,
+                       polling=True, timeout=1)
+        assert len(builds) == 1
+        assert builds[0].skipped
+
+        # 目录不存在.
+        with pytest.raises(SystemExit) as pytest_exit:
+            watch(tmp_path / 'missing', timeout=0)
+        assert pytest_exit.value.code == 1
+
+    @pytest.mark.skipif(not sys.platform.startswith('linux'),
+                        reason='只有Linux支持inotify.')
+    def test_watch_inotify(self, tmp_path):
+        """测试使用inotify监听目录, 文件写入完成后立即处理."""
+        rdata_file = tmp_path / 'book.rdata.zip'
+        small_rdata(rdata_file)
+        inbox = tmp_path / 'v1.2'  # 目录名中的`.`不影响ePub文件的路径.
+        inbox.mkdir()
+        timer = threading.Timer(0.3, shutil.copy,
+                                (rdata_file, inbox / 'book.rdata.zip'))
+        timer.start()
+        try:
+            # 轮询间隔远大于监听时长, 只有inotify的事件才能触发处理.
+            builds = watch(inbox, workers=1, interval=60, timeout=2)
+        finally:
+            timer.join()
+
+        assert len(builds) == 1
+        assert builds[0].path == (inbox / 'book.epub').absolute()
@@ -5,11 +5,19 @@ Copyright 2022-2023 Steve R. Sun. All rights reserved.
 """
 __version__ = '0.1.1b0'
 
-import logging
-# 设置系统logger.
-logging.basicConfig(format='%(message)s', level=logging.INFO)
-logger = logging.getLogger()
+from weread.log import logger, setup_logging
 
+from weread.core import acheck, agenerate
+from weread.core import AsyncProgress, Progress, ProgressEvent
+from weread.core import Chapter, iter_chapters
 from weread.core import check
 from weread.core import download
-from weread.core import generate
+from weread.core import download_many
+from weread.core import EpubBuild, generate, pack
+from weread.core import export, export_many
+from weread.core import BookRecord, query_library, scan_library
+from weread.core import RateLimiter
+from weread.core import RepackResult, repack, repack_many
+from weread.core import SearchResult, build_index, search
+from weread.core import validate_epub
+from weread.core import watch
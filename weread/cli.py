@@ -1,16 +1,70 @@
 import sys
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
 
 from weread import __version__
-from weread import logger
+from weread import logger, setup_logging
 from weread.command_wrapper import (
     check_command,
     download_command,
+    download_many_command,
+    export_command,
     generate_command,
     help_command,
-    version_command
+    index_command,
+    library_list_command,
+    library_scan_command,
+    pack_command,
+    repack_command,
+    search_command,
+    validate_command,
+    version_command,
+    watch_command
 )
 
+_INDEX_FILE = 'weread-index.db'
+_CATALOG_FILE = 'weread-library.db'
+_QUEUE_FILE = 'weread-queue.json'
+
+
+def _parse_options(args: List[str],
+                   flags: Dict[str, Tuple[str, ...]],
+                   options: Optional[Dict[str, Tuple[str, ...]]] = None
+                   ) -> Tuple[Dict, List[str]]:
+    """解析子命令的选项, 选项需要写在参数之前.
+
+    Args:
+        args: list of str,
+            子命令之后的参数.
+        flags: dict,
+            开关选项的名称和对应的写法, 出现时为True, 否则为False.
+        options: dict, default=None,
+            带值选项的名称和对应的写法, 未出现时为None.
+
+    Return:
+        选项的值组成的字典和剩余的参数.
+    """
+    options = options or {}
+    values = {name: False for name in flags}
+    values.update({name: None for name in options})
+
+    idx = 0
+    while idx < len(args):
+        for name, aliases in flags.items():
+            if args[idx] in aliases:
+                values[name] = True
+                idx += 1
+                break
+        else:
+            for name, aliases in options.items():
+                if args[idx] in aliases:
+                    values[name] = args[idx + 1]
+                    idx += 2
+                    break
+            else:
+                break
+
+    return values, args[idx:]
+
 
 def _parse_args(args: List[str]) -> Dict:
     """解析命令行参数.
@@ -31,50 +85,247 @@ def _parse_args(args: List[str]) -> Dict:
         metadata = {}
         try:
             if args[0] == 'check':
-                if args[1] in ('--verbose', '-v'):
-                    metadata.update({
-                        'check': {
-                            'rdata_file': args[2],
-                            'verbose': True
-                        }
-                    })
-                else:
-                    metadata.update({
-                        'check': {
-                            'rdata_file': args[1],
-                            'verbose': False
-                        }
-                    })
+                values, params = _parse_options(
+                    args[1:],
+                    flags={
+                        'verbose': ('--verbose', '-v'),
+                        'deep': ('--deep',),
+                        'full_decode': ('--full-decode',)
+                    },
+                    options={
+                        'report_file': ('--report', '-r'),
+                        'workers': ('--jobs', '-j')
+                    }
+                )
+                metadata.update({
+                    'check': {
+                        'rdata_file': params[0],
+                        'verbose': values['verbose'],
+                        'deep': values['deep'] or values['full_decode'],
+                        'full_decode': values['full_decode'],
+                        'report_file': values['report_file'],
+                        'workers': int(values['workers'] or 0) or None
+                    }
+                })
             elif args[0] == 'download':
-                if args[1] in ('--verbose', '-v'):
-                    metadata.update({
-                        'download': {
-                            'name': args[2],
-                            'verbose': True
-                        }
-                    })
-                else:
-                    metadata.update({
-                        'download': {
-                            'name': args[1],
-                            'verbose': False
-                        }
-                    })
+                values, params = _parse_options(
+                    args[1:],
+                    flags={'verbose': ('--verbose', '-v')},
+                    options={
+                        'profile_dir': ('--profile', '-p'),
+                        'catalog_file': ('--catalog', '-c')
+                    }
+                )
+                metadata.update({
+                    'download': {
+                        'name': params[0],
+                        'verbose': values['verbose'],
+                        'profile_dir': values['profile_dir'],
+                        'catalog_file': values['catalog_file']
+                    }
+                })
+            elif args[0] == 'download-many':
+                values, params = _parse_options(
+                    args[1:],
+                    flags={'verbose': ('--verbose', '-v')},
+                    options={
+                        'profile_dir': ('--profile', '-p'),
+                        'queue_file': ('--queue', '-q'),
+                        'daily_quota': ('--quota', '-n'),
+                        'rdata_dir': ('--output', '-o'),
+                        'catalog_file': ('--catalog', '-c')
+                    }
+                )
+                metadata.update({
+                    'download_many': {
+                        'names': params,
+                        'verbose': values['verbose'],
+                        'profile_dir': values['profile_dir'],
+                        'queue_file': values['queue_file'] or _QUEUE_FILE,
+                        'daily_quota': int(values['daily_quota'] or 3),
+                        'rdata_dir': values['rdata_dir'] or '.',
+                        'catalog_file': values['catalog_file']
+                    }
+                })
             elif args[0] == 'generate':
-                if args[1] in ('--verbose', '-v'):
-                    metadata.update({
-                        'generate': {
-                            'rdata_file': args[2],
-                            'verbose': True
-                        }
-                    })
-                else:
-                    metadata.update({
-                        'generate': {
-                            'rdata_file': args[1],
-                            'verbose': False
-                        }
-                    })
+                values, params = _parse_options(
+                    args[1:],
+                    flags={
+                        'verbose': ('--verbose', '-v'),
+                        'validate': ('--validate',),
+                        'deterministic': ('--deterministic',),
+                        'optimize_css': ('--optimize-css',),
+                        'update': ('--update',)
+                    },
+                    options={
+                        'output': ('--output', '-o'),
+                        'layout': ('--layout',),
+                        'css_cache_file': ('--css-cache',),
+                        'catalog_file': ('--catalog', '-c')
+                    }
+                )
+                metadata.update({
+                    'generate': {
+                        'rdata_file': params[0],
+                        'verbose': values['verbose'],
+                        'output': values['output'],
+                        'validate': values['validate'],
+                        'deterministic': values['deterministic'],
+                        'layout': values['layout'] or 'zip',
+                        'optimize_css': (values['optimize_css'] or
+                                         values['css_cache_file'] is not None),
+                        'css_cache_file': values['css_cache_file'],
+                        'update': values['update'],
+                        'catalog_file': values['catalog_file']
+                    }
+                })
+            elif args[0] == 'pack':
+                values, params = _parse_options(
+                    args[1:],
+                    flags={
+                        'verbose': ('--verbose', '-v'),
+                        'deterministic': ('--deterministic',)
+                    },
+                    options={'output': ('--output', '-o')}
+                )
+                metadata.update({
+                    'pack': {
+                        'directory': params[0],
+                        'verbose': values['verbose'],
+                        'output': values['output'],
+                        'deterministic': values['deterministic']
+                    }
+                })
+            elif args[0] == 'export':
+                values, params = _parse_options(
+                    args[1:],
+                    flags={'verbose': ('--verbose', '-v')},
+                    options={
+                        'fmt': ('--format', '-f'),
+                        'output_dir': ('--output', '-o'),
+                        'workers': ('--jobs', '-j')
+                    }
+                )
+                if not params:
+                    raise IndexError('缺少原始数据文件.')
+                metadata.update({
+                    'export': {
+                        'rdata_files': params,
+                        'verbose': values['verbose'],
+                        'fmt': values['fmt'] or 'txt',
+                        'output_dir': values['output_dir'],
+                        'workers': int(values['workers'] or 0) or None
+                    }
+                })
+            elif args[0] == 'repack':
+                values, params = _parse_options(
+                    args[1:],
+                    flags={'verbose': ('--verbose', '-v')},
+                    options={'workers': ('--jobs', '-j')}
+                )
+                if not params:
+                    raise IndexError('缺少原始数据文件.')
+                metadata.update({
+                    'repack': {
+                        'paths': params,
+                        'verbose': values['verbose'],
+                        'workers': int(values['workers'] or 0) or None
+                    }
+                })
+            elif args[0] == 'validate':
+                values, params = _parse_options(
+                    args[1:],
+                    flags={'verbose': ('--verbose', '-v')}
+                )
+                metadata.update({
+                    'validate': {
+                        'epub_file': params[0],
+                        'verbose': values['verbose']
+                    }
+                })
+            elif args[0] == 'watch':
+                values, params = _parse_options(
+                    args[1:],
+                    flags={
+                        'verbose': ('--verbose', '-v'),
+                        'polling': ('--polling',)
+                    },
+                    options={
+                        'output_dir': ('--output', '-o'),
+                        'workers': ('--jobs', '-j'),
+                        'interval': ('--interval', '-i')
+                    }
+                )
+                metadata.update({
+                    'watch': {
+                        'directory': params[0],
+                        'verbose': values['verbose'],
+                        'output_dir': values['output_dir'],
+                        'workers': int(values['workers'] or 0) or None,
+                        'interval': float(values['interval'] or 2),
+                        'polling': values['polling']
+                    }
+                })
+            elif args[0] == 'index':
+                values, params = _parse_options(
+                    args[1:],
+                    flags={'verbose': ('--verbose', '-v')},
+                    options={'index_file': ('--index', '-i')}
+                )
+                metadata.update({
+                    'index': {
+                        'library': params[0],
+                        'verbose': values['verbose'],
+                        'index_file': values['index_file'] or _INDEX_FILE
+                    }
+                })
+            elif args[0] == 'search':
+                values, params = _parse_options(
+                    args[1:],
+                    flags={},
+                    options={
+                        'index_file': ('--index', '-i'),
+                        'limit': ('--limit', '-n')
+                    }
+                )
+                metadata.update({
+                    'search': {
+                        'query': params[0],
+                        'index_file': values['index_file'] or _INDEX_FILE,
+                        'limit': int(values['limit'] or 20)
+                    }
+                })
+            elif args[0] == 'library' and args[1] == 'scan':
+                values, params = _parse_options(
+                    args[2:],
+                    flags={'verbose': ('--verbose', '-v')},
+                    options={
+                        'catalog_file': ('--catalog', '-c'),
+                        'workers': ('--jobs', '-j')
+                    }
+                )
+                metadata.update({
+                    'library_scan': {
+                        'library': params[0],
+                        'verbose': values['verbose'],
+                        'catalog_file': values['catalog_file'] or _CATALOG_FILE,  # noqa: E501
+                        'workers': int(values['workers'] or 0) or None
+                    }
+                })
+            elif args[0] == 'library' and args[1] == 'list':
+                values, _ = _parse_options(
+                    args[2:],
+                    flags={'stale': ('--stale',)},
+                    options={
+                        'catalog_file': ('--catalog', '-c'),
+                        'title': ('--title',),
+                        'author': ('--author',),
+                        'publisher': ('--publisher',),
+                        'isbn': ('--isbn',)
+                    }
+                )
+                values['catalog_file'] = values['catalog_file'] or _CATALOG_FILE  # noqa: E501
+                metadata.update({'library_list': values})
             elif args[0] in ('help', '--help', '-h'):
                 metadata.update({'help': True})
             elif args[0] in ('version', '--version', '-v'):
@@ -84,20 +335,58 @@ def _parse_args(args: List[str]) -> Dict:
         except IndexError:
             logger.error('缺少必要的参数, 请检查你填写的参数!')
             sys.exit(2)
+        except ValueError:
+            logger.error('参数的格式错误, 请检查你填写的参数!')
+            sys.exit(2)
 
         return metadata
 
 
 def run():
     """启动命令行工具."""
-    meta_data = _parse_args(sys.argv)
+    # 全局选项需要写在子命令之前.
+    values, args = _parse_options(sys.argv[1:],
+                                  flags={'json_lines': ('--log-json',)})
+    setup_logging(json_lines=values['json_lines'])
+
+    meta_data = _parse_args(sys.argv[:1] + args)
     for command, params in meta_data.items():
         if command == 'check':
-            check_command(params['rdata_file'], params['verbose'])
+            check_command(**params)
         elif command == 'download':
-            download_command(params['name'], params['verbose'])
+            download_command(params['name'],
+                             params['verbose'],
+                             params['profile_dir'],
+                             params['catalog_file'])
+        elif command == 'download_many':
+            download_many_command(**params)
         elif command == 'generate':
-            generate_command(params['rdata_file'], params['verbose'])
+            generate_command(**params)
+        elif command == 'pack':
+            pack_command(**params)
+        elif command == 'export':
+            export_command(**params)
+        elif command == 'repack':
+            repack_command(**params)
+        elif command == 'validate':
+            validate_command(params['epub_file'], params['verbose'])
+        elif command == 'watch':
+            watch_command(**params)
+        elif command == 'index':
+            index_command(params['library'],
+                          params['verbose'],
+                          params['index_file'])
+        elif command == 'search':
+            search_command(params['query'],
+                           params['index_file'],
+                           params['limit'])
+        elif command == 'library_scan':
+            library_scan_command(params['library'],
+                                 params['verbose'],
+                                 params['catalog_file'],
+                                 params['workers'])
+        elif command == 'library_list':
+            library_list_command(**params)
         elif command == 'help':
             help_command('info')
         elif command == 'version':
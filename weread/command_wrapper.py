@@ -1,14 +1,99 @@
 import sys
+import time
 from asyncio import run
-from typing import Callable, Literal
+from pathlib import Path
+from typing import Callable, List, Literal, Optional, TextIO
 
 from weread import __version__
-from weread import check, download, generate
+from weread import build_index, check, download, generate, pack, search
+from weread import download_many
+from weread import export_many
+from weread import repack_many
+from weread import query_library, scan_library
+from weread import ProgressEvent
+from weread import validate_epub
+from weread import watch
 from weread import logger
 
 Mode = Literal['error', 'info']
 
 
+class _ProgressBar(object):
+    """在终端中将进度事件渲染为单行进度条, 每个阶段结束时换行.
+
+    Args:
+        stream: TextIO, default=sys.stderr,
+            输出进度条的文本流.
+        width: int, default=24,
+            进度条的宽度(字符数).
+        interval: float, default=0.1,
+            两次重绘之间的最短间隔(秒), 阶段开始和结束时总是重绘.
+    """
+    _STAGES = {
+        'download': '下载章节',
+        'images': '下载图片',
+        'check': '检查',
+        'deep-check': '深度校验',
+        'generate': '生成'
+    }
+
+    def __init__(self,
+                 stream: TextIO = sys.stderr,
+                 width: int = 24,
+                 interval: float = 0.1):
+        self.stream = stream
+        self.width = width
+        self.interval = interval
+        self._last_draw = 0.0
+
+    def __call__(self, event: ProgressEvent):
+        now = time.monotonic()
+        if event.kind == 'advance' and now - self._last_draw < self.interval:
+            return
+        self._last_draw = now
+
+        ratio = event.current / event.total if event.total else 1
+        filled = int(ratio * self.width)
+        line = (f'\r{self._STAGES.get(event.stage, event.stage)} '
+                f'{"█" * filled}{"░" * (self.width - filled)} '
+                f'{event.current}/{event.total} {ratio:4.0%} '
+                f'{event.rate:.1f}/s')
+        if event.bytes:
+            line += f' {event.bytes / 1024 / 1024:.1f}MB'
+        if event.kind == 'end':
+            line += f' 用时{_format_seconds(event.elapsed)}'
+        elif event.eta is not None:
+            line += f' 剩余{_format_seconds(event.eta)}'
+        line += '\x1b[K'  # 清除上一次渲染残留的字符.
+        if event.kind == 'end':
+            line += '\n'
+        self.stream.write(line)
+        self.stream.flush()
+
+
+def _format_seconds(seconds: float) -> str:
+    """将秒数格式化为`分:秒`."""
+    minutes, seconds = divmod(int(seconds), 60)
+
+    return f'{minutes:02d}:{seconds:02d}'
+
+
+def _progress_bar(verbose: bool) -> Optional[_ProgressBar]:
+    """创建命令使用的进度条, 展示详细信息或者标准错误不是终端时不使用进度条.
+
+    Args:
+        verbose: bool,
+            是否展示详细信息.
+
+    Return:
+        进度条, 不使用进度条时返回None.
+    """
+    if verbose or not sys.stderr.isatty():
+        return None
+
+    return _ProgressBar()
+
+
 def keyboard_interrupt(function: Callable) -> Callable:
     """键盘中断装饰器, 用于处理键盘中断的异常.
     Args:
@@ -24,12 +109,18 @@ def keyboard_interrupt(function: Callable) -> Callable:
 
 
 @keyboard_interrupt
-def check_command(rdata_file: str, verbose: bool):
+def check_command(rdata_file: str,
+                  verbose: bool,
+                  deep: bool = False,
+                  full_decode: bool = False,
+                  report_file: Optional[str] = None,
+                  workers: Optional[int] = None):
     """检查命令, 检查下载的原始数据文件的完整性.
 
     Example:
         ```shell
         weread-cli check 怦然心动.rdata.zip
+        weread-cli check --deep --report report.json 怦然心动.rdata.zip
         ```
 
     Args:
@@ -37,32 +128,111 @@ def check_command(rdata_file: str, verbose: bool):
             原始数据文件.
         verbose: bool,
             是否展示检查ePub文件的详细信息.
+        deep: bool, default=False,
+            是否深度校验CRC, 图片和章节html.
+        full_decode: bool, default=False,
+            深度校验时是否完整解码图片.
+        report_file: str or None, default=None,
+            JSON格式的深度校验报告的保存路径, `-`表示写入标准输出.
+        workers: int or None, default=None,
+            深度校验使用的线程数量.
     """
-    check(rdata_file, verbose, info=True)
+    check(rdata_file,
+          verbose,
+          info=report_file != '-',
+          deep=deep,
+          full_decode=full_decode,
+          workers=workers,
+          report_file=report_file,
+          callback=_progress_bar(verbose))
 
 
 @keyboard_interrupt
-def download_command(name: str, verbose: bool):
+def download_command(name: str,
+                     verbose: bool,
+                     profile_dir: Optional[str],
+                     catalog_file: Optional[str] = None):
     """下载命令, 根据图书名称下载原始的数据到本地.
 
     Example:
         ```shell
         weread-cli download 怦然心动
+        weread-cli download -p ~/.weread-profile 怦然心动
+        weread-cli download -c weread-library.db 怦然心动
         ```
 
     Args:
         name: str, 图书的名称.
         verbose: bool,
             是否展示下载过程的详细信息.
+        profile_dir: str or None,
+            保存会话的用户数据目录, 会话有效时将跳过扫码登录.
+        catalog_file: str, default=None,
+            图书目录文件, 设置时将在下载完成后更新图书目录.
     """
     run(download(name,
                  rdata_file_path=None,
                  verbose=verbose,
-                 info=True))
+                 info=True,
+                 catalog_file=catalog_file,
+                 profile_dir=profile_dir,
+                 callback=_progress_bar(verbose)))
+
+
+@keyboard_interrupt
+def download_many_command(names: List[str],
+                          verbose: bool,
+                          profile_dir: Optional[str],
+                          queue_file: str,
+                          daily_quota: int,
+                          rdata_dir: str,
+                          catalog_file: Optional[str] = None):
+    """批量下载命令, 将图书加入任务队列, 并使用同一个浏览器按照每日配额下载.
+
+    Example:
+        ```shell
+        weread-cli download-many 怦然心动 追风筝的人
+        # 只下载队列中等待的图书(比如在定时任务中).
+        weread-cli download-many
+        ```
+
+    Args:
+        names: list of str,
+            需要加入任务队列的图书名称.
+        verbose: bool,
+            是否展示下载过程的详细信息.
+        profile_dir: str or None,
+            保存会话的用户数据目录, 会话有效时将跳过扫码登录.
+        queue_file: str,
+            任务队列文件.
+        daily_quota: int,
+            每天最多下载的图书数量.
+        rdata_dir: str,
+            原始数据文件的保存目录.
+        catalog_file: str, default=None,
+            图书目录文件, 设置时将在每本图书下载完成后更新图书目录.
+    """
+    run(download_many(names,
+                      rdata_dir=rdata_dir,
+                      queue_file=queue_file,
+                      daily_quota=daily_quota,
+                      verbose=verbose,
+                      info=True,
+                      catalog_file=catalog_file,
+                      profile_dir=profile_dir))
 
 
 @keyboard_interrupt
-def generate_command(rdata_file: str, verbose: bool):
+def generate_command(rdata_file: str,
+                     verbose: bool,
+                     output: Optional[str],
+                     validate: bool = False,
+                     deterministic: bool = False,
+                     layout: str = 'zip',
+                     optimize_css: bool = False,
+                     css_cache_file: Optional[str] = None,
+                     update: bool = False,
+                     catalog_file: Optional[str] = None):
     """生成ePub文件命令, 根据原始数据文件生成ePub文件.
 
     生成的ePub文件参照这个目录创建:
@@ -78,6 +248,7 @@ def generate_command(rdata_file: str, verbose: bool):
             |
             |-- content.opf (图书的元数据)
             |-- toc.ncx (章节的导航信息)
+            |-- nav.xhtml (ePub3的导航文档)
             |-- Images (图片文件)
             |-- Styles (样式表css)
                 |
@@ -91,6 +262,13 @@ def generate_command(rdata_file: str, verbose: bool):
     Example:
         ```shell
         weread-cli generate 怦然心动.rdata.zip
+        weread-cli generate -o - 怦然心动.rdata.zip > 怦然心动.epub
+        weread-cli generate --validate 怦然心动.rdata.zip
+        weread-cli generate --deterministic 怦然心动.rdata.zip
+        weread-cli generate --layout dir -o ./怦然心动 怦然心动.rdata.zip
+        weread-cli generate --css-cache weread-css.db 怦然心动.rdata.zip
+        weread-cli generate --update 怦然心动.rdata.zip
+        weread-cli generate -c weread-library.db 怦然心动.rdata.zip
         ```
 
     Args:
@@ -98,8 +276,311 @@ def generate_command(rdata_file: str, verbose: bool):
             原始数据文件.
         verbose: bool,
             是否展示生成ePub文件的详细信息.
+        output: str or None,
+            ePub文件的保存路径, `-`表示写入标准输出, None表示保存为'原始数据文件名.epub'.
+        validate: bool, default=False,
+            是否在生成完成后检查ePub文件的结构.
+        deterministic: bool, default=False,
+            是否可复现构建, 原始数据文件没有变化时将跳过生成.
+        layout: {'zip', 'dir'}, default='zip',
+            ePub文件的形式, 'dir'表示输出解压后的目录.
+        optimize_css: bool, default=False,
+            是否清理没有被章节使用的样式规则并压缩样式表.
+        css_cache_file: str, default=None,
+            选择器匹配结果的缓存文件.
+        update: bool, default=False,
+            是否增量更新已经存在的ePub文件, 只重新生成变化的文件.
+        catalog_file: str, default=None,
+            图书目录文件, 设置时将在生成完成后更新图书目录; 写入标准输出或目录时不更新.
+    """
+    if output == '-':
+        generate(rdata_file,
+                 verbose,
+                 info=False,
+                 output=sys.stdout.buffer,
+                 deterministic=deterministic,
+                 layout=layout,
+                 callback=_progress_bar(verbose),
+                 optimize_css=optimize_css,
+                 css_cache_file=css_cache_file)
+    else:
+        build = generate(rdata_file,
+                         verbose,
+                         info=True,
+                         output=output,
+                         catalog_file=catalog_file,
+                         validate=validate,
+                         deterministic=deterministic,
+                         layout=layout,
+                         callback=_progress_bar(verbose),
+                         optimize_css=optimize_css,
+                         css_cache_file=css_cache_file,
+                         update=update)
+        if build.digest:
+            logger.info('摘要: %s%s', build.digest,
+                        ' (没有变化, 跳过生成)' if build.skipped else '')
+
+
+@keyboard_interrupt
+def pack_command(directory: str,
+                 verbose: bool,
+                 output: Optional[str],
+                 deterministic: bool = False):
+    """打包命令, 将目录形式的ePub文件打包成ePub文件.
+
+    Example:
+        ```shell
+        weread-cli pack ./怦然心动
+        ```
+
+    Args:
+        directory: str,
+            目录形式的ePub文件.
+        verbose: bool,
+            是否展示打包的详细信息.
+        output: str or None,
+            ePub文件的保存路径, None表示保存为'目录名.epub'.
+        deterministic: bool, default=False,
+            是否可复现构建.
+    """
+    pack(directory, output, deterministic, verbose=verbose, info=True)
+
+
+@keyboard_interrupt
+def export_command(rdata_files: List[str],
+                   verbose: bool,
+                   fmt: str,
+                   output_dir: Optional[str],
+                   workers: Optional[int]):
+    """导出命令, 使用多进程将原始数据文件导出为纯文本或Markdown文件.
+
+    Example:
+        ```shell
+        weread-cli export --format md 怦然心动.rdata.zip
+        weread-cli export -o ./corpus -j 4 ./library/*.rdata.zip
+        ```
+
+    Args:
+        rdata_files: list of str,
+            原始数据文件组成的列表.
+        verbose: bool,
+            是否展示导出的详细信息.
+        fmt: {'txt', 'md'},
+            导出的格式.
+        output_dir: str or None,
+            导出文件的保存目录, None表示保存在原始数据文件所在的目录.
+        workers: int or None,
+            进程的数量, None表示使用CPU的核心数.
+    """
+    if len(export_many(rdata_files,
+                       output_dir,
+                       fmt,
+                       workers,
+                       verbose,
+                       info=True)) < len(rdata_files):
+        sys.exit(1)
+
+
+@keyboard_interrupt
+def repack_command(paths: List[str],
+                   verbose: bool,
+                   workers: Optional[int]):
+    """重新打包命令, 使用多进程压缩整理原始数据文件.
+
+    Example:
+        ```shell
+        weread-cli repack 怦然心动.rdata.zip
+        weread-cli repack -j 4 ./library
+        ```
+
+    Args:
+        paths: list of str,
+            原始数据文件或存放原始数据文件的目录组成的列表.
+        verbose: bool,
+            是否展示重新打包的详细信息.
+        workers: int or None,
+            进程的数量, None表示使用CPU的核心数.
+    """
+    repack_many(paths, workers, verbose, info=True)
+
+
+@keyboard_interrupt
+def validate_command(epub_file: str, verbose: bool):
+    """检查ePub文件命令, 检查ePub文件的manifest, spine, 目录和章节中的引用.
+
+    Example:
+        ```shell
+        weread-cli validate 怦然心动.epub
+        ```
+
+    Args:
+        epub_file: str,
+            ePub文件.
+        verbose: bool,
+            是否展示检查的详细信息.
+    """
+    if validate_epub(epub_file, verbose, info=True):
+        sys.exit(1)
+
+
+@keyboard_interrupt
+def watch_command(directory: str,
+                  verbose: bool,
+                  output_dir: Optional[str],
+                  workers: Optional[int],
+                  interval: float,
+                  polling: bool):
+    """监听目录命令, 自动检查新的原始数据文件并生成ePub文件.
+
+    Example:
+        ```shell
+        weread-cli watch -o ./epub ./inbox
+        ```
+
+    Args:
+        directory: str,
+            监听的目录.
+        verbose: bool,
+            是否展示监听和生成的详细信息.
+        output_dir: str or None,
+            ePub文件的保存目录, None表示保存在原始数据文件所在的目录.
+        workers: int or None,
+            进程的数量, None表示使用CPU的核心数.
+        interval: float,
+            轮询的间隔(秒).
+        polling: bool,
+            是否强制使用轮询.
+    """
+    watch(directory,
+          output_dir,
+          workers,
+          interval,
+          polling,
+          verbose=verbose,
+          info=True)
+
+
+@keyboard_interrupt
+def index_command(library: str, verbose: bool, index_file: str):
+    """建立索引命令, 为目录下的全部原始数据文件增量建立全文搜索索引.
+
+    Example:
+        ```shell
+        weread-cli index ./library
+        ```
+
+    Args:
+        library: str,
+            存放原始数据文件的目录.
+        verbose: bool,
+            是否展示建立索引的详细信息.
+        index_file: str,
+            索引文件.
     """
-    generate(rdata_file, verbose, info=True)
+    build_index(library, index_file, verbose, info=True)
+
+
+@keyboard_interrupt
+def search_command(query: str, index_file: str, limit: int):
+    """搜索命令, 在全文搜索索引中查找文本.
+
+    Example:
+        ```shell
+        weread-cli search 梧桐树
+        ```
+
+    Args:
+        query: str,
+            需要查找的文本.
+        index_file: str,
+            索引文件.
+        limit: int,
+            最多展示的搜索结果数量.
+    """
+    results = search(query, index_file, limit)
+    for result in results:
+        logger.info('%s | %s(uid=%s) | %s | %s',
+                    Path(result.book).name,
+                    result.chapter_title,
+                    result.chapter_uid,
+                    result.offset,
+                    result.snippet)
+
+    if not results:
+        logger.info('没有找到"%s".', query)
+
+
+@keyboard_interrupt
+def library_scan_command(library: str,
+                         verbose: bool,
+                         catalog_file: str,
+                         workers: Optional[int]):
+    """扫描图书目录命令, 使用多进程扫描目录下的全部原始数据文件, 并更新图书目录.
+
+    Example:
+        ```shell
+        weread-cli library scan ./library
+        ```
+
+    Args:
+        library: str,
+            存放原始数据文件的目录.
+        verbose: bool,
+            是否展示扫描的详细信息.
+        catalog_file: str,
+            图书目录文件.
+        workers: int or None,
+            进程的数量, None表示使用CPU的核心数.
+    """
+    scan_library(library, catalog_file, workers, verbose, info=True)
+
+
+@keyboard_interrupt
+def library_list_command(catalog_file: str,
+                         title: Optional[str],
+                         author: Optional[str],
+                         publisher: Optional[str],
+                         isbn: Optional[str],
+                         stale: bool):
+    """列出图书目录命令, 查询并展示图书目录中的图书.
+
+    Example:
+        ```shell
+        weread-cli library list --publisher 北京联合出版公司
+        weread-cli library list --stale
+        ```
+
+    Args:
+        catalog_file: str,
+            图书目录文件.
+        title: str or None,
+            图书标题包含的文本.
+        author: str or None,
+            图书作者.
+        publisher: str or None,
+            图书出版社.
+        isbn: str or None,
+            图书ISBN.
+        stale: bool,
+            是否只展示ePub文件不存在或比原始数据文件旧的图书.
+    """
+    records = query_library(catalog_file,
+                            title,
+                            author,
+                            publisher,
+                            isbn,
+                            stale)
+    for record in records:
+        logger.info('《%s》 | %s | %s | %s | %s | %s章 | %s',
+                    record.title,
+                    record.author,
+                    record.publisher,
+                    record.isbn,
+                    record.publish_time,
+                    record.chapter_count,
+                    record.rdata_path)
+
+    logger.info('共%s本图书.', len(records))
 
 
 @keyboard_interrupt
@@ -121,18 +602,99 @@ Bunnyburrow Software Project(兔窝镇软件计划)
 Copyright 2022-2023 Steve R. Sun. All rights reserved.
 -------------------------------------------------
 Usage:
+  weread-cli [global option] <command> ...
+    Global option:
+      --log-json: 使用JSON Lines格式输出日志, 包含时间戳和距离上一条日志的时间.
   weread-cli check [option] <rdata_file>
     check: 检查下载的原始数据文件的完整性.
       Option:
         --verbose, -v: 展示检查ePub文件的详细信息.
+        --deep: 使用线程池深度校验全部文件的CRC, 图片是否被截断和章节html能否解析.
+        --full-decode: 深度校验时使用Pillow完整解码图片(包含`--deep`).
+        --report, -r <report_file>: JSON格式的深度校验报告的保存路径, 使用`-`写入标准输出.
+        --jobs, -j <workers>: 深度校验使用的线程数量.
   weread-cli download [option] <book_name>
     download: 根据图书名称下载原始的数据到本地.
       Option:
         --verbose, -v: 展示下载过程的详细信息.
+        --profile, -p <profile_dir>: 保存会话的用户数据目录, 会话有效时将跳过扫码登录.
+        --catalog, -c <catalog_file>: 图书目录文件, 设置时将在下载完成后更新图书目录.
+  weread-cli download-many [option] [<book_name> ...]
+    download-many: 将图书加入任务队列, 并使用同一个浏览器按照每日配额批量下载.
+      Option:
+        --verbose, -v: 展示下载过程的详细信息.
+        --profile, -p <profile_dir>: 保存会话的用户数据目录, 会话有效时将跳过扫码登录.
+        --queue, -q <queue_file>: 任务队列文件, 默认为`weread-queue.json`.
+        --quota, -n <daily_quota>: 每天最多下载的图书数量, 默认为3.
+        --output, -o <rdata_dir>: 原始数据文件的保存目录, 默认为当前目录.
+        --catalog, -c <catalog_file>: 图书目录文件, 设置时将在每本图书下载完成后更新图书目录.
   weread-cli generate [option] <rdata_file>
     generate: 根据原始数据文件生成ePub文件.
       Option:
         --verbose, -v: 展示生成ePub文件的详细信息.
+        --output, -o <epub_file>: ePub文件的保存路径, 使用`-`写入标准输出.
+        --validate: 生成完成后检查ePub文件的结构.
+        --deterministic: 可复现构建, 原始数据文件没有变化时将跳过生成.
+        --layout <layout>: ePub文件的形式, `zip`(默认)或`dir`(解压后的目录, 只重写变化的文件).
+        --optimize-css: 清理没有被章节使用的样式规则并压缩样式表.
+        --css-cache <cache_file>: 选择器匹配结果的缓存文件, 重新生成时复用(包含`--optimize-css`).
+        --update: 增量更新已经存在的ePub文件, 没有变化的文件直接复制, 只重新生成变化的章节.
+        --catalog, -c <catalog_file>: 图书目录文件, 设置时将在生成完成后更新图书目录.
+  weread-cli pack [option] <directory>
+    pack: 将目录形式的ePub文件打包成ePub文件.
+      Option:
+        --verbose, -v: 展示打包的详细信息.
+        --output, -o <epub_file>: ePub文件的保存路径, 默认为`目录名.epub`.
+        --deterministic: 可复现构建.
+  weread-cli export [option] <rdata_file> [<rdata_file> ...]
+    export: 使用多进程将原始数据文件逐章导出为纯文本或Markdown文件, 不生成ePub文件.
+      Option:
+        --verbose, -v: 展示导出的详细信息.
+        --format, -f <format>: 导出的格式, `txt`(默认)或`md`.
+        --output, -o <output_dir>: 导出文件的保存目录, 默认为原始数据文件所在的目录.
+        --jobs, -j <workers>: 进程的数量, 默认为CPU的核心数.
+  weread-cli repack [option] <rdata_file|library_dir> [...]
+    repack: 使用多进程重新打包原始数据文件, 删除重复的文件和没有被引用的图片, 图片不再压缩.
+      Option:
+        --verbose, -v: 展示重新打包的详细信息.
+        --jobs, -j <workers>: 进程的数量, 默认为CPU的核心数.
+  weread-cli validate [option] <epub_file>
+    validate: 检查ePub文件的manifest, spine, 目录和章节中的引用.
+      Option:
+        --verbose, -v: 展示检查的详细信息.
+  weread-cli watch [option] <directory>
+    watch: 监听目录, 自动检查新的原始数据文件并生成ePub文件, 已经是最新的ePub文件将跳过.
+      Option:
+        --verbose, -v: 展示监听和生成的详细信息.
+        --output, -o <output_dir>: ePub文件的保存目录, 默认为原始数据文件所在的目录.
+        --jobs, -j <workers>: 进程的数量, 默认为CPU的核心数.
+        --interval, -i <interval>: 轮询的间隔(秒), 默认为2.
+        --polling: 不使用inotify, 强制使用轮询.
+  weread-cli index [option] <library_dir>
+    index: 为目录下的全部原始数据文件增量建立全文搜索索引.
+      Option:
+        --verbose, -v: 展示建立索引的详细信息.
+        --index, -i <index_file>: 索引文件, 默认为`weread-index.db`.
+  weread-cli search [option] <query>
+    search: 在全文搜索索引中查找文本.
+      Option:
+        --index, -i <index_file>: 索引文件, 默认为`weread-index.db`.
+        --limit, -n <limit>: 最多展示的搜索结果数量, 默认为20.
+  weread-cli library scan [option] <library_dir>
+    library scan: 使用多进程扫描目录下的全部原始数据文件, 并更新图书目录.
+      Option:
+        --verbose, -v: 展示扫描的详细信息.
+        --catalog, -c <catalog_file>: 图书目录文件, 默认为`weread-library.db`.
+        --jobs, -j <workers>: 进程的数量, 默认为CPU的核心数.
+  weread-cli library list [option]
+    library list: 查询并展示图书目录中的图书.
+      Option:
+        --catalog, -c <catalog_file>: 图书目录文件, 默认为`weread-library.db`.
+        --title <title>: 图书标题包含的文本.
+        --author <author>: 图书作者.
+        --publisher <publisher>: 图书出版社.
+        --isbn <isbn>: 图书ISBN.
+        --stale: 只展示ePub文件不存在或比原始数据文件旧的图书.
   weread-cli help
     help, --help, -h: 获取帮助信息.
   weread-cli version
@@ -153,4 +715,4 @@ def version_command():
         weread-cli version
         ```
     """
-    logger.info('微信读书ePub下载工具 ' + __version__)
+    logger.info('微信读书ePub下载工具 %s', __version__)
@@ -1,3 +1,18 @@
-from weread.core.check import check
+from weread.core.batch import download_many
+from weread.core.chapters import Chapter, iter_chapters
+from weread.core.check import acheck, check
 from weread.core.download import download
-from weread.core.generate import generate
+from weread.core.export import export, export_many
+from weread.core.library import (
+    BookRecord,
+    query_library,
+    scan_library,
+    update_catalog
+)
+from weread.core.generate import EpubBuild, agenerate, generate, pack
+from weread.core.progress import AsyncProgress, Progress, ProgressEvent
+from weread.core.ratelimit import RateLimiter
+from weread.core.repack import RepackResult, repack, repack_many
+from weread.core.search import SearchResult, build_index, search
+from weread.core.validate import validate_epub
+from weread.core.watch import watch
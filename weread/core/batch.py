@@ -0,0 +1,241 @@
+import asyncio
+import json
+import os
+import random
+import time
+
+from datetime import date
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+from weread import logger
+from weread.core.download import (
+    _capture_images,
+    _chapter_rate_limiter,
+    _discard_rdata,
+    _download_text,
+    _find_books,
+    _launch_browser,
+    _save_book
+)
+from weread.core.library import update_catalog
+from weread.core.ratelimit import RateLimiter
+
+
+def _load_queue(queue_file: Union[str, os.PathLike]) -> List[Dict]:
+    """读取任务队列.
+
+    Args:
+        queue_file: str or os.PathLike,
+            任务队列文件.
+
+    Return:
+        任务组成的列表.
+    """
+    if not Path(queue_file).exists():
+        return []
+
+    return json.loads(Path(queue_file).read_text(encoding='utf-8'))['jobs']
+
+
+def _save_queue(queue_file: Union[str, os.PathLike], jobs: List[Dict]):
+    """保存任务队列, 先写入临时文件再替换, 避免中断时损坏任务队列.
+
+    Args:
+        queue_file: str or os.PathLike,
+            任务队列文件.
+        jobs: list of dict,
+            任务组成的列表.
+    """
+    temp_file = Path(str(queue_file) + '.part')
+    temp_file.write_text(json.dumps({'jobs': jobs},
+                                    ensure_ascii=False,
+                                    indent=2),
+                         encoding='utf-8')
+    os.replace(temp_file, queue_file)
+
+
+def _started_today(jobs: List[Dict]) -> List[Dict]:
+    """筛选今天已经开始下载的任务.
+
+    Args:
+        jobs: list of dict,
+            任务组成的列表.
+
+    Return:
+        今天已经开始下载的任务, 按照开始时间排序.
+    """
+    today = date.today()
+    started_jobs = [job for job in jobs
+                    if job['started_at'] and
+                    date.fromtimestamp(job['started_at']) == today]
+
+    return sorted(started_jobs, key=lambda job: job['started_at'])
+
+
+async def _wait_for_window(jobs: List[Dict], interval: float):
+    """等待到下一个下载时间窗口, 两次下载之间至少间隔`interval`秒并加入随机抖动.
+
+    Args:
+        jobs: list of dict,
+            任务组成的列表.
+        interval: float,
+            两次下载之间的最短间隔(秒).
+    """
+    started_jobs = _started_today(jobs)
+    if not started_jobs:
+        return
+
+    next_time = started_jobs[-1]['started_at'] + interval * random.uniform(1, 1.5)  # noqa: E501
+    wait_time = next_time - time.time()
+    if wait_time > 0:
+        logger.info('等待%.0f秒后下载下一本图书.', wait_time)
+        await asyncio.sleep(wait_time)
+
+
+async def download_many(names: List[str],
+                        rdata_dir: Union[str, os.PathLike] = '.',
+                        queue_file: Union[str, os.PathLike] = 'weread-queue.json',  # noqa: E501
+                        daily_quota: int = 3,
+                        interval: float = 600,
+                        headless: bool = False,
+                        incognito: bool = True,
+                        delay: float = 2,
+                        verbose: bool = False,
+                        info: bool = False,
+                        catalog_file: Optional[Union[str, os.PathLike]] = None,
+                        profile_dir: Optional[Union[str, os.PathLike]] = None,
+                        cache_images: bool = True,
+                        rate_limiter: Optional[RateLimiter] = None) -> List[Path]:  # noqa: E501
+    """使用同一个浏览器批量下载多本图书的原始数据.
+
+    图书将加入持久化的任务队列; 每次运行只登录一次, 只读取一次书架,
+    并按照每日配额和时间间隔下载队列中等待的图书, 超出配额的图书将留到之后运行时下载.
+
+    Args:
+        names: list of str,
+            需要加入任务队列的图书名称, 可以为空列表(只下载队列中等待的图书).
+        rdata_dir: str or os.PathLike, default='.',
+            原始数据文件的保存目录.
+        queue_file: str or os.PathLike, default='weread-queue.json',
+            任务队列文件.
+        daily_quota: int, default=3,
+            每天最多下载的图书数量, 超过3本就会被微信读书的服务器监控到异常流量.
+        interval: float, default=600,
+            两本图书之间的最短间隔(秒), 实际间隔会加入最多50%的随机抖动.
+        headless: bool, default=False,
+            是否为浏览器设置无界面(headless)模式.
+        incognito: bool, default=True,
+            是否为浏览器设置无痕模式.
+        delay: float, default=2,
+            初始的章节间隔(秒), 用于等待网页加载并模拟人类操作,
+             之后将根据网络实际情况自动调整.
+        verbose: bool, default=False,
+            是否展示下载过程的详细信息.
+        info: bool, default=False,
+            是否输出提示信息.
+        catalog_file: str or os.PathLike, default=None,
+            图书目录文件, 设置时将在每本图书下载完成后更新图书目录.
+        profile_dir: str or os.PathLike, default=None,
+            保存会话的用户数据目录, 会话有效时将跳过扫码登录.
+        cache_images: bool, default=True,
+            是否直接保存浏览器渲染章节时已经加载的图片, 只有未命中的图片才会重新下载.
+        rate_limiter: RateLimiter, default=None,
+            切换章节使用的自适应限速器, 默认根据`delay`创建;
+             响应变慢或出错时将自动降低速率, 可以通过`rate_limiter.rate`查看当前速率.
+
+    Return:
+        本次下载的原始数据文件的绝对路径组成的列表.
+    """
+    # 将新的图书加入任务队列, 失败的任务将重新等待下载.
+    jobs = _load_queue(queue_file)
+    queued_jobs = {job['name']: job for job in jobs}
+    for name in names:
+        if name not in queued_jobs:
+            job = {'name': name, 'status': 'pending', 'started_at': None,
+                   'finished_at': None, 'rdata_file': None, 'error': None}
+            jobs.append(job)
+            queued_jobs[name] = job
+        elif queued_jobs[name]['status'] == 'failed':
+            queued_jobs[name].update({'status': 'pending', 'error': None})
+        elif verbose:
+            logger.info('《%s》已经下载过, 跳过.', name)
+    _save_queue(queue_file, jobs)
+
+    # 根据每日配额选择本次下载的任务.
+    pending_jobs = [job for job in jobs if job['status'] == 'pending']
+    quota = max(daily_quota - len(_started_today(jobs)), 0)
+    if not pending_jobs or not quota:
+        if info:
+            logger.info('没有可以下载的图书, 等待中的图书%s本, 今日剩余配额%s本.',
+                        len(pending_jobs), quota)
+        return []
+
+    # 启动浏览器, 登录账户, 一次性查找全部图书.
+    browser, page = await _launch_browser(headless, incognito, profile_dir)
+    cached_images, tasks = _capture_images(page) if cache_images else ({}, [])
+    rate_limiter = rate_limiter or _chapter_rate_limiter(delay)  # 多本图书共享速率.  # noqa: E501
+    rdata_file_paths = []
+    started = 0  # 开始下载的任务(包括失败的任务)都会占用配额.
+    try:
+        book_urls = await _find_books(page, [job['name'] for job in pending_jobs])  # noqa: E501
+        for job in pending_jobs:
+            if started >= quota:
+                break
+            if job['name'] not in book_urls:
+                logger.warning('没有找到你想要下载的《%s》, 请检查你是否拥有这本书或书名是否正确!',
+                               job['name'])
+                job.update({'status': 'failed', 'error': 'not found'})
+                _save_queue(queue_file, jobs)
+                continue
+
+            await _wait_for_window(jobs, interval)
+            job['started_at'] = time.time()
+            started += 1
+            _save_queue(queue_file, jobs)
+            rdata_file = None
+            completed = False
+            try:
+                rdata_file, rdata_file_path, book_metadata, image_urls = await _download_text(  # noqa: E501
+                    page, book_urls[job['name']], None, rate_limiter, verbose, rdata_dir  # noqa: E501
+                )
+                await asyncio.gather(*tasks)
+                _save_book(rdata_file,
+                           book_metadata,
+                           image_urls,
+                           verbose,
+                           cached_images)
+                completed = True
+            except Exception as err:
+                logger.warning('《%s》下载失败: %s', job['name'], err)
+                job.update({'status': 'failed', 'error': str(err)})
+                _save_queue(queue_file, jobs)
+                continue
+            finally:
+                # 每本图书保存完成后释放缓存的图片.
+                cached_images.clear()
+                tasks.clear()
+                # 关闭并删除不完整的原始数据文件, 避免被`watch`, `index`等读取.
+                if not completed and rdata_file is not None:
+                    _discard_rdata(rdata_file)
+
+            if catalog_file:
+                update_catalog(catalog_file, rdata_file_path)
+
+            rdata_file_paths.append(rdata_file_path.absolute())
+            job.update({'status': 'done',
+                        'finished_at': time.time(),
+                        'rdata_file': str(rdata_file_path.absolute())})
+            _save_queue(queue_file, jobs)
+            if verbose:
+                logger.info('《%s》下载完成.', job['name'])
+    finally:
+        await browser.close()
+
+    if verbose:
+        logger.info('-' * 50)
+
+    if info:
+        logger.info('成功下载%s本图书的原始数据到本地:)', len(rdata_file_paths))
+
+    return rdata_file_paths
@@ -0,0 +1,163 @@
+import os
+
+from pathlib import Path
+from typing import Dict, Iterator, List, Literal, NamedTuple, Tuple, Union
+from zipfile import ZipFile, ZipInfo
+
+from bs4 import BeautifulSoup
+
+from weread import logger
+from weread.core.generate import (
+    _load_rdata,
+    _processing_html,
+    _wrap_chapter_xhtml
+)
+
+ContentMode = Literal['xhtml', 'text']
+
+
+class Chapter(NamedTuple):
+    """单个章节的记录.
+
+    Attributes:
+        uid: int,
+            章节的uid.
+        index: int,
+            章节在`toc.json`中的序号(从0开始).
+        title: str,
+            章节的标题.
+        level: int,
+            章节在目录中的层级.
+        content: str,
+            清理后的章节xhtml文本或纯文本.
+        images: list of str,
+            章节引用的图片在原始数据文件中的路径, 比如`Images/xxx.jpg`.
+    """
+    uid: int
+    index: int
+    title: str
+    level: int
+    content: str
+    images: List[str]
+
+
+def _html_images(html: BeautifulSoup) -> List[str]:
+    """提取处理完成的html中引用的图片.
+
+    Args:
+        html: BeautifulSoup,
+            经过`_processing_html`处理完成的html.
+
+    Return:
+        图片在原始数据文件中的路径组成的列表.
+    """
+    images = []
+    for image_node in html.find_all('img'):
+        image = 'Images/' + Path(image_node.attrs['src']).name
+        if image not in images:
+            images.append(image)
+
+    return images
+
+
+def _html_text(html: BeautifulSoup) -> str:
+    """提取处理完成的html中的纯文本, 每个标题或段落为一行.
+
+    Args:
+        html: BeautifulSoup,
+            经过`_processing_html`处理完成的html.
+
+    Return:
+        章节的纯文本.
+    """
+    lines = []
+    for node in html.find_all(['h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'p']):
+        line = node.get_text().strip()
+        if line:
+            lines.append(line)
+
+    return '\n'.join(lines)
+
+
+def _iter_rdata_html(rdata: ZipFile,
+                     file_list: List[ZipInfo],
+                     chapter_infos: List[Dict]
+                     ) -> Iterator[Tuple[int, Dict, BeautifulSoup]]:
+    """按照`toc.json`的顺序逐章读取并清理已经打开的原始数据文件中的章节html, 结束时关闭文件.
+
+    Args:
+        rdata: ZipFile,
+            原始数据文件的文件指针.
+        file_list: list of ZipInfo,
+            原始数据文件的文件列表.
+        chapter_infos: list of dict,
+            书籍章节的原始信息.
+
+    Return:
+        章节序号, 章节的原始信息和经过`_processing_html`处理完成的html的生成器.
+    """
+    namelist = {file.filename for file in file_list}
+
+    try:
+        for i, chapter_info in enumerate(chapter_infos):
+            chapter_file = f'Text/chapter-{chapter_info["chapterUid"]}.html'
+            if chapter_file not in namelist:
+                logger.warning('文件 %s 未找到!', chapter_file)
+                continue
+
+            yield i, chapter_info, _processing_html(rdata.read(chapter_file))
+    finally:
+        rdata.close()
+
+
+def _iter_chapter_html(rdata_file: Union[str, os.PathLike]
+                       ) -> Iterator[Tuple[int, Dict, BeautifulSoup]]:
+    """按照`toc.json`的顺序逐章读取并清理原始数据文件中的章节html.
+
+    Args:
+        rdata_file: str or os.PathLike,
+            原始数据文件.
+
+    Return:
+        章节序号, 章节的原始信息和经过`_processing_html`处理完成的html的生成器.
+    """
+    rdata, file_list, _, chapter_infos = _load_rdata(rdata_file)
+
+    yield from _iter_rdata_html(rdata, file_list, chapter_infos)
+
+
+def iter_chapters(rdata_file: Union[str, os.PathLike],
+                  mode: ContentMode = 'xhtml') -> Iterator[Chapter]:
+    """按照`toc.json`的顺序逐章遍历原始数据文件.
+
+    每次只读取和处理一个章节, 内存占用与章节大小相关而与图书大小无关;
+    章节的清理逻辑与生成ePub文件时完全相同.
+
+    Example:
+        ```python
+        for chapter in iter_chapters('怦然心动.rdata.zip', mode='text'):
+            print(chapter.uid, chapter.title, len(chapter.content))
+        ```
+
+    Args:
+        rdata_file: str or os.PathLike,
+            原始数据文件.
+        mode: {'xhtml', 'text'}, default='xhtml',
+            章节内容的格式, 标准xhtml文本或者纯文本.
+
+    Return:
+        章节记录的生成器.
+    """
+    for i, chapter_info, html in _iter_chapter_html(rdata_file):
+        images = _html_images(html)
+        if mode == 'text':
+            content = _html_text(html)
+        else:
+            content = _wrap_chapter_xhtml(html)
+
+        yield Chapter(uid=chapter_info['chapterUid'],
+                      index=i,
+                      title=chapter_info['title'],
+                      level=chapter_info.get('level', 1),
+                      content=content,
+                      images=images)
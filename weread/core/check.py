@@ -1,33 +1,47 @@
+import asyncio
 import json
 import os
 import sys
+import threading
+import zlib
 
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
 from pathlib import Path
-from typing import Union
-from zipfile import BadZipFile, ZipFile
+from typing import Dict, List, Optional, Set, Tuple, Union
+from zipfile import BadZipFile, ZipFile, ZipInfo
 
 from bs4 import BeautifulSoup
+from lxml import etree
 
 from weread import logger
+from weread.core.progress import (
+    AsyncProgress,
+    Progress,
+    ProgressCallback,
+    ProgressTracker,
+    Steps,
+    arun_steps,
+    run_steps,
+    track_steps
+)
 
+try:
+    from PIL import Image
+except ModuleNotFoundError:  # 只有完整解码图片时需要Pillow.
+    Image = None
 
-def check(rdata_file: Union[str, os.PathLike],
-          verbose: bool = False,
-          info: bool = False) -> bool:
-    """检查下载的原始数据文件的完整性.
+
+def _list_rdata(rdata_file: Union[str, os.PathLike]) -> Tuple[List[str], List[str]]:  # noqa: E501
+    """查看原始数据文件中的图片和文本文件.
 
     Args:
         rdata_file: str or os.PathLike,
             原始数据文件.
-        verbose: bool, default=False,
-            是否展示检查ePub文件的详细信息.
-        info: bool, default=False,
-            是否输出提示信息.
 
     Return:
-        检查的情况.
+        图片文件列表和文本文件列表.
     """
-    # 查看rdata文件的内容.
     try:
         file_list = ZipFile(rdata_file).infolist()
         image_list = []
@@ -39,36 +53,264 @@ def check(rdata_file: Union[str, os.PathLike],
             elif file.filename.startswith('Text/'):
                 text_list.append(file.filename)
     except BadZipFile:
-        logger.error(f'{Path(rdata_file).name} 不是一个合法的rdata文件!')
+        logger.error('%s 不是一个合法的rdata文件!', Path(rdata_file).name)
         sys.exit(1)
     except FileNotFoundError:
         logger.error('请检查你的rdata文件路径, 未找到rdata文件!')
         sys.exit(1)
 
+    return image_list, text_list
+
+
+def _chapter_images(html: bytes) -> Set[str]:
+    """提取原始章节html中引用的图片.
+
+    Args:
+        html: bytes,
+            原始章节内容.
+
+    Return:
+        图片在原始数据文件中的路径组成的集合, 比如`Images/xxx.jpg`.
+    """
+    images = BeautifulSoup(html, features='lxml').find_all('img')
+
+    return {'Images/' + image['data-src'].split('/')[-1] + '.jpg'
+            for image in images if image.get('data-src')}
+
+
+def _check_steps(rdata_file: Union[str, os.PathLike],
+                 verbose: bool) -> Steps[bool]:
+    """逐章检查原始数据文件的完整性, 先产出全部的章节数, 之后每检查完一章产出一次进度.
+
+    Args:
+        rdata_file: str or os.PathLike,
+            原始数据文件.
+        verbose: bool,
+            是否展示检查ePub文件的详细信息.
+
+    Return:
+        检查的情况.
+    """
+    # 查看rdata文件的内容.
+    image_list, text_list = _list_rdata(rdata_file)
+
     image_set = set()
     status = True
 
     # 提取图书章节数据, 检查文本完整性.
     chapter_infos = json.loads(ZipFile(rdata_file).read('toc.json'))
-    for chapter in chapter_infos:
+    yield Progress(0, len(chapter_infos), '')
+    for i, chapter in enumerate(chapter_infos):
         chapter_file = f'Text/chapter-{chapter["chapterUid"]}.html'
         if chapter_file not in text_list and verbose:
-            logger.warning(f'文件 {chapter_file} 未找到!')
+            logger.warning('文件 %s 未找到!', chapter_file)
             status = False
         else:
-            # 添加当前章节的对应图片.
-            html = ZipFile(rdata_file).read(chapter_file)
-            images = BeautifulSoup(html, features='lxml').find_all('img')
-            for image in images:
-                image_set.add(image['data-src'].split('/')[-1])
+            # 添加当前章节的对应图片; 损坏的章节记录为检查失败, 留给深度校验报告.
+            try:
+                html = ZipFile(rdata_file).read(chapter_file)
+            except (BadZipFile, zlib.error) as err:
+                logger.warning('文件 %s 已损坏: %s', chapter_file, err)
+                status = False
+            else:
+                image_set.update(_chapter_images(html))
+
+        yield Progress(i + 1, len(chapter_infos), chapter_file)
 
     # 检查图片完整性.
-    image_set.add('coverpage')  # 添加封面文件.
+    image_set.add('Images/coverpage.jpg')  # 添加封面文件.
     for image in image_set:
-        if f'Images/{image}.jpg' not in image_list and verbose:
-            logger.warning(f'图片 Images/{image}.jpg 未找到!')
+        if image not in image_list and verbose:
+            logger.warning('图片 %s 未找到!', image)
             status = False
 
+    return status
+
+
+def _sniff_image(data: bytes) -> Optional[str]:
+    """通过文件头和文件尾检查图片是否完整.
+
+    Args:
+        data: bytes,
+            图片数据.
+
+    Return:
+        错误信息, 图片完整时返回None.
+    """
+    if data.startswith(b'\xff\xd8\xff'):
+        # 部分JPEG图片在结束标记后有填充字节.
+        if b'\xff\xd9' not in data[-64:]:
+            return 'JPEG图片缺少结束标记, 图片被截断.'
+    elif data.startswith(b'\x89PNG\r\n\x1a\n'):
+        if b'IEND' not in data[-12:]:
+            return 'PNG图片缺少IEND块, 图片被截断.'
+    elif data.startswith((b'GIF87a', b'GIF89a')):
+        if not data.rstrip(b'\x00').endswith(b';'):
+            return 'GIF图片缺少结束标记, 图片被截断.'
+    elif data.startswith(b'RIFF') and data[8:12] == b'WEBP':
+        if int.from_bytes(data[4:8], 'little') + 8 > len(data):
+            return 'WebP图片的长度不足, 图片被截断.'
+    else:
+        return '无法识别的图片格式.'
+
+    return None
+
+
+def _verify_entry(rdata: ZipFile,
+                  file: ZipInfo,
+                  full_decode: bool) -> Optional[str]:
+    """校验原始数据文件中的单个文件, 读取时将同时校验CRC.
+
+    Args:
+        rdata: ZipFile,
+            原始数据文件.
+        file: ZipInfo,
+            需要校验的文件.
+        full_decode: bool,
+            是否完整解码图片.
+
+    Return:
+        错误信息, 文件完整时返回None.
+    """
+    try:
+        data = rdata.read(file)  # 读取到文件末尾时ZipFile将校验CRC.
+    except (BadZipFile, EOFError, zlib.error) as err:
+        return f'读取失败: {err}'
+
+    if file.filename.startswith('Images/'):
+        error = _sniff_image(data)
+        if error is None and full_decode:
+            try:
+                with Image.open(BytesIO(data)) as image:
+                    image.load()
+            except (OSError, SyntaxError, ValueError) as err:
+                error = f'图片解码失败: {err}'
+        return error
+    elif file.filename.startswith(('Text/', 'Styles/')):
+        try:
+            html = data.decode('utf-8')
+        except UnicodeDecodeError as err:
+            return f'不是合法的UTF-8文本: {err}'
+        if file.filename.startswith('Text/'):
+            root = etree.fromstring(html, etree.HTMLParser()) if html.strip() else None  # noqa: E501
+            if root is None or root.find('body') is None:
+                return '章节的html无法解析.'
+    elif file.filename.endswith('.json'):
+        try:
+            json.loads(data)
+        except ValueError as err:
+            return f'不是合法的JSON: {err}'
+
+    return None
+
+
+def _deep_check(rdata_file: Union[str, os.PathLike],
+                full_decode: bool = False,
+                workers: Optional[int] = None,
+                callback: Optional[ProgressCallback] = None) -> Dict:
+    """使用线程池校验原始数据文件中全部文件的CRC, 图片和章节html.
+
+    解压和校验CRC(zlib)以及解码图片时会释放GIL, 因此使用线程池并行校验;
+    每个线程使用独立的ZipFile, 避免争用同一个文件指针.
+
+    Args:
+        rdata_file: str or os.PathLike,
+            原始数据文件.
+        full_decode: bool, default=False,
+            是否使用Pillow完整解码图片, 否则只检查图片的文件头和文件尾.
+        workers: int, default=None,
+            线程的数量, 默认为ThreadPoolExecutor的默认值.
+        callback: Callable, default=None,
+            进度回调, 每校验完一个文件调用一次.
+
+    Return:
+        校验报告, 包含原始数据文件的路径, 校验的情况, 文件数量,
+         文件解压后的总大小和错误组成的列表.
+    """
+    if full_decode and Image is None:
+        logger.error("完整解码图片需要安装Pillow, 请运行`pip install 'weread[headless]'`.")  # noqa: E501
+        sys.exit(1)
+
+    with ZipFile(rdata_file) as rdata:
+        file_list = [file for file in rdata.infolist() if not file.is_dir()]
+
+    local = threading.local()
+    rdata_files = []
+
+    def _verify(file: ZipInfo) -> Optional[str]:
+        if not hasattr(local, 'rdata'):
+            local.rdata = ZipFile(rdata_file)
+            rdata_files.append(local.rdata)
+        return _verify_entry(local.rdata, file, full_decode)
+
+    tracker = ProgressTracker('deep-check', callback)
+    tracker.start(len(file_list))
+    errors = []
+    try:
+        with ThreadPoolExecutor(workers) as executor:
+            for file, error in zip(file_list,
+                                   executor.map(_verify, file_list)):
+                if error is not None:
+                    errors.append({'file': file.filename, 'error': error})
+                tracker.advance(file.filename, file.file_size)
+        tracker.finish()
+    finally:
+        for rdata in rdata_files:
+            rdata.close()
+
+    return {
+        'rdata_file': str(Path(rdata_file).absolute()),
+        'status': not errors,
+        'files': len(file_list),
+        'size': sum(file.file_size for file in file_list),
+        'errors': errors
+    }
+
+
+def _write_report(report: Dict,
+                  report_file: Optional[Union[str, os.PathLike]]):
+    """保存JSON格式的校验报告.
+
+    Args:
+        report: dict,
+            校验报告.
+        report_file: str or os.PathLike or None,
+            校验报告的保存路径, `-`表示写入标准输出, None表示不保存.
+    """
+    report_json = json.dumps(report, ensure_ascii=False, indent=2)
+    if report_file == '-':
+        sys.stdout.write(report_json + '\n')
+    elif report_file is not None:
+        Path(report_file).write_text(report_json, encoding='utf-8')
+
+
+def _deep_check_info(report: Dict, verbose: bool):
+    """输出深度校验的错误信息.
+
+    Args:
+        report: dict,
+            校验报告.
+        verbose: bool,
+            是否展示检查ePub文件的详细信息.
+    """
+    for error in report['errors']:
+        logger.warning('文件 %s 已损坏: %s', error['file'], error['error'])
+    if verbose:
+        logger.info('深度校验了%s个文件, 共%.2fMB.',
+                    report['files'], report['size'] / 1024 / 1024)
+
+
+def _check_info(status: bool, verbose: bool, info: bool):
+    """输出检查结果的提示信息.
+
+    Args:
+        status: bool,
+            检查的情况.
+        verbose: bool,
+            是否展示检查ePub文件的详细信息.
+        info: bool,
+            是否输出提示信息.
+    """
     if verbose:
         logger.info('-' * 50)
 
@@ -77,4 +319,102 @@ def check(rdata_file: Union[str, os.PathLike],
     elif info and not status:
         logger.info('下载的原始数据文件有缺失, 请使用`download`命令重新下载.')
 
+
+def check(rdata_file: Union[str, os.PathLike],
+          verbose: bool = False,
+          info: bool = False,
+          deep: bool = False,
+          full_decode: bool = False,
+          workers: Optional[int] = None,
+          report_file: Optional[Union[str, os.PathLike]] = None,
+          callback: Optional[ProgressCallback] = None) -> bool:
+    """检查下载的原始数据文件的完整性.
+
+    Args:
+        rdata_file: str or os.PathLike,
+            原始数据文件.
+        verbose: bool, default=False,
+            是否展示检查ePub文件的详细信息.
+        info: bool, default=False,
+            是否输出提示信息.
+        deep: bool, default=False,
+            是否深度校验, 使用线程池校验全部文件的CRC,
+             检查图片是否被截断和章节html能否解析.
+        full_decode: bool, default=False,
+            深度校验时是否使用Pillow完整解码图片.
+        workers: int, default=None,
+            深度校验使用的线程数量.
+        report_file: str or os.PathLike, default=None,
+            JSON格式的深度校验报告的保存路径, `-`表示写入标准输出.
+        callback: Callable, default=None,
+            进度回调, 参数为`ProgressEvent`; 逐章检查('check')和深度校验('deep-check')
+             阶段开始, 每完成一个步骤和阶段结束时各调用一次.
+
+    Return:
+        检查的情况.
+    """
+    status = run_steps(track_steps(_check_steps(rdata_file, verbose),
+                                   ProgressTracker('check', callback)))
+    if deep:
+        report = _deep_check(rdata_file, full_decode, workers, callback)
+        report['status'] = status = status and report['status']
+        _deep_check_info(report, verbose)
+        _write_report(report, report_file)
+    _check_info(status, verbose, info)
+
+    return status
+
+
+async def acheck(rdata_file: Union[str, os.PathLike],
+                 verbose: bool = False,
+                 info: bool = False,
+                 progress: Optional[AsyncProgress] = None,
+                 deep: bool = False,
+                 full_decode: bool = False,
+                 workers: Optional[int] = None,
+                 report_file: Optional[Union[str, os.PathLike]] = None,
+                 callback: Optional[ProgressCallback] = None) -> bool:
+    """异步检查下载的原始数据文件的完整性, 逐章在执行器中解析, 不阻塞事件循环.
+
+    Args:
+        rdata_file: str or os.PathLike,
+            原始数据文件.
+        verbose: bool, default=False,
+            是否展示检查ePub文件的详细信息.
+        info: bool, default=False,
+            是否输出提示信息.
+        progress: AsyncProgress, default=None,
+            异步进度迭代器, 每检查完一章产出一次进度.
+        deep: bool, default=False,
+            是否深度校验, 使用线程池校验全部文件的CRC,
+             检查图片是否被截断和章节html能否解析.
+        full_decode: bool, default=False,
+            深度校验时是否使用Pillow完整解码图片.
+        workers: int, default=None,
+            深度校验使用的线程数量.
+        report_file: str or os.PathLike, default=None,
+            JSON格式的深度校验报告的保存路径, `-`表示写入标准输出.
+        callback: Callable, default=None,
+            进度回调, 参数为`ProgressEvent`; 逐章检查('check')和深度校验('deep-check')
+             阶段开始, 每完成一个步骤和阶段结束时各调用一次; 回调在执行器的线程中调用.
+
+    Return:
+        检查的情况.
+    """
+    status = await arun_steps(track_steps(_check_steps(rdata_file, verbose),
+                                          ProgressTracker('check', callback)),
+                              progress)
+    if deep:
+        loop = asyncio.get_running_loop()
+        report = await loop.run_in_executor(None,
+                                            _deep_check,
+                                            rdata_file,
+                                            full_decode,
+                                            workers,
+                                            callback)
+        report['status'] = status = status and report['status']
+        _deep_check_info(report, verbose)
+        _write_report(report, report_file)
+    _check_info(status, verbose, info)
+
     return status
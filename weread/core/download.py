@@ -1,21 +1,28 @@
+import asyncio
 import json
 import os
+import shutil
 import sys
 import time
 
+from http.client import HTTPException
 from pathlib import Path
-from tempfile import mkstemp
-from typing import List, Optional, Tuple, Union
-from urllib.error import HTTPError
-from urllib.request import urlretrieve
+from tempfile import SpooledTemporaryFile
+from typing import Dict, List, Optional, Set, Tuple, Union
+from urllib.error import HTTPError, URLError
+from urllib.request import urlopen
 from zipfile import ZIP_DEFLATED, ZipFile
 
 from bs4 import BeautifulSoup
-from pyppeteer import launch
+from pyppeteer import errors, launch
 from pyppeteer.browser import Browser
+from pyppeteer.network_manager import Response
 from pyppeteer.page import Page
 
 from weread import logger
+from weread.core.library import update_catalog
+from weread.core.progress import ProgressCallback, ProgressTracker
+from weread.core.ratelimit import RateLimiter
 
 try:
     import base64
@@ -28,6 +35,62 @@ except ModuleNotFoundError:
     logger.warning("如果你需要使用headless模式, 请运行`pip install 'weread[headless]'`"
                    "安装依赖项, 否则请忽略警告.")
 
+# 只提取需要的字段, 避免每次都通过DevTools协议序列化整个阅读器的状态
+# (包括全部章节信息和样式表, 导致传输的数据量随章节数平方增长).
+_BOOK_METADATA_JS = '''(elm) => {
+    const reader = elm.__vue__.$store.state.reader
+    return {
+        bookInfo: reader.bookInfo,
+        chapterInfos: reader.chapterInfos,
+        chapterContentStyles: reader.chapterContentStyles
+    }
+}'''
+_CHAPTER_METADATA_JS = '''(elm) => {
+    const reader = elm.__vue__.$store.state.reader
+    return {
+        currentChapter: { chapterUid: reader.currentChapter.chapterUid },
+        chapterContentHtml: reader.chapterContentHtml
+    }
+}'''
+# 切换前记录上一章的内容, 章节的uid可能先于内容更新;
+# 内容被替换(或者原地修改)之后才认为新章节加载完成, 避免把上一章的内容保存到新章节.
+_CHANGE_CHAPTER_JS = '''(elm, uid) => {
+    const reader = document.querySelector('#app').__vue__.$store.state.reader
+    const content = reader.chapterContentHtml || []
+    const current = reader.currentChapter
+    const loaded = current && current.chapterUid === uid
+    window.__wereadPrevious = loaded ? null : { content, first: content[0] }
+    elm.__vue__.changeChapter({ chapterUid: uid })
+}'''
+_CHAPTER_LOADED_JS = '''(uid) => {
+    const reader = document.querySelector('#app').__vue__.$store.state.reader
+    const content = reader.chapterContentHtml
+    const previous = window.__wereadPrevious
+    return Boolean(reader.currentChapter &&
+                   reader.currentChapter.chapterUid === uid &&
+                   Array.isArray(content) && content.length > 0 &&
+                   (!previous || content !== previous.content ||
+                    content[0] !== previous.first))
+}'''
+
+# 最多重试的次数, 每次失败后限速器都会降低速率.
+_RETRIES = 3
+# 下载图片使用的缓冲区大小.
+_COPY_BUFFER_SIZE = 256 * 1024
+# 下载图片时在内存中缓存的最大字节数, 超过后缓存到临时文件.
+_SPOOL_SIZE = 4 * 1024 * 1024
+# 下载单张图片的超时时间(秒).
+_IMAGE_TIMEOUT = 30
+
+
+def _weread_url() -> str:
+    """获取微信读书网站的地址, 可以通过环境变量`WEREAD_URL`替换成本地模拟的网站.
+
+    Return:
+        微信读书网站的地址.
+    """
+    return os.environ.get('WEREAD_URL', 'https://weread.qq.com').rstrip('/')
+
 
 def _generate_qrcode(base64_str: str):
     """生成登录二维码.
@@ -46,29 +109,66 @@ def _generate_qrcode(base64_str: str):
     qrcode.print_ascii(invert=False)
 
 
+async def _is_logged_in(page: Page) -> bool:
+    """检查保存的会话是否仍然有效.
+
+    Args:
+        page: Page,
+            进行操作的页面.
+
+    Returns:
+        会话是否有效.
+    """
+    await page.goto(_weread_url() + '/')
+    try:
+        await page.waitForSelector('.wr_avatar.navBar_avatar', timeout=5000)
+    except errors.TimeoutError:
+        return False
+
+    return True
+
+
 async def _launch_browser(headless: bool,
-                          incognito: bool) -> Tuple[Browser, Page]:
+                          incognito: bool,
+                          profile_dir: Optional[Union[str, os.PathLike]] = None
+                          ) -> Tuple[Browser, Page]:
     """启动浏览器并通过扫码登录账户.
 
+    设置用户数据目录时, 会话(cookies和localStorage)将保存到用户数据目录中;
+    之后启动时如果会话仍然有效, 将跳过扫码登录.
+
     Args:
         headless: bool,
             是否设置无界面(headless)模式.
         incognito: bool,
-            是否设置无痕模式.
+            是否设置无痕模式, 设置用户数据目录时无效.
+        profile_dir: str or os.PathLike, default=None,
+            保存会话的用户数据目录.
 
     Returns:
         启动的浏览器和进行操作的页面.
     """
-    browser = await launch(headless=headless, logLevel='ERROR')
+    if profile_dir:
+        # 无痕模式不会保存会话, 直接使用默认的浏览器上下文.
+        browser = await launch(headless=headless,
+                               logLevel='ERROR',
+                               userDataDir=str(Path(profile_dir).absolute()))
+        page = await browser.newPage()
 
-    # 设置无痕模式.
-    if incognito:
-        context = await browser.createIncognitoBrowserContext()
-        page = await context.newPage()
+        if await _is_logged_in(page):
+            logger.info('使用保存的会话登录成功:)')
+            return browser, page
     else:
-        page = await browser.newPage()
+        browser = await launch(headless=headless, logLevel='ERROR')
+
+        # 设置无痕模式.
+        if incognito:
+            context = await browser.createIncognitoBrowserContext()
+            page = await context.newPage()
+        else:
+            page = await browser.newPage()
 
-    await page.goto('https://weread.qq.com/#login')
+    await page.goto(_weread_url() + '/#login')
 
     # 在headless模式下, 将在终端显示登录二维码.
     if headless:
@@ -124,9 +224,40 @@ def _download_chapter_content(metadata: dict,
     return image_urls
 
 
+def _capture_images(page: Page) -> Tuple[Dict[str, bytes], List[asyncio.Future]]:  # noqa: E501
+    """监听页面的网络响应, 保存浏览器渲染章节时已经加载的图片.
+
+    Args:
+        page: Page,
+            进行操作的页面.
+
+    Return:
+        图片url和图片数据组成的字典(随着页面加载图片持续更新),
+         和读取图片数据的任务组成的列表(关闭浏览器前需要等待完成).
+    """
+    images, tasks = {}, []
+
+    async def _save_image(response: Response):
+        try:
+            images[response.url] = await response.buffer()
+        except errors.PyppeteerError:  # 响应已经被浏览器释放, 之后将通过HTTP下载.
+            pass
+
+    def _on_response(response: Response):
+        if response.request.resourceType == 'image' and response.ok:
+            tasks.append(asyncio.ensure_future(_save_image(response)))
+
+    page.on('response', _on_response)
+
+    return images, tasks
+
+
 def _download_images(image_urls: List[str],
                      rdata_file: ZipFile,
-                     verbose: bool):
+                     verbose: bool,
+                     cached_images: Optional[Dict[str, bytes]] = None,
+                     rate_limiter: Optional[RateLimiter] = None,
+                     tracker: Optional[ProgressTracker] = None):
     """根据图片的url下载图书中的全部图片.
 
     Args:
@@ -136,109 +267,251 @@ def _download_images(image_urls: List[str],
             原始数据文件.
         verbose: bool,
             是否展示下载过程的详细信息.
+        cached_images: dict, default=None,
+            浏览器已经加载的图片url和图片数据, 命中的图片将直接写入, 不再重复下载.
+        rate_limiter: RateLimiter, default=None,
+            下载图片使用的限速器, 默认为初始速率5张/秒, 最高速率20张/秒.
+        tracker: ProgressTracker, default=None,
+            下载图片的进度跟踪器, 每处理一张图片报告一次进度和图片大小.
     """
+    cached_images = cached_images or {}
+    rate_limiter = rate_limiter or RateLimiter(rate=5, max_rate=20)
+    tracker = tracker or ProgressTracker('images')
+    tracker.start(len(image_urls))
     for image_url in image_urls:
         if 'cover' in image_url:
             image_name = 'Images/coverpage.jpg'
         else:
             image_name = 'Images/' + image_url.split('/')[-1] + '.jpg'
 
-        # 下载单张图片到原始数据文件.
-        try:
-            _, temp_image_path = mkstemp()
-            urlretrieve(url=image_url, filename=temp_image_path)
-            rdata_file.write(temp_image_path, image_name)
+        # 直接写入浏览器已经加载的图片.
+        if image_url in cached_images:
+            rdata_file.writestr(image_name, cached_images[image_url])
+            tracker.advance(image_name, len(cached_images[image_url]))
+            if verbose:
+                logger.info('图片%s从浏览器缓存中写入完成.', image_name)
+            continue
+
+        # 下载单张图片到原始数据文件, 被限流, 服务器错误或网络错误时降速重试.
+        image_size = 0
+        for attempt in range(_RETRIES + 1):
+            rate_limiter.acquire()
+            start_time = time.monotonic()
+            # 先完整下载到缓冲区再写入原始数据文件, 中途断开不会留下不完整的图片.
+            buffer = SpooledTemporaryFile(_SPOOL_SIZE)
+            try:
+                with urlopen(image_url, timeout=_IMAGE_TIMEOUT) as response:
+                    shutil.copyfileobj(response, buffer, _COPY_BUFFER_SIZE)
+            except HTTPError as err:
+                buffer.close()
+                throttled = err.code == 429 or err.code >= 500
+                rate_limiter.record(time.monotonic() - start_time, ok=not throttled)  # noqa: E501
+                if throttled and attempt < _RETRIES:
+                    continue
+                logger.warning('状态码: %s, 没有找到图片%s, 你可以选择重新尝试或者无视警告.',  # noqa: E501
+                               err.code, image_url)
+                break
+            except (URLError, HTTPException, OSError) as err:
+                # 连接失败, 连接被重置, 超时以及响应不完整.
+                buffer.close()
+                rate_limiter.record(time.monotonic() - start_time, ok=False)
+                if attempt < _RETRIES:
+                    continue
+                logger.warning('网络错误: %s, 没有下载图片%s, 你可以选择重新尝试或者无视警告.',  # noqa: E501
+                               err, image_url)
+                break
+
+            rate_limiter.record(time.monotonic() - start_time)
+            buffer.seek(0)
+            with buffer, rdata_file.open(image_name, 'w') as fp:
+                shutil.copyfileobj(buffer, fp, _COPY_BUFFER_SIZE)
+            image_size = rdata_file.getinfo(image_name).file_size
             if verbose:
-                logger.info(f'图片{image_name}下载完成.')
-        except HTTPError as err:
-            logger.warning(f'状态码: {err.code}, '
-                           f'没有找到图片{image_url}, 你可以选择重新尝试或者无视警告.')
+                logger.info('图片%s下载完成.', image_name)
+            break
 
+        tracker.advance(image_name, image_size)
+    tracker.finish()
 
-async def download(name: str,
-                   rdata_file_path: Optional[Union[str, os.PathLike]] = None,
-                   headless: bool = False,
-                   incognito: bool = True,
-                   delay: float = 2,
-                   verbose: bool = False,
-                   info: bool = False) -> Path:
-    """根据图书名称下载原始的数据到本地.
+
+async def _find_books(page: Page, names: List[str]) -> Dict[str, str]:
+    """进入我的书架, 一次性查找全部图书的URL.
 
     Args:
-        name: str,
-            图书的名称.
-        rdata_file_path: str or os.PathLike, default=None,
-            原始数据文件保存路径, 默认为'./图书名.rdata.zip'.
-        headless: bool, default=False,
-            是否为浏览器设置无界面(headless)模式.
-        incognito: bool, default=True,
-            是否为浏览器设置无痕模式.
-        delay: float, default=2,
-            设置延时, 用于等待网页加载并模拟人类操作,
-             可根据网络实际情况进行调整.
-        verbose: bool, default=False,
-            是否展示下载过程的详细信息.
-        info: bool, default=False,
-            是否输出提示信息.
+        page: Page,
+            已经登录的页面.
+        names: list of str,
+            图书的名称组成的列表.
 
     Return:
-        原始数据文件保存的绝对路径.
+        找到的图书名称和URL组成的字典.
     """
-    # 启动浏览器, 登录账户.
-    browser, page = await _launch_browser(headless, incognito)
-
     # 进入我的书架, 提取图书的URL.
     await page.click('.bookshelf_preview_header_link')
-    book_urls = await page.xpath('//a[@class="shelfBook"]')  # //tagname[@attribute='value']  # noqa: E501
-
-    # 查找书籍并进入web阅读器.
-    book_url = None
-    for url in book_urls:
-        if name in await (await url.getProperty('text')).jsonValue():
-            book_url = str(await (await url.getProperty('href')).jsonValue())
-            await page.goto(book_url)
-            break
+    shelf_books = await page.xpath('//a[@class="shelfBook"]')  # //tagname[@attribute='value']  # noqa: E501
 
-    if not book_url:
-        await browser.close()
-        logger.error(f'没有找到你想要下载的《{name}》, 请检查你是否拥有这本书或书名是否正确!')
-        sys.exit(1)
+    book_urls = {}
+    for shelf_book in shelf_books:
+        text = await (await shelf_book.getProperty('text')).jsonValue()
+        for name in names:
+            if name not in book_urls and name in text:
+                book_urls[name] = str(await (await shelf_book.getProperty('href')).jsonValue())  # noqa: E501
+
+    return book_urls
+
+
+def _chapter_rate_limiter(delay: float) -> RateLimiter:
+    """根据延时创建切换章节使用的限速器.
+
+    Args:
+        delay: float,
+            初始的章节间隔(秒), 小于等于0时使用最高速率.
+
+    Return:
+        初始速率为`1 / delay`的限速器.
+    """
+    rate = 1 / delay if delay > 0 else 1
+
+    return RateLimiter(rate=rate,
+                       min_rate=min(rate, 0.05),
+                       max_rate=max(rate, 1))
+
+
+async def _change_chapter(page: Page, uid: int, rate_limiter: RateLimiter):
+    """在网页中切换章节并等待章节加载完成, 加载超时时降速重试.
+
+    Args:
+        page: Page,
+            web阅读器的页面.
+        uid: int,
+            章节的uid.
+        rate_limiter: RateLimiter,
+            切换章节使用的限速器.
+    """
+    for attempt in range(_RETRIES + 1):
+        await rate_limiter.aacquire()  # 用于等待图片加载并模拟人类操作.
+        start_time = time.monotonic()
+        await page.Jeval('#routerView', _CHANGE_CHAPTER_JS, uid)
+        try:
+            await page.waitForFunction(_CHAPTER_LOADED_JS, {'timeout': 30000}, uid)  # noqa: E501
+        except errors.TimeoutError:
+            rate_limiter.record(time.monotonic() - start_time, ok=False)
+            logger.warning('章节(uid=%s)加载超时, 降低速率到%.2f章/秒后重试.',
+                           uid, rate_limiter.rate)
+            continue
+
+        rate_limiter.record(time.monotonic() - start_time)
+        return
+
+    raise errors.TimeoutError(f'章节(uid={uid})重试{_RETRIES}次后仍然加载失败.')
+
+
+def _discard_rdata(rdata_file: ZipFile):
+    """关闭并删除下载失败的原始数据文件, 不会留下没有中央目录的不完整文件.
+
+    Args:
+        rdata_file: ZipFile,
+            原始数据文件.
+    """
+    try:
+        rdata_file.close()
+    except (OSError, ValueError):  # 写入失败时可能无法写入中央目录.
+        pass
+    Path(rdata_file.filename).unlink(missing_ok=True)
+
+
+async def _download_text(page: Page,
+                         book_url: str,
+                         rdata_file_path: Optional[Union[str, os.PathLike]],
+                         rate_limiter: RateLimiter,
+                         verbose: bool,
+                         rdata_dir: Union[str, os.PathLike] = '.',
+                         tracker: Optional[ProgressTracker] = None
+                         ) -> Tuple[ZipFile, Path, Dict, Set[str]]:
+    """进入web阅读器, 逐章下载原始文本并获取图片地址.
+
+    Args:
+        page: Page,
+            已经登录的页面.
+        book_url: str,
+            图书的URL.
+        rdata_file_path: str or os.PathLike or None,
+            原始数据文件保存路径, 为None时使用'保存目录/图书名.rdata.zip'.
+        rate_limiter: RateLimiter,
+            切换章节使用的限速器.
+        verbose: bool,
+            是否展示下载过程的详细信息.
+        rdata_dir: str or os.PathLike, default='.',
+            原始数据文件的保存目录, 仅在`rdata_file_path`为None时有效.
+        tracker: ProgressTracker, default=None,
+            逐章下载的进度跟踪器, 每下载完一章报告一次进度.
+
+    Return:
+        原始数据文件, 原始数据文件保存路径, 图书的元数据和全部图片的url;
+         中途失败时将关闭并删除原始数据文件.
+    """
+    await page.goto(book_url)
 
     # 获取图书的元数据.
-    book_metadata = await page.Jeval('#app', '''(elm) => {
-        return elm.__vue__.$store.state.reader
-    }''')
+    book_metadata = await page.Jeval('#app', _BOOK_METADATA_JS)
 
     # 创建保存原始数据文件.
     if not rdata_file_path:
-        rdata_file_path = Path(book_metadata['bookInfo']['title'] + '.rdata.zip')  # noqa: E501
+        rdata_file_path = Path(rdata_dir, book_metadata['bookInfo']['title'] + '.rdata.zip')  # noqa: E501
     rdata_file = ZipFile(rdata_file_path, 'w', ZIP_DEFLATED)
 
     # 遍历每章下载原始文本并获取图片地址.
     chapter_infos = book_metadata['chapterInfos']
     image_urls = set()  # 用于保存全部图片的url.
-    for i, chapter in enumerate(chapter_infos):
-        # 在网页中切换章节.
-        await page.Jeval('#routerView',
-                         '''(elm, uid) => {
-                            elm.__vue__.changeChapter({ chapterUid:uid })
-                         }''',
-                         chapter['chapterUid'])
-        time.sleep(delay)  # 用于等待图片加载并模拟人类操作.
+    tracker = tracker or ProgressTracker('download')
+    tracker.start(len(chapter_infos))
+    completed = False
+    try:
+        for i, chapter in enumerate(chapter_infos):
+            # 在网页中切换章节.
+            await _change_chapter(page, chapter['chapterUid'], rate_limiter)
+
+            # 获取章节的元数据.
+            chapter_metadata = await page.Jeval('#app', _CHAPTER_METADATA_JS)
 
-        # 获取章节的元数据.
-        chapter_metadata = await page.Jeval('#app', '''(elm) => {
-            return elm.__vue__.$store.state.reader
-        }''')
+            # 下载当前章节的数据.
+            image_urls.update(_download_chapter_content(chapter_metadata, rdata_file))  # noqa: E501
+            tracker.advance(chapter['title'])
 
-        # 下载当前章节的数据.
-        image_urls.update(_download_chapter_content(chapter_metadata, rdata_file))  # noqa: E501
+            if verbose:
+                logger.info('第%d章文本下载完成, 当前速率%.2f章/秒.',
+                            i + 1, rate_limiter.rate)
+        completed = True
+    finally:
+        if not completed:
+            _discard_rdata(rdata_file)
+    tracker.finish()
+
+    return rdata_file, Path(rdata_file_path), book_metadata, image_urls
 
-        if verbose:
-            logger.info(f'第{i + 1}章文本下载完成.')
 
-    await browser.close()  # 提前关闭浏览器, 此时已不需要控制浏览器.
+def _save_book(rdata_file: ZipFile,
+               book_metadata: Dict,
+               image_urls: Set[str],
+               verbose: bool,
+               cached_images: Optional[Dict[str, bytes]] = None,
+               tracker: Optional[ProgressTracker] = None):
+    """保存图书的元数据, 章节描述信息, 样式表和全部图片, 并关闭原始数据文件.
 
+    Args:
+        rdata_file: ZipFile,
+            原始数据文件.
+        book_metadata: dict,
+            图书的元数据.
+        image_urls: set of str,
+            章节中全部图片的url.
+        verbose: bool,
+            是否展示下载过程的详细信息.
+        cached_images: dict, default=None,
+            浏览器已经加载的图片url和图片数据.
+        tracker: ProgressTracker, default=None,
+            下载图片的进度跟踪器.
+    """
     # 保存图书的元数据.
     book_info = book_metadata['bookInfo']
     book_info_json = json.dumps(book_info)
@@ -262,8 +535,102 @@ async def download(name: str,
     # 保存书籍的封面图片.
     coverpage_url = book_info['cover']
     coverpage_url = coverpage_url.replace('s_', 'o_')  # 修正使用缩略图的问题.
-    image_urls.add(coverpage_url)
-    _download_images(list(image_urls), rdata_file, verbose)
+    image_urls = image_urls | {coverpage_url}
+    _download_images(list(image_urls),
+                     rdata_file,
+                     verbose,
+                     cached_images,
+                     tracker=tracker)
+    rdata_file.close()
+
+
+async def download(name: str,
+                   rdata_file_path: Optional[Union[str, os.PathLike]] = None,
+                   headless: bool = False,
+                   incognito: bool = True,
+                   delay: float = 2,
+                   verbose: bool = False,
+                   info: bool = False,
+                   catalog_file: Optional[Union[str, os.PathLike]] = None,
+                   profile_dir: Optional[Union[str, os.PathLike]] = None,
+                   cache_images: bool = True,
+                   rate_limiter: Optional[RateLimiter] = None,
+                   callback: Optional[ProgressCallback] = None) -> Path:
+    """根据图书名称下载原始的数据到本地.
+
+    Args:
+        name: str,
+            图书的名称.
+        rdata_file_path: str or os.PathLike, default=None,
+            原始数据文件保存路径, 默认为'./图书名.rdata.zip'.
+        headless: bool, default=False,
+            是否为浏览器设置无界面(headless)模式.
+        incognito: bool, default=True,
+            是否为浏览器设置无痕模式.
+        delay: float, default=2,
+            初始的章节间隔(秒), 用于等待网页加载并模拟人类操作,
+             之后将根据网络实际情况自动调整.
+        verbose: bool, default=False,
+            是否展示下载过程的详细信息.
+        info: bool, default=False,
+            是否输出提示信息.
+        catalog_file: str or os.PathLike, default=None,
+            图书目录文件, 设置时将在下载完成后更新图书目录.
+        profile_dir: str or os.PathLike, default=None,
+            保存会话的用户数据目录, 会话有效时将跳过扫码登录,
+             会话过期时将重新扫码登录; 设置时无痕模式无效.
+        cache_images: bool, default=True,
+            是否直接保存浏览器渲染章节时已经加载的图片, 只有未命中的图片才会重新下载.
+        rate_limiter: RateLimiter, default=None,
+            切换章节使用的自适应限速器, 默认根据`delay`创建;
+             响应变慢或出错时将自动降低速率, 可以通过`rate_limiter.rate`查看当前速率.
+        callback: Callable, default=None,
+            进度回调, 参数为`ProgressEvent`; 逐章下载('download')和下载图片('images')
+             阶段开始, 每完成一章或一张图片和阶段结束时各调用一次.
+
+    Return:
+        原始数据文件保存的绝对路径.
+    """
+    # 启动浏览器, 登录账户.
+    browser, page = await _launch_browser(headless, incognito, profile_dir)
+    cached_images, tasks = _capture_images(page) if cache_images else ({}, [])
+
+    # 查找书籍.
+    book_urls = await _find_books(page, [name])
+    if name not in book_urls:
+        await browser.close()
+        logger.error('没有找到你想要下载的《%s》, 请检查你是否拥有这本书或书名是否正确!', name)
+        sys.exit(1)
+
+    # 进入web阅读器下载原始文本.
+    rdata_file, rdata_file_path, book_metadata, image_urls = await _download_text(  # noqa: E501
+        page,
+        book_urls[name],
+        rdata_file_path,
+        rate_limiter or _chapter_rate_limiter(delay),
+        verbose,
+        tracker=ProgressTracker('download', callback)
+    )
+
+    completed = False
+    try:
+        await asyncio.gather(*tasks)  # 等待浏览器已经加载的图片读取完成.
+        await browser.close()  # 提前关闭浏览器, 此时已不需要控制浏览器.
+
+        # 保存图书的元数据, 章节描述信息, 样式表和全部图片.
+        _save_book(rdata_file,
+                   book_metadata,
+                   image_urls,
+                   verbose,
+                   cached_images,
+                   ProgressTracker('images', callback))
+        completed = True
+    finally:
+        if not completed:
+            _discard_rdata(rdata_file)
+
+    if catalog_file:
+        update_catalog(catalog_file, rdata_file_path)
 
     if verbose:
         logger.info('-' * 50)
@@ -0,0 +1,260 @@
+import os
+import re
+import sys
+
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import BinaryIO, Iterator, List, Literal, Optional, Union
+
+from bs4 import BeautifulSoup
+
+from weread import logger
+from weread.core.chapters import _iter_chapter_html
+from weread.core.library import _default_output
+
+ExportFormat = Literal['txt', 'md']
+
+_HEADINGS = ('h1', 'h2', 'h3', 'h4', 'h5', 'h6')
+
+
+def _normalize(text: str) -> str:
+    """去除全部空白字符, 用于比较章节标题."""
+    return re.sub(r'\s+', '', text)
+
+
+def _escape_markdown(line: str) -> str:
+    """转义段落开头会被解析成Markdown块级元素的字符.
+
+    Args:
+        line: str,
+            段落的文本.
+
+    Return:
+        转义后的文本.
+    """
+    line = re.sub(r'^([#>*+\-=`|])', r'\\\1', line)
+
+    return re.sub(r'^(\d+)([.)])', r'\1\\\2', line)
+
+
+def _chapter_lines(html: BeautifulSoup,
+                   title: str,
+                   level: int,
+                   fmt: ExportFormat) -> Iterator[str]:
+    """将单个章节转换成纯文本或Markdown, 逐行产出.
+
+    章节标题使用`toc.json`中的标题和层级; 章节开头与标题相同的标题标签将被跳过,
+    其余的标题标签在Markdown中作为章节的下级标题.
+
+    Args:
+        html: BeautifulSoup,
+            经过`_processing_html`处理完成的html.
+        title: str,
+            章节的标题.
+        level: int,
+            章节在目录中的层级.
+        fmt: {'txt', 'md'},
+            导出的格式.
+
+    Return:
+        文本行的生成器, 不包括换行符.
+    """
+    level = min(max(level, 1), 6)
+    yield '#' * level + ' ' + title if fmt == 'md' else title
+    yield ''
+
+    first = True
+    for node in html.find_all(_HEADINGS + ('p',)):
+        line = re.sub(r'\s*\n\s*', ' ', node.get_text()).strip()
+        if not line:
+            continue
+        if node.name in _HEADINGS and first and _normalize(line) == _normalize(title):  # noqa: E501
+            first = False
+            continue
+        first = False
+
+        if fmt == 'md' and node.name in _HEADINGS:
+            yield '#' * min(level + int(node.name[1]), 6) + ' ' + line
+        elif fmt == 'md':
+            yield _escape_markdown(line)
+        else:
+            yield line
+        if fmt == 'md':
+            yield ''  # Markdown使用空行分隔段落.
+
+
+def _write_export(rdata_file: Union[str, os.PathLike],
+                  fp: BinaryIO,
+                  fmt: ExportFormat,
+                  verbose: bool) -> int:
+    """按照`toc.json`的顺序逐章导出并写入二进制流.
+
+    Args:
+        rdata_file: str or os.PathLike,
+            原始数据文件.
+        fp: BinaryIO,
+            可写入的二进制流.
+        fmt: {'txt', 'md'},
+            导出的格式.
+        verbose: bool,
+            是否展示导出的详细信息.
+
+    Return:
+        导出的章节数量.
+    """
+    count = 0
+    for _, chapter_info, html in _iter_chapter_html(rdata_file):
+        if count:
+            fp.write(b'\n')
+        lines = _chapter_lines(html,
+                               chapter_info['title'],
+                               chapter_info.get('level', 1),
+                               fmt)
+        fp.write(''.join(line + '\n' for line in lines).encode('utf-8'))
+        count += 1
+        if verbose:
+            logger.info('导出 %s.', chapter_info['title'])
+
+    return count
+
+
+def export(rdata_file: Union[str, os.PathLike],
+           output: Optional[Union[str, os.PathLike, BinaryIO]] = None,
+           fmt: ExportFormat = 'txt',
+           verbose: bool = False,
+           info: bool = False) -> Optional[Path]:
+    """将原始数据文件导出为纯文本或Markdown文件.
+
+    按照`toc.json`的顺序逐章清理(与生成ePub文件时相同)并直接写入输出,
+    不生成xhtml也不压缩, 内存占用与章节大小相关而与图书大小无关; 只导出文本, 不包括图片.
+
+    Example:
+        ```python
+        export('怦然心动.rdata.zip', fmt='md')
+        ```
+
+    Args:
+        rdata_file: str or os.PathLike,
+            原始数据文件.
+        output: str, os.PathLike or BinaryIO, default=None,
+            导出文件的保存路径或可写入的二进制流,
+             默认为'原始数据文件名.txt'或'原始数据文件名.md'.
+        fmt: {'txt', 'md'}, default='txt',
+            导出的格式, 纯文本或Markdown; 章节标题保留`toc.json`中的层级.
+        verbose: bool, default=False,
+            是否展示导出的详细信息.
+        info: bool, default=False,
+            是否输出提示信息.
+
+    Return:
+        导出文件的绝对路径, 输出到二进制流时返回None.
+    """
+    if fmt not in ('txt', 'md'):
+        logger.error('不支持的导出格式%s, 请使用`txt`或`md`!', fmt)
+        sys.exit(1)
+
+    # 直接写入二进制流.
+    if output is not None and not isinstance(output, (str, os.PathLike)):
+        count = _write_export(rdata_file, output, fmt, verbose)
+        output.flush()
+        export_file_path = None
+    else:
+        if output is None:
+            export_file_path = _default_output(rdata_file, '.' + fmt)
+        else:
+            export_file_path = Path(output)
+
+        # 先写入临时文件再重命名, 不会留下不完整的导出文件.
+        part_file_path = export_file_path.with_name(export_file_path.name + '.part')  # noqa: E501
+        completed = False
+        try:
+            with open(part_file_path, 'wb') as fp:
+                count = _write_export(rdata_file, fp, fmt, verbose)
+            os.replace(part_file_path, export_file_path)
+            completed = True
+        finally:
+            if not completed and part_file_path.exists():
+                part_file_path.unlink()
+        export_file_path = export_file_path.absolute()
+
+    if verbose:
+        logger.info('-' * 50)
+
+    if info:
+        logger.info('成功导出%s个章节:)', count)
+
+    return export_file_path
+
+
+def _export_worker(rdata_file: Path,
+                   export_file: Path,
+                   fmt: ExportFormat) -> Optional[Path]:
+    """在子进程中导出单本图书, 失败时返回None而不是中断整批导出."""
+    try:
+        return export(rdata_file, export_file, fmt)
+    except (Exception, SystemExit):
+        return None
+
+
+def export_many(rdata_files: List[Union[str, os.PathLike]],
+                output_dir: Optional[Union[str, os.PathLike]] = None,
+                fmt: ExportFormat = 'txt',
+                workers: Optional[int] = None,
+                verbose: bool = False,
+                info: bool = False) -> List[Path]:
+    """使用多进程批量导出原始数据文件为纯文本或Markdown文件.
+
+    每个进程一次只导出一本图书并逐章写入, 内存占用与进程数量和章节大小相关.
+
+    Args:
+        rdata_files: list of str or os.PathLike,
+            原始数据文件组成的列表.
+        output_dir: str or os.PathLike, default=None,
+            导出文件的保存目录, 默认保存在原始数据文件所在的目录.
+        fmt: {'txt', 'md'}, default='txt',
+            导出的格式, 纯文本或Markdown.
+        workers: int, default=None,
+            进程的数量, 默认为CPU的核心数.
+        verbose: bool, default=False,
+            是否展示导出的详细信息.
+        info: bool, default=False,
+            是否输出提示信息.
+
+    Return:
+        成功导出的文件的绝对路径组成的列表.
+    """
+    if fmt not in ('txt', 'md'):
+        logger.error('不支持的导出格式%s, 请使用`txt`或`md`!', fmt)
+        sys.exit(1)
+    if output_dir is not None:
+        Path(output_dir).mkdir(parents=True, exist_ok=True)
+
+    rdata_files = [Path(rdata_file) for rdata_file in rdata_files]
+    export_files = []
+    for rdata_file in rdata_files:
+        export_file = _default_output(rdata_file, '.' + fmt)
+        if output_dir is not None:
+            export_file = Path(output_dir) / export_file.name
+        export_files.append(export_file)
+
+    export_file_paths = []
+    with ProcessPoolExecutor(workers) as executor:
+        for rdata_file, export_file_path in zip(rdata_files,
+                                                executor.map(_export_worker,
+                                                             rdata_files,
+                                                             export_files,
+                                                             [fmt] * len(rdata_files))):  # noqa: E501
+            if export_file_path is None:
+                logger.warning('%s 导出失败!', rdata_file.name)
+                continue
+            export_file_paths.append(export_file_path)
+            if verbose:
+                logger.info('导出 %s.', export_file_path.name)
+
+    if verbose:
+        logger.info('-' * 50)
+
+    if info:
+        logger.info('成功导出%s本图书:)', len(export_file_paths))
+
+    return export_file_paths
@@ -1,20 +1,696 @@
+import asyncio
+import hashlib
 import json
 import os
 import re
+import shutil
+import struct
 import sys
+import zlib
 
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from itertools import chain
 from pathlib import Path
-from time import strftime, strptime
-from typing import Dict, List, Union
-from zipfile import BadZipFile, ZIP_DEFLATED, ZipFile, ZipInfo
+from time import localtime, strftime, strptime
+from typing import (
+    BinaryIO,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Literal,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+    Union
+)
+from zipfile import (
+    BadZipFile,
+    ZIP64_LIMIT,
+    ZIP_DEFLATED,
+    ZIP_STORED,
+    ZipFile,
+    ZipInfo
+)
 
 from bs4 import BeautifulSoup
 
-from weread import logger
+from weread import __version__, logger
+from weread.core.library import _default_output, update_catalog
+from weread.core.progress import (
+    AsyncProgress,
+    Progress,
+    ProgressCallback,
+    ProgressTracker,
+    Steps,
+    arun_steps,
+    run_steps,
+    track_steps
+)
+from weread.core.styles import _StyleOptimizer
+from weread.core.validate import validate_epub
+
+# 可复现构建使用的固定时间戳(ZIP格式支持的最早时间).
+_FIXED_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+# 可复现构建时保存在ePub文件注释中的摘要前缀.
+_DIGEST_PREFIX = b'weread-digest:sha256:'
+# 流式复制文件使用的缓冲区大小.
+_COPY_BUFFER_SIZE = 256 * 1024
+# 目录形式的ePub文件中保存摘要的隐藏文件, 打包时写入ePub文件的注释.
+_DIGEST_FILE = '.weread-digest'
+# 增量更新使用的旁路清单的后缀, 保存上一次生成时原始数据文件中每个文件的CRC和大小.
+_MANIFEST_SUFFIX = '.weread-manifest'
+# ZIP本地文件头的格式.
+_LOCAL_HEADER = struct.Struct('<4s5H3L2H')
+# `_EpubFile`追加已经压缩的数据时依赖的ZipFile内部属性, 标准库没有提供追加压缩后数据的
+# 公开接口; 已在CI测试的Python 3.8-3.10上验证, 缺少任何一个属性时拒绝写入.
+_ZIPFILE_INTERNALS = ('_lock', '_writecheck', '_didModify', '_seekable',
+                      'start_dir', 'fp')
+
+Layout = Literal['zip', 'dir']
+
+
+class EpubBuild(NamedTuple):
+    """生成ePub文件的结果.
+
+    Attributes:
+        path: Path or None,
+            ePub文件(或目录)的绝对路径, 输出到二进制流时为None.
+        digest: str or None,
+            原始数据文件内容和生成工具版本的SHA-256摘要,
+             摘要相同时生成的ePub文件逐字节相同; 不是可复现构建时为None.
+        skipped: bool,
+            ePub文件是否因为摘要没有变化而跳过生成.
+    """
+    path: Optional[Path]
+    digest: Optional[str]
+    skipped: bool
+
+
+def _deflate(data: bytes, compresslevel: int) -> Tuple[int, bytes]:
+    """计算CRC并使用与ZipFile相同的参数压缩数据, zlib在计算时会释放GIL.
+
+    Args:
+        data: bytes,
+            需要压缩的数据.
+        compresslevel: int,
+            压缩级别.
+
+    Return:
+        数据的CRC和压缩后的数据.
+    """
+    compressor = zlib.compressobj(compresslevel, zlib.DEFLATED, -15)
+
+    return zlib.crc32(data), compressor.compress(data) + compressor.flush()
+
+
+class _EpubFile(ZipFile):
+    """生成ePub文件使用的ZipFile.
+
+    可复现构建时全部文件使用固定的时间戳和权限;
+    设置线程池时, `writestr`写入的文件将在线程池中并行压缩,
+    再由当前线程按照写入的顺序将压缩后的数据和文件头追加到ePub文件中.
+    增量更新时, 没有变化的文件直接从上一次生成的ePub文件中复制压缩后的数据.
+    追加压缩后的数据使用了ZipFile的内部属性`_ZIPFILE_INTERNALS`, 其余写入都通过公开接口.
+
+    Args:
+        file: str, os.PathLike or BinaryIO,
+            ePub文件的路径或可写入的二进制流.
+        deterministic: bool, default=False,
+            是否可复现构建.
+        workers: int, default=1,
+            压缩使用的线程数量, 为1时在当前线程中压缩.
+        base: ZipFile, default=None,
+            上一次生成的ePub文件.
+        unchanged: set of str, default=None,
+            可以从上一次生成的ePub文件中复制的文件名.
+    """
+    def __init__(self,
+                 file: Union[str, os.PathLike, BinaryIO],
+                 deterministic: bool = False,
+                 workers: int = 1,
+                 base: Optional[ZipFile] = None,
+                 unchanged: Optional[Set[str]] = None):
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending: Deque[Tuple[ZipInfo, Future]] = deque()
+        super(_EpubFile, self).__init__(file, 'w', ZIP_DEFLATED)
+        missing = [name for name in _ZIPFILE_INTERNALS
+                   if not hasattr(self, name)]
+        if missing:
+            self.close()
+            raise RuntimeError(f'当前Python版本的ZipFile缺少内部属性{missing}, '
+                               f'无法生成ePub文件.')
+        self.deterministic = deterministic
+        self.base = base
+        self.unchanged = unchanged or set()
+        self.reused: List[str] = []  # 本次复制的文件.
+        if workers > 1:
+            self._executor = ThreadPoolExecutor(workers)
+        # 限制等待写入的文件数量, 避免压缩后的数据占用过多内存.
+        self._max_pending = 2 * workers
+
+    def writestr(self,
+                 zinfo_or_arcname: Union[str, ZipInfo],
+                 data: Union[str, bytes],
+                 compress_type: Optional[int] = None,
+                 compresslevel: Optional[int] = None):
+        if isinstance(zinfo_or_arcname, ZipInfo):
+            zinfo = zinfo_or_arcname
+        else:
+            zinfo = self._zip_info(zinfo_or_arcname)
+        if compress_type is not None:
+            zinfo.compress_type = compress_type
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+
+        if self._executor is None or zinfo.compress_type != ZIP_DEFLATED:
+            self._drain()
+            super(_EpubFile, self).writestr(zinfo, data, compresslevel=compresslevel)  # noqa: E501
+            return
+
+        level = compresslevel or self.compresslevel or zlib.Z_DEFAULT_COMPRESSION  # noqa: E501
+        self._pending.append((zinfo, self._executor.submit(_deflate, data, level)))  # noqa: E501
+        zinfo.file_size = len(data)
+        # 按顺序写入已经压缩完成的文件, 等待写入的文件过多时等待最早的文件压缩完成.
+        while self._pending and (len(self._pending) > self._max_pending or
+                                 self._pending[0][1].done()):
+            self._write_compressed(*self._pending.popleft())
+
+    def copyfile(self, source: ZipFile, file: ZipInfo, arcname: str):
+        """从其他压缩文件中流式复制单个文件, 使用固定大小的缓冲区, 不会将整个文件读入内存.
+
+        Args:
+            source: ZipFile,
+                源压缩文件.
+            file: ZipInfo,
+                源压缩文件中需要复制的文件.
+            arcname: str,
+                复制到ePub文件中的文件名.
+        """
+        with source.open(file) as src:
+            self._copystream(src, file.file_size, arcname)
+
+    def reuse(self, arcname: str) -> bool:
+        """文件没有变化时, 从上一次生成的ePub文件中复制压缩后的数据, 不需要重新生成和压缩.
+
+        Args:
+            arcname: str,
+                ePub文件中的文件名.
+
+        Return:
+            是否已经复制; 为False时需要重新生成这个文件.
+        """
+        if self.base is None or arcname not in self.unchanged:
+            return False
+
+        self.copyraw(self.base, self.base.getinfo(arcname))
+        self.reused.append(arcname)
+
+        return True
+
+    def copyraw(self, source: ZipFile, file: ZipInfo):
+        """从其他压缩文件中复制压缩后的数据, 不解压也不重新压缩.
+
+        文件名, 时间戳, 权限和压缩方式与源文件相同; 源文件中有同名的文件时, 复制`file`对应的那一个.
+
+        Args:
+            source: ZipFile,
+                源压缩文件, 需要通过文件路径打开.
+            file: ZipInfo,
+                源压缩文件中需要复制的文件.
+        """
+        self._drain()  # 保证文件按照写入的顺序排列.
+        arcname = file.filename
+        zinfo = ZipInfo(arcname, file.date_time)
+        zinfo.compress_type = file.compress_type
+        zinfo.create_system = file.create_system
+        zinfo.external_attr = file.external_attr
+        zinfo.CRC = file.CRC
+        zinfo.file_size = file.file_size
+        zinfo.compress_size = file.compress_size
+
+        # 使用独立的文件对象读取源文件中的压缩数据, 不使用源ZipFile内部的文件对象.
+        with open(source.filename, 'rb') as fp:
+            fp.seek(file.header_offset)
+            header = _LOCAL_HEADER.unpack(fp.read(_LOCAL_HEADER.size))
+            fp.seek(header[-2] + header[-1], os.SEEK_CUR)  # 跳过文件名和扩展字段.
+
+            def _chunks():
+                remaining = file.compress_size
+                while remaining:
+                    chunk = fp.read(min(remaining, _COPY_BUFFER_SIZE))
+                    if not chunk:
+                        raise BadZipFile(f'{arcname} 的压缩数据不完整.')
+                    remaining -= len(chunk)
+                    yield chunk
+
+            self._append(zinfo, _chunks())
+
+    def writefile(self, path: Path, arcname: str):
+        """写入本地文件, 小文件在线程池中并行压缩, 大文件使用固定大小的缓冲区流式写入.
+
+        Args:
+            path: Path,
+                本地文件的路径.
+            arcname: str,
+                写入ePub文件中的文件名.
+        """
+        file_size = path.stat().st_size
+        if file_size <= _COPY_BUFFER_SIZE:
+            self.writestr(arcname, path.read_bytes())
+            return
+
+        with open(path, 'rb') as src:
+            self._copystream(src, file_size, arcname)
+
+    def _copystream(self, src: BinaryIO, file_size: int, arcname: str):
+        """使用固定大小的缓冲区将二进制流写入ePub文件.
+
+        Args:
+            src: BinaryIO,
+                可读取的二进制流.
+            file_size: int,
+                二进制流的大小, 用于判断是否需要使用ZIP64.
+            arcname: str,
+                写入ePub文件中的文件名.
+        """
+        self._drain()  # 保证文件按照写入的顺序排列.
+        zinfo = self._zip_info(arcname)
+        zinfo.file_size = file_size
+        with self.open(zinfo, 'w') as dst:
+            shutil.copyfileobj(src, dst, _COPY_BUFFER_SIZE)
+
+    def _zip_info(self, arcname: str) -> ZipInfo:
+        """创建文件信息, 可复现构建时使用固定的时间戳和权限.
+
+        Args:
+            arcname: str,
+                ePub文件中的文件名.
+
+        Return:
+            文件信息.
+        """
+        if self.deterministic:
+            zinfo = ZipInfo(arcname, _FIXED_DATE_TIME)
+            zinfo.create_system = 3  # 不区分生成ePub文件的操作系统.
+            zinfo.external_attr = 0o644 << 16
+        else:
+            zinfo = ZipInfo(arcname, localtime()[:6])
+            zinfo.external_attr = 0o600 << 16
+        zinfo.compress_type = self.compression
+
+        return zinfo
+
+    def _write_compressed(self, zinfo: ZipInfo, future: Future):
+        """将已经压缩的数据和文件头追加到ePub文件中.
+
+        Args:
+            zinfo: ZipInfo,
+                文件信息, `file_size`为压缩前的大小.
+            future: Future,
+                压缩任务, 结果为CRC和压缩后的数据.
+        """
+        crc, compressed = future.result()
+        zinfo.CRC = crc
+        zinfo.compress_size = len(compressed)
+        self._append(zinfo, [compressed])
+
+    @property
+    def bytes_written(self) -> int:
+        """已经写入ePub文件的字节数."""
+        return self.start_dir
+
+    def _append(self, zinfo: ZipInfo, chunks: Iterable[bytes]):
+        """将文件头和压缩后的数据追加到ePub文件中.
+
+        标准库只能写入未压缩的数据, 这里按照`ZipFile.writestr`的方式(Python 3.8-3.10)
+        在锁内检查文件信息, 写入文件头和数据, 再更新中央目录的位置和文件列表.
+
+        Args:
+            zinfo: ZipInfo,
+                文件信息, 包括CRC, 压缩前和压缩后的大小.
+            chunks: Iterable of bytes,
+                压缩后的数据.
+        """
+        zip64 = zinfo.file_size > ZIP64_LIMIT or zinfo.compress_size > ZIP64_LIMIT  # noqa: E501
+        with self._lock:
+            self._writecheck(zinfo)
+            self._didModify = True
+            if self._seekable:
+                self.fp.seek(self.start_dir)
+            zinfo.header_offset = self.fp.tell()
+            self.fp.write(zinfo.FileHeader(zip64))
+            for chunk in chunks:
+                self.fp.write(chunk)
+            self.start_dir = self.fp.tell()
+            self.filelist.append(zinfo)
+            self.NameToInfo[zinfo.filename] = zinfo
+
+    def _drain(self):
+        """按顺序写入全部等待写入的文件."""
+        while self._pending:
+            self._write_compressed(*self._pending.popleft())
+
+    def close(self):
+        try:
+            if self.fp is not None and self.mode == 'w':
+                self._drain()
+        finally:
+            # 写入失败时也需要取消等待的压缩任务并关闭文件.
+            for _, future in self._pending:
+                future.cancel()
+            self._pending.clear()
+            if self._executor is not None:
+                self._executor.shutdown()
+            super(_EpubFile, self).close()
+
+
+def _file_crc(path: Path) -> int:
+    """使用固定大小的缓冲区计算文件的CRC.
+
+    Args:
+        path: Path,
+            文件的路径.
+
+    Return:
+        文件的CRC.
+    """
+    crc = 0
+    with open(path, 'rb') as fp:
+        for chunk in iter(lambda: fp.read(_COPY_BUFFER_SIZE), b''):
+            crc = zlib.crc32(chunk, crc)
+
+    return crc
+
+
+class _EpubDir(object):
+    """以目录形式(解压后的ePub文件)生成ePub文件, 提供与`_EpubFile`相同的写入接口.
+
+    只重写内容发生变化的文件: 生成的文件直接比较内容, 复制的图片和样式表比较CRC;
+    每个文件先写入隐藏的临时文件再替换. 全部生成完成后删除`META-INF`和`OEBPS`中
+    本次没有写入的文件; 可复现构建的摘要保存在隐藏文件`.weread-digest`中.
+
+    Args:
+        directory: Path,
+            保存ePub文件的目录.
+    """
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self.comment = b''
+        self.changed: List[str] = []  # 本次重写的文件.
+        self.bytes_written = 0
+        self._written: Set[str] = set()
+        # 生成完成前删除摘要, 中途失败时下次生成不会被跳过.
+        (directory / _DIGEST_FILE).unlink(missing_ok=True)
+
+    def __enter__(self) -> '_EpubDir':
+        return self
+
+    def __exit__(self, exc_type, *_):
+        if exc_type is None:
+            self.close()
+
+    def writestr(self,
+                 arcname: str,
+                 data: Union[str, bytes],
+                 compress_type: Optional[int] = None,
+                 compresslevel: Optional[int] = None):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+
+        path = self._path(arcname)
+        if (path.is_file() and path.stat().st_size == len(data) and
+                path.read_bytes() == data):
+            return
+
+        self._replace(path, arcname, lambda fp: fp.write(data))
+
+    def copyfile(self, source: ZipFile, file: ZipInfo, arcname: str):
+        """从其他压缩文件中流式复制单个文件, 文件大小和CRC没有变化时跳过.
+
+        Args:
+            source: ZipFile,
+                源压缩文件.
+            file: ZipInfo,
+                源压缩文件中需要复制的文件.
+            arcname: str,
+                复制到目录中的文件名.
+        """
+        path = self._path(arcname)
+        if (path.is_file() and path.stat().st_size == file.file_size and
+                _file_crc(path) == file.CRC):
+            return
+
+        def _copy(dst: BinaryIO):
+            with source.open(file) as src:
+                shutil.copyfileobj(src, dst, _COPY_BUFFER_SIZE)
+
+        self._replace(path, arcname, _copy)
+
+    def reuse(self, arcname: str) -> bool:
+        """目录形式的ePub文件总是重新生成, 只重写内容发生变化的文件."""
+        return False
+
+    def _path(self, arcname: str) -> Path:
+        """记录写入的文件并返回文件在目录中的路径."""
+        self._written.add(arcname)
+
+        return self.directory / arcname
+
+    def _replace(self,
+                 path: Path,
+                 arcname: str,
+                 write: Callable[[BinaryIO], None]):
+        """写入隐藏的临时文件再替换, 避免留下不完整的文件.
+
+        Args:
+            path: Path,
+                文件在目录中的路径.
+            arcname: str,
+                ePub文件中的文件名.
+            write: Callable,
+                写入文件内容的函数, 参数为二进制文件对象.
+        """
+        path.parent.mkdir(parents=True, exist_ok=True)
+        part_file_path = path.with_name(f'.{path.name}.part')
+        try:
+            with open(part_file_path, 'wb') as fp:
+                write(fp)
+                self.bytes_written += fp.tell()
+            os.replace(part_file_path, path)
+        finally:
+            if part_file_path.exists():
+                part_file_path.unlink()
+        self.changed.append(arcname)
+
+    def close(self):
+        # 删除本次没有写入的文件(比如已经删除的章节)和空文件夹.
+        for folder in ('META-INF', 'OEBPS'):
+            paths = sorted((self.directory / folder).rglob('*'),
+                           key=lambda path: len(path.parts),
+                           reverse=True)
+            for path in paths:
+                arcname = path.relative_to(self.directory).as_posix()
+                if path.is_file() and arcname not in self._written:
+                    path.unlink()
+                    self.changed.append(arcname)
+                elif path.is_dir() and not any(path.iterdir()):
+                    path.rmdir()
+
+        if self.comment:
+            (self.directory / _DIGEST_FILE).write_bytes(self.comment)
+
+
+def _natural_key(filename: str) -> Tuple:
+    """文件名的自然排序键, 先根据字母, 再根据数字排序.
+
+    Args:
+        filename: str,
+            文件名.
+
+    Return:
+        排序键, 例如`chapter-10.html`排在`chapter-9.html`之后.
+    """
+    return tuple(int(part) if i % 2 else part
+                 for i, part in enumerate(re.split(r'(\d+)', filename)))
+
+
+def _sort_files(file_list: List[ZipInfo],
+                chapter_infos: List[Dict]) -> List[ZipInfo]:
+    """排序原始数据文件的文件列表.
+
+    章节按照在toc.json中的顺序排列(章节的uid不一定随目录递增),
+    其余文件和不在toc.json中的章节按照自然顺序排列.
+
+    Args:
+        file_list: list of ZipInfo,
+            原始数据文件的文件列表.
+        chapter_infos: list of dict,
+            书籍章节的原始信息.
+
+    Return:
+        排序后的文件列表.
+    """
+    chapter_order = {}
+    for chapter_info in chapter_infos:
+        chapter_file = f'Text/chapter-{chapter_info["chapterUid"]}.html'
+        chapter_order.setdefault(chapter_file, len(chapter_order))
+
+    file_list = sorted(file_list, key=lambda x: _natural_key(x.filename))
+    chapters = iter(sorted((file for file in file_list
+                            if file.filename.startswith('Text/')),
+                           key=lambda x: chapter_order.get(x.filename,
+                                                           len(chapter_order))))  # noqa: E501
+
+    # 章节仍然放在Text/的位置上, 只调整章节之间的顺序.
+    return [next(chapters) if file.filename.startswith('Text/') else file
+            for file in file_list]
+
+
+def _source_digest(rdata: ZipFile, optimize_css: bool = False) -> str:
+    """计算原始数据文件内容和生成工具版本的摘要, 与原始数据文件中的文件顺序和时间戳无关.
+
+    Args:
+        rdata: ZipFile,
+            原始数据文件的文件指针.
+        optimize_css: bool, default=False,
+            是否优化样式表, 优化后生成的ePub文件不同, 摘要也不同.
+
+    Return:
+        SHA-256摘要的十六进制字符串.
+    """
+    digest = hashlib.sha256(f'weread {__version__}\n'.encode())
+    if optimize_css:
+        digest.update(b'optimize-css\n')
+    for file in sorted(rdata.infolist(), key=lambda x: x.filename):
+        digest.update(f'{file.filename}\0{file.file_size}\0'.encode())
+        with rdata.open(file) as fp:
+            for chunk in iter(lambda: fp.read(1024 * 1024), b''):
+                digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def _epub_digest(epub_file_path: Path) -> Optional[str]:
+    """读取可复现构建的ePub文件注释(或目录形式的ePub文件的摘要文件)中保存的摘要.
+
+    Args:
+        epub_file_path: Path,
+            ePub文件或目录形式的ePub文件.
+
+    Return:
+        摘要的十六进制字符串, ePub文件不存在或没有摘要时返回None.
+    """
+    try:
+        if epub_file_path.is_dir():
+            comment = (epub_file_path / _DIGEST_FILE).read_bytes()
+        else:
+            with ZipFile(epub_file_path) as epub_file:
+                comment = epub_file.comment
+    except (BadZipFile, OSError):
+        return None
+
+    if comment.startswith(_DIGEST_PREFIX):
+        return comment[len(_DIGEST_PREFIX):].decode()
+
+    return None
+
+
+def _manifest_path(epub_file_path: Path) -> Path:
+    """返回ePub文件的旁路清单的路径."""
+    return epub_file_path.with_name(epub_file_path.name + _MANIFEST_SUFFIX)
+
 
+def _write_manifest(epub_file_path: Path,
+                    file_list: List[ZipInfo],
+                    options: Dict):
+    """在ePub文件旁边保存增量更新使用的旁路清单.
 
-def _generate_meta_inf(epub_file: ZipFile, verbose: bool):
-    """创建META-INF文件夹并生成当前文件夹下全部文件.
+    清单记录原始数据文件中每个文件的CRC和大小(直接读取ZIP的中央目录, 不需要解压),
+    以及生成的ePub文件的大小和修改时间, 用于确认ePub文件在生成之后没有被修改.
+
+    Args:
+        epub_file_path: Path,
+            生成的ePub文件.
+        file_list: list of ZipInfo,
+            原始数据文件的文件列表.
+        options: dict,
+            影响生成结果的选项.
+    """
+    stat = epub_file_path.stat()
+    manifest = {
+        'version': __version__,
+        'options': options,
+        'epub': [stat.st_size, stat.st_mtime_ns],
+        'sources': {file.filename: [file.CRC, file.file_size]
+                    for file in file_list},
+    }
+    _manifest_path(epub_file_path).write_text(json.dumps(manifest),
+                                              encoding='utf-8')
+
+
+def _unchanged_entries(epub_file_path: Path,
+                       file_list: List[ZipInfo],
+                       options: Dict) -> Set[str]:
+    """比较原始数据文件和旁路清单, 找出可以从上一次生成的ePub文件中复制的文件.
+
+    图片, 样式表和章节只与原始数据文件中对应的文件有关; content.opf, toc.ncx和nav.xhtml
+    还与content.json, toc.json和文件列表有关.
+    清单不存在, 生成工具的版本或选项不同, 或者ePub文件已经被修改时, 全部文件都需要重新生成;
+    优化样式表时样式表与全部章节有关, 同样需要重新生成.
+
+    Args:
+        epub_file_path: Path,
+            上一次生成的ePub文件.
+        file_list: list of ZipInfo,
+            原始数据文件的文件列表.
+        options: dict,
+            影响生成结果的选项.
+
+    Return:
+        ePub文件中可以复制的文件名.
+    """
+    try:
+        manifest = json.loads(_manifest_path(epub_file_path).read_text(encoding='utf-8'))  # noqa: E501
+        stat = epub_file_path.stat()
+    except (OSError, ValueError):
+        return set()
+    if (options.get('optimize_css') or
+            not isinstance(manifest, dict) or
+            manifest.get('version') != __version__ or
+            manifest.get('options') != options or
+            manifest.get('epub') != [stat.st_size, stat.st_mtime_ns]):
+        return set()
+
+    old = manifest.get('sources', {})
+    new = {file.filename: [file.CRC, file.file_size] for file in file_list}
+    changed = {name for name in old.keys() | new.keys()
+               if old.get(name) != new.get(name)}
+
+    unchanged = set()
+    for name in new.keys() - changed:
+        if name.startswith(('Images/', 'Styles/')):
+            unchanged.add(f'OEBPS/{name}')
+        elif name.startswith('Text/'):
+            unchanged.add(f'OEBPS/{name.split(".")[0]}.xhtml')
+
+    # 增加或删除文件时, 清单和目录都需要重新生成; 清单的spine按照toc.json的顺序排列.
+    if (not any(name.startswith(('Images/', 'Styles/', 'Text/'))
+                for name in old.keys() ^ new.keys()) and
+            'content.json' not in changed and 'toc.json' not in changed):
+        unchanged.update(('OEBPS/content.opf',
+                          'OEBPS/toc.ncx',
+                          'OEBPS/nav.xhtml'))
+
+    return unchanged
+
+
+def _generate_meta_inf(epub_file: ZipFile, verbose: bool) -> Iterator[str]:
+    """创建META-INF文件夹并生成当前文件夹下全部文件, 每生成一个文件产出一次文件名.
 
     Args:
         epub_file: ZipFile,
@@ -38,6 +714,9 @@ def _generate_meta_inf(epub_file: ZipFile, verbose: bool):
     rootfiles.append(rootfile)
 
     epub_file.writestr('META-INF/container.xml', container_xml.prettify())
+    if verbose:
+        logger.info('生成 META-INF/container.xml 文件.')
+    yield 'META-INF/container.xml'
 
     # 创建com.apple.ibooks.display-options.xml.
     ibooks_xml = BeautifulSoup(features='xml')
@@ -51,10 +730,9 @@ def _generate_meta_inf(epub_file: ZipFile, verbose: bool):
 
     epub_file.writestr('META-INF/com.apple.ibooks.display-options.xml',
                        ibooks_xml.prettify())
-
     if verbose:
-        logger.info('生成 META-INF/container.xml 文件.')
         logger.info('生成 META-INF/com.apple.ibooks.display-options.xml 文件.')
+    yield 'META-INF/com.apple.ibooks.display-options.xml'
 
 
 def _generate_content_opf(book_info: Dict, file_list: List[ZipInfo]) -> str:
@@ -196,6 +874,14 @@ def _generate_content_opf(book_info: Dict, file_list: List[ZipInfo]) -> str:
         'media-type': 'application/x-dtbncx+xml'
     })
     manifest.append(toc_ncx)
+    # 添加ePub3的导航文档nav.xhtml.
+    nav_xhtml = content_opf.new_tag('item', attrs={
+        'href': 'nav.xhtml',
+        'id': 'nav',
+        'media-type': 'application/xhtml+xml',
+        'properties': 'nav'
+    })
+    manifest.append(nav_xhtml)
 
     # 创建<spine>元素, 描述ePub文件内容的有序列表.
     spine = content_opf.new_tag('spine', attrs={'toc': 'ncx'})
@@ -222,14 +908,46 @@ def _generate_content_opf(book_info: Dict, file_list: List[ZipInfo]) -> str:
     return str(content_opf)  # TODO(Steve Sun): prettify()会导致iBooks错误识别标题缩进为空格.
 
 
-def _generate_toc_ncx(chapter_infos: List[Dict],
-                      chapter_paths: List[str],
-                      book_id: str,
-                      book_title: str) -> str:
-    """在OEBPS文件夹下创建toc.ncx文件.
+def _iter_nav_entries(chapter_infos: List[Dict],
+                      chapter_paths: List[str]) -> Iterator[Tuple[int, str, str]]:  # noqa: E501
+    """按照目录的顺序产出章节和章节内的锚点.
+
+    Args:
+        chapter_infos: list of dict,
+            书籍章节的原始信息, 包括层级`level`和章节内的锚点`anchors`.
+        chapter_paths: list of str,
+            章节的保存路径, 没有保存的章节将被跳过.
+
+    Return:
+        (层级, 标题, 相对于OEBPS的地址)的生成器.
+    """
+    chapter_paths = set(chapter_paths)
+    for chapter_info in chapter_infos:
+        chapter_path = f'Text/chapter-{chapter_info["chapterUid"]}.html'
+        if chapter_path not in chapter_paths:
+            continue
+
+        href = chapter_path.replace('html', 'xhtml')  # 替换原始文本的html格式成xhtml.
+        level = chapter_info.get('level') or 1
+        yield level, chapter_info['title'], href
+        for anchor in chapter_info.get('anchors') or []:
+            yield (anchor.get('level') or level + 1,
+                   anchor['title'],
+                   f'{href}#{anchor["anchor"]}' if anchor.get('anchor') else href)  # noqa: E501
+
+
+def _generate_navigation(chapter_infos: List[Dict],
+                         chapter_paths: List[str],
+                         book_id: str,
+                         book_title: str) -> Tuple[str, str]:
+    """在OEBPS文件夹下创建嵌套的toc.ncx和ePub3的nav.xhtml文件.
+
+    按照`toc.json`中的层级一次遍历全部章节和锚点, 使用栈保存每一层的父结点,
+    同时生成两个导航文件; 层级跳跃时作为上一个结点的子结点.
 
     References:
         - [导航文件格式](http://www.theheratik.net/books/tech-epub/chapter-4/)
+        - [ePub3导航文档](https://www.w3.org/TR/epub-33/#sec-nav)
 
     Args:
         chapter_infos: list of dict,
@@ -242,7 +960,7 @@ def _generate_toc_ncx(chapter_infos: List[Dict],
             图书标题.
 
     Return:
-        toc.ncx文件内容的xml文本.
+        toc.ncx和nav.xhtml文件内容的xml文本.
     """
     toc_ncx = BeautifulSoup(features='xml')
     ncx = toc_ncx.new_tag('ncx', attrs={
@@ -261,8 +979,8 @@ def _generate_toc_ncx(chapter_infos: List[Dict],
         'content': book_id
     })
     head.append(meta)
-    meta = toc_ncx.new_tag('meta', attrs={'name': 'dtb:depth', 'content': 1})
-    head.append(meta)
+    depth_meta = toc_ncx.new_tag('meta', attrs={'name': 'dtb:depth'})
+    head.append(depth_meta)
     meta = toc_ncx.new_tag('meta', attrs={
         'name': 'dtb:totalPageCount',
         'content': 0
@@ -281,27 +999,72 @@ def _generate_toc_ncx(chapter_infos: List[Dict],
     text.string = book_title
     doc_title.append(text)
 
-    # 创建<navMap>元素, 列出每章的标题.
+    # 创建<navMap>元素.
     nav_map = toc_ncx.new_tag('navMap')
     ncx.append(nav_map)
-    # 遍历章节信息.
-    for i, (chapter_info, chapter_path) in enumerate(zip(chapter_infos, chapter_paths)):  # noqa: E501
+
+    # 创建nav.xhtml.
+    nav_xhtml = BeautifulSoup(features='xml')
+    html = nav_xhtml.new_tag('html', attrs={
+        'xmlns': 'http://www.w3.org/1999/xhtml',
+        'xmlns:epub': 'http://www.idpf.org/2007/ops',
+        'xml:lang': 'zh'
+    })
+    nav_xhtml.append(html)
+    head = nav_xhtml.new_tag('head')
+    html.append(head)
+    title = nav_xhtml.new_tag('title')
+    title.string = book_title
+    head.append(title)
+    body = nav_xhtml.new_tag('body')
+    html.append(body)
+    nav = nav_xhtml.new_tag('nav', attrs={'epub:type': 'toc', 'id': 'toc'})
+    body.append(nav)
+    h1 = nav_xhtml.new_tag('h1')
+    h1.string = '目录'
+    nav.append(h1)
+    ol = nav_xhtml.new_tag('ol')
+    nav.append(ol)
+
+    # 栈中保存[层级, navPoint, <li>, <li>中的<ol>], 栈底是navMap和最外层的<ol>.
+    stack = [[0, nav_map, None, ol]]
+    depth = 0
+    for i, (level, label, href) in enumerate(_iter_nav_entries(chapter_infos, chapter_paths)):  # noqa: E501
+        while stack[-1][0] >= level:
+            stack.pop()
+        _, parent_point, parent_li, parent_ol = stack[-1]
+
+        # 创建navPoint, 列出章节的标题.
         nav_point = toc_ncx.new_tag('navPoint', attrs={
             'id': f'np-{i + 1}',
             'playOrder': i + 1
         })
-        nav_map.append(nav_point)
+        parent_point.append(nav_point)
         nav_label = toc_ncx.new_tag('navLabel')
         nav_point.append(nav_label)
         text = toc_ncx.new_tag('text')
-        text.string = chapter_info['title']
+        text.string = label
         nav_label.append(text)
-        content = toc_ncx.new_tag('content', attrs={
-            'src': chapter_path.replace('html', 'xhtml')  # 替换原始文本的html格式成xhtml.  # noqa: E501
-        })
+        content = toc_ncx.new_tag('content', attrs={'src': href})
         nav_point.append(content)
 
-    return toc_ncx.prettify()
+        # 父结点的第一个子结点, 在父结点的<li>中创建<ol>.
+        if parent_ol is None:
+            parent_ol = nav_xhtml.new_tag('ol')
+            parent_li.append(parent_ol)
+            stack[-1][3] = parent_ol
+        li = nav_xhtml.new_tag('li')
+        parent_ol.append(li)
+        a = nav_xhtml.new_tag('a', attrs={'href': href})
+        a.string = label
+        li.append(a)
+
+        stack.append([level, nav_point, li, None])
+        depth = max(depth, len(stack) - 1)
+
+    depth_meta['content'] = max(depth, 1)
+
+    return toc_ncx.prettify(), nav_xhtml.prettify()
 
 
 def _processing_html(html: bytes) -> BeautifulSoup:
@@ -368,19 +1131,52 @@ def _processing_html(html: bytes) -> BeautifulSoup:
     return html
 
 
-def _generate_chapter_xhtml(chapter_content_html: bytes) -> str:
+def _generate_chapter_xhtml(chapter_content_html: bytes,
+                            styles: Optional[_StyleOptimizer] = None) -> str:
     """基于原始章节数据的html在OEBPS/Text/文件夹下创建标准xhtml文件.
 
     Args:
         chapter_content_html: bytes,
             原始章节内容.
+        styles: _StyleOptimizer, default=None,
+            样式表优化器, 设置时将在生成的xhtml上匹配样式表的选择器.
 
     Return:
         章节文件内容的xhtml文本.
     """
     # 处理原始章节数据的html.
-    chapter_content_html = _processing_html(chapter_content_html)
+    xhtml = _build_chapter_xhtml(_processing_html(chapter_content_html))
+    if styles is not None:
+        styles.match(chapter_content_html, xhtml)
+
+    return xhtml.prettify()
+
+
+def _wrap_chapter_xhtml(chapter_content_html: BeautifulSoup) -> str:
+    """将处理完成的章节html包装成标准xhtml文件.
+
+    注意: 包装会将<body>中的元素移动到xhtml中, 之后`chapter_content_html`将不再包含这些元素.
+
+    Args:
+        chapter_content_html: BeautifulSoup,
+            经过`_processing_html`处理完成的html.
+
+    Return:
+        章节文件内容的xhtml文本.
+    """
+    return _build_chapter_xhtml(chapter_content_html).prettify()
+
 
+def _build_chapter_xhtml(chapter_content_html: BeautifulSoup) -> BeautifulSoup:  # noqa: E501
+    """将处理完成的章节html包装成标准xhtml文档, 用法与`_wrap_chapter_xhtml`相同.
+
+    Args:
+        chapter_content_html: BeautifulSoup,
+            经过`_processing_html`处理完成的html.
+
+    Return:
+        章节的xhtml文档.
+    """
     xhtml = BeautifulSoup(features='xml')
     html = xhtml.new_tag('html', attrs={
         'xmlns': 'http://www.w3.org/1999/xhtml'
@@ -411,7 +1207,7 @@ def _generate_chapter_xhtml(chapter_content_html: bytes) -> str:
     for node in chapter_content_html.body.find_all(['div', 'p'], recursive=False):  # noqa: E501
         div.append(node)
 
-    return xhtml.prettify()
+    return xhtml
 
 
 def _generate_coverpage_xhtml(epub_file: ZipFile):
@@ -450,49 +1246,99 @@ def _generate_coverpage_xhtml(epub_file: ZipFile):
                        coverpage_xhtml.prettify())
 
 
-def _generate_oebps(rdata_file: Union[str, os.PathLike],
-                    epub_file: ZipFile,
-                    verbose: bool):
-    """创建OEBPS文件夹并生成当前文件夹下全部文件.
+def _open_rdata(rdata_file: Union[str, os.PathLike]) -> Tuple[ZipFile, List[ZipInfo], Dict, List[Dict]]:  # noqa: E501
+    """读取原始数据文件的文件列表, 图书的元信息和章节信息, 失败时抛出异常.
 
     Args:
         rdata_file: str or os.PathLike,
             原始数据文件.
-        epub_file: ZipFile,
-            生成的ePub文件的文件指针.
-        verbose: bool = False,
-            是否展示生成文件的详细信息.
+
+    Return:
+        原始数据文件的文件指针, 排序后的文件列表, 图书的元信息和章节信息.
+
+    Raises:
+        FileNotFoundError: 未找到原始数据文件.
+        BadZipFile: 不是一个合法的原始数据文件.
+        KeyError: 没有找到content.json或toc.json, 参数为缺少的文件名.
     """
-    # 查看原始数据文件的内容.
+    rdata = ZipFile(rdata_file)
     try:
-        file_list = ZipFile(rdata_file).infolist()
-        file_list.sort(key=lambda x: (re.sub(r'\d+', '', x.filename)))  # 先根据字母, 再根据数字排序.  # noqa: E501
+        file_list = rdata.infolist()
+        names = {file.filename for file in file_list}
+        for name in ('content.json', 'toc.json'):
+            if name not in names:
+                raise KeyError(name)
+        book_info_json = json.loads(rdata.read('content.json'))
+        chapter_infos_json = json.loads(rdata.read('toc.json'))
+    except BaseException:
+        rdata.close()
+        raise
+
+    # 排序与原始数据文件中的文件顺序无关.
+    file_list = _sort_files(file_list, chapter_infos_json)
+
+    return rdata, file_list, book_info_json, chapter_infos_json
+
+
+def _load_rdata(rdata_file: Union[str, os.PathLike]) -> Tuple[ZipFile, List[ZipInfo], Dict, List[Dict]]:  # noqa: E501
+    """读取原始数据文件的文件列表, 图书的元信息和章节信息, 失败时退出.
+
+    Args:
+        rdata_file: str or os.PathLike,
+            原始数据文件.
+
+    Return:
+        原始数据文件的文件指针, 排序后的文件列表, 图书的元信息和章节信息.
+    """
+    try:
+        return _open_rdata(rdata_file)
     except BadZipFile:
-        logger.error(f'{Path(rdata_file).name} 不是一个合法的原始数据文件!')
+        logger.error('%s 不是一个合法的原始数据文件!', Path(rdata_file).name)
         sys.exit(1)
     except FileNotFoundError:
         logger.error('请检查你的原始数据文件路径, 未找到原始数据文件!')
         sys.exit(1)
+    except KeyError as err:
+        logger.error('没有找到%s文件, 请检查你的原始数据文件!', err.args[0])
+        sys.exit(1)
+
+
+def _generate_oebps(rdata: ZipFile,
+                    file_list: List[ZipInfo],
+                    book_info: Dict,
+                    chapter_infos: List[Dict],
+                    epub_file: Union[_EpubFile, _EpubDir],
+                    verbose: bool,
+                    optimize_css: bool = False,
+                    css_cache_file: Optional[Union[str, os.PathLike]] = None
+                    ) -> Iterator[str]:
+    """创建OEBPS文件夹并生成当前文件夹下全部文件, 每生成一个文件产出一次文件名.
 
+    Args:
+        rdata: ZipFile,
+            原始数据文件的文件指针.
+        file_list: list of ZipInfo,
+            排序后的原始数据文件的文件列表.
+        book_info: dict,
+            书籍的元信息.
+        chapter_infos: list of dict,
+            书籍章节的原始信息.
+        epub_file: _EpubFile or _EpubDir,
+            生成的ePub文件的文件指针.
+        verbose: bool = False,
+            是否展示生成文件的详细信息.
+        optimize_css: bool, default=False,
+            是否优化样式表; 样式表将在全部章节生成之后写入.
+        css_cache_file: str or os.PathLike, default=None,
+            选择器匹配结果的缓存文件.
+    """
     # 通过content.json生成content.opf.
-    try:
-        book_info_bytes = ZipFile(rdata_file).read('content.json')
-        book_info_json = json.loads(book_info_bytes)
-    except KeyError:
-        logger.error('没有找到content.json文件, 请检查你的原始数据文件!')
-        sys.exit(1)
-    content_opf_str = _generate_content_opf(book_info_json, file_list)
-    epub_file.writestr('OEBPS/content.opf', content_opf_str)
+    if not epub_file.reuse('OEBPS/content.opf'):
+        content_opf_str = _generate_content_opf(book_info, file_list)
+        epub_file.writestr('OEBPS/content.opf', content_opf_str)
     if verbose:
         logger.info('生成 OEBPS/content.opf 文件.')
-
-    # 通过toc.json生成toc.ncx.
-    try:
-        chapter_infos_bytes = ZipFile(rdata_file).read('toc.json')
-        chapter_infos_json = json.loads(chapter_infos_bytes)
-    except KeyError:
-        logger.error('没有找到toc.json文件, 请检查你的原始数据文件!')
-        sys.exit(1)
+    yield 'OEBPS/content.opf'
 
     # 筛选章节内容的路径.
     chapter_paths = []
@@ -500,41 +1346,352 @@ def _generate_oebps(rdata_file: Union[str, os.PathLike],
         if file.filename.startswith('Text/'):
             chapter_paths.append(file.filename)
 
-    toc_ncx_str = _generate_toc_ncx(chapter_infos_json,
-                                    chapter_paths,
-                                    book_info_json['bookId'],
-                                    book_info_json['title'])
-    epub_file.writestr('OEBPS/toc.ncx', toc_ncx_str)
-    if verbose:
-        logger.info('生成 OEBPS/toc.ncx 文件.')
+    # 通过toc.json生成toc.ncx和nav.xhtml.
+    navigation = None
+    for i, arcname in enumerate(('OEBPS/toc.ncx', 'OEBPS/nav.xhtml')):
+        if not epub_file.reuse(arcname):
+            if navigation is None:
+                navigation = _generate_navigation(chapter_infos,
+                                                  chapter_paths,
+                                                  book_info['bookId'],
+                                                  book_info['title'])
+            epub_file.writestr(arcname, navigation[i])
+        if verbose:
+            logger.info('生成 %s 文件.', arcname)
+        yield arcname
+
+    styles = None
+    if optimize_css:
+        styles = _StyleOptimizer({file.filename: rdata.read(file)
+                                  for file in file_list
+                                  if file.filename.startswith('Styles/') and
+                                  file.filename.endswith('.css')},
+                                 css_cache_file)
 
-    for file in file_list:
-        file_bytes = ZipFile(rdata_file).read(file.filename)
-        # 写入图片和样式表文件.
-        if (file.filename.startswith('Images/') or
-                file.filename.startswith('Styles/')):
-            epub_file.writestr(os.path.join('OEBPS/', file.filename),
-                               file_bytes)
-            if verbose:
-                logger.info(f'生成 OEBPS/{file.filename} 文件.')
-        # 通过原始章节数据的html生成标准xhtml文件.
-        elif file.filename.startswith('Text/'):
-            chapter_xhtml = _generate_chapter_xhtml(file_bytes)
-            chapter_path = file.filename.split('.')[0] + '.xhtml'
-            chapter_path = os.path.join('OEBPS/', chapter_path)
-            epub_file.writestr(chapter_path, chapter_xhtml)
-            if verbose:
-                logger.info(f'生成 {chapter_path} 文件.')
+    try:
+        for file in file_list:
+            # 优化的样式表需要等待全部章节生成之后写入.
+            if styles is not None and file.filename in styles.sizes:
+                continue
+
+            # 写入图片和样式表文件.
+            if (file.filename.startswith('Images/') or
+                    file.filename.startswith('Styles/')):
+                arcname = os.path.join('OEBPS/', file.filename)
+                if not epub_file.reuse(arcname):
+                    epub_file.copyfile(rdata, file, arcname)
+                if verbose:
+                    logger.info('生成 OEBPS/%s 文件.', file.filename)
+                yield f'OEBPS/{file.filename}'
+            # 通过原始章节数据的html生成标准xhtml文件.
+            elif file.filename.startswith('Text/'):
+                chapter_path = file.filename.split('.')[0] + '.xhtml'
+                chapter_path = os.path.join('OEBPS/', chapter_path)
+                if not epub_file.reuse(chapter_path):
+                    file_bytes = rdata.read(file.filename)
+                    chapter_xhtml = _generate_chapter_xhtml(file_bytes, styles)  # noqa: E501
+                    epub_file.writestr(chapter_path, chapter_xhtml)
+                if verbose:
+                    logger.info('生成 %s 文件.', chapter_path)
+                yield chapter_path
+
+        # 只保留被章节使用的样式规则.
+        if styles is not None:
+            for filename, css in styles.render().items():
+                epub_file.writestr(f'OEBPS/{filename}', css)
+                if verbose:
+                    logger.info('生成 OEBPS/%s 文件(%d字节优化到%d字节).',
+                                filename, styles.sizes[filename], len(css))
+                yield f'OEBPS/{filename}'
+    finally:
+        if styles is not None:
+            styles.close()
 
     # 生成OEBPS/Text/coverpage.xhtml.
     _generate_coverpage_xhtml(epub_file)
     if verbose:
         logger.info('生成 OEBPS/Text/coverpage.xhtml 文件.')
+    yield 'OEBPS/Text/coverpage.xhtml'
+
+
+def _write_epub(rdata: ZipFile,
+                file_list: List[ZipInfo],
+                book_info: Dict,
+                chapter_infos: List[Dict],
+                epub_file: Union[_EpubFile, _EpubDir],
+                verbose: bool,
+                optimize_css: bool = False,
+                css_cache_file: Optional[Union[str, os.PathLike]] = None
+                ) -> Iterator[Progress]:
+    """逐个写入ePub文件中的文件, 先产出全部的文件数, 之后每生成一个文件产出一次进度.
+
+    Args:
+        rdata: ZipFile,
+            原始数据文件的文件指针.
+        file_list: list of ZipInfo,
+            排序后的原始数据文件的文件列表.
+        book_info: dict,
+            书籍的元信息.
+        chapter_infos: list of dict,
+            书籍章节的原始信息.
+        epub_file: _EpubFile or _EpubDir,
+            生成的ePub文件的文件指针.
+        verbose: bool,
+            是否展示生成ePub文件的详细信息.
+        optimize_css: bool, default=False,
+            是否优化样式表.
+        css_cache_file: str or os.PathLike, default=None,
+            选择器匹配结果的缓存文件.
+    """
+    # mimetype, META-INF下2个文件, content.opf, toc.ncx, nav.xhtml和coverpage.xhtml.
+    total = 7
+    for file in file_list:
+        if file.filename.startswith(('Images/', 'Styles/', 'Text/')):
+            total += 1
+    yield Progress(0, total, '')
+
+    # 创建mimetype文件, ePub规范要求mimetype是第一个未压缩的文件.
+    epub_file.writestr('mimetype',
+                       'application/epub+zip',
+                       compress_type=ZIP_STORED)
+    if verbose:
+        logger.info('生成 mimetype 文件.')
+    yield Progress(1, total, 'mimetype')
+
+    # 创建META-INF文件夹和OEBPS文件夹.
+    filenames = chain(_generate_meta_inf(epub_file, verbose),
+                      _generate_oebps(rdata,
+                                      file_list,
+                                      book_info,
+                                      chapter_infos,
+                                      epub_file,
+                                      verbose,
+                                      optimize_css,
+                                      css_cache_file))
+    for i, filename in enumerate(filenames):
+        yield Progress(i + 2, total, filename)
+
+
+def _generate_steps(rdata_file: Union[str, os.PathLike],
+                    output: Optional[Union[str, os.PathLike, BinaryIO]],
+                    verbose: bool,
+                    deterministic: bool = False,
+                    workers: Optional[int] = None,
+                    layout: Layout = 'zip',
+                    callback: Optional[ProgressCallback] = None,
+                    optimize_css: bool = False,
+                    css_cache_file: Optional[Union[str, os.PathLike]] = None,
+                    update: bool = False
+                    ) -> Steps[EpubBuild]:
+    """逐个生成ePub文件中的文件, 每生成一个文件产出一次进度.
+
+    输出到路径时, ePub文件先写入同目录下的`.part`临时文件, 全部生成完成后再重命名;
+    中途失败或取消时将删除临时文件, 不会留下不完整的ePub文件.
+    输出到二进制流时, 将以流式模式直接写入, 不会进行任何的seek操作.
+    输出目录时, 只重写内容发生变化的文件.
+    增量更新时, 没有变化的文件直接从已经存在的ePub文件中复制, 完成后更新旁路清单.
+    可复现构建时, 摘要将保存在ePub文件的注释中; 已经存在的ePub文件摘要相同时将跳过生成.
+
+    Args:
+        rdata_file: str or os.PathLike,
+            原始数据文件.
+        output: str, os.PathLike, BinaryIO or None,
+            ePub文件的保存路径或可写入的二进制流, 为None时保存为'原始数据文件名.epub'.
+        verbose: bool,
+            是否展示生成ePub文件的详细信息.
+        deterministic: bool, default=False,
+            是否可复现构建.
+        workers: int, default=None,
+            压缩使用的线程数量, 默认为CPU的核心数.
+        layout: {'zip', 'dir'}, default='zip',
+            ePub文件的形式, 'dir'表示输出解压后的目录.
+        callback: Callable, default=None,
+            进度回调, 每生成一个文件调用一次, 报告累计写入的字节数.
+        optimize_css: bool, default=False,
+            是否清理没有被章节使用的样式规则并压缩样式表.
+        css_cache_file: str or os.PathLike, default=None,
+            选择器匹配结果的缓存文件, 默认只在内存中缓存.
+        update: bool, default=False,
+            是否增量更新已经存在的ePub文件.
+
+    Return:
+        包含ePub文件的绝对路径, 摘要和是否跳过生成的`EpubBuild`.
+    """
+    if layout not in ('zip', 'dir'):
+        logger.error('不支持的ePub文件形式%s, 请使用`zip`或`dir`!', layout)
+        sys.exit(1)
+    stream = output is not None and not isinstance(output, (str, os.PathLike))
+    if stream and layout == 'dir':
+        logger.error('目录形式的ePub文件不能写入二进制流!')
+        sys.exit(1)
+    if stream and update:
+        logger.error('写入二进制流时不能增量更新ePub文件!')
+        sys.exit(1)
+
+    rdata, file_list, book_info, chapter_infos = _load_rdata(rdata_file)
+    digest = _source_digest(rdata, optimize_css) if deterministic else None
+    workers = workers or os.cpu_count() or 1
+    tracker = ProgressTracker('generate', callback)
+
+    # 直接写入二进制流.
+    if stream:
+        try:
+            with _EpubFile(output, deterministic, workers) as epub_file:
+                if digest:
+                    epub_file.comment = _DIGEST_PREFIX + digest.encode()
+                yield from track_steps(_write_epub(rdata,
+                                                   file_list,
+                                                   book_info,
+                                                   chapter_infos,
+                                                   epub_file,
+                                                   verbose,
+                                                   optimize_css,
+                                                   css_cache_file),
+                                       tracker,
+                                       lambda: epub_file.bytes_written)
+            output.flush()
+        finally:
+            rdata.close()
+
+        return EpubBuild(None, digest, False)
+
+    # 创建ePub文件.
+    if output is None:
+        epub_file_path = _default_output(rdata_file,
+                                         '.epub' if layout == 'zip' else '')
+    else:
+        epub_file_path = Path(output)
+
+    # 原始数据文件和生成工具都没有变化, 跳过生成.
+    if digest and _epub_digest(epub_file_path) == digest:
+        rdata.close()
+        if verbose:
+            logger.info('%s 没有变化, 跳过生成.', epub_file_path.name)
+        return EpubBuild(epub_file_path.absolute(), digest, True)
+
+    # 输出目录, 只重写内容发生变化的文件.
+    if layout == 'dir':
+        try:
+            with _EpubDir(epub_file_path) as epub_file:
+                if digest:
+                    epub_file.comment = _DIGEST_PREFIX + digest.encode()
+                yield from track_steps(_write_epub(rdata,
+                                                   file_list,
+                                                   book_info,
+                                                   chapter_infos,
+                                                   epub_file,
+                                                   verbose,
+                                                   optimize_css,
+                                                   css_cache_file),
+                                       tracker,
+                                       lambda: epub_file.bytes_written)
+        finally:
+            rdata.close()
+        if verbose:
+            logger.info('更新了%s个文件.', len(epub_file.changed))
+
+        return EpubBuild(epub_file_path.absolute(), digest, False)
+
+    # 增量更新时, 找出可以从已经存在的ePub文件中复制的文件.
+    options = {'deterministic': deterministic, 'optimize_css': optimize_css}
+    base, unchanged = None, set()
+    if update:
+        unchanged = _unchanged_entries(epub_file_path, file_list, options)
+    if unchanged:
+        try:
+            base = ZipFile(epub_file_path)
+            unchanged &= set(base.namelist())
+        except BadZipFile:
+            unchanged = set()
+
+    part_file_path = epub_file_path.with_name(epub_file_path.name + '.part')
+    completed = False
+    try:
+        with _EpubFile(part_file_path,
+                       deterministic,
+                       workers,
+                       base,
+                       unchanged) as epub_file:
+            if digest:
+                epub_file.comment = _DIGEST_PREFIX + digest.encode()
+            yield from track_steps(_write_epub(rdata,
+                                               file_list,
+                                               book_info,
+                                               chapter_infos,
+                                               epub_file,
+                                               verbose,
+                                               optimize_css,
+                                               css_cache_file),
+                                   tracker,
+                                   lambda: epub_file.bytes_written)
+
+        if base is not None:
+            base.close()
+        os.replace(part_file_path, epub_file_path)
+        completed = True
+    finally:
+        rdata.close()
+        if base is not None:
+            base.close()
+        if not completed and part_file_path.exists():
+            part_file_path.unlink()
+
+    # 保存增量更新使用的旁路清单, 没有增量更新时删除过期的清单.
+    manifest_path = _manifest_path(epub_file_path)
+    if update:
+        _write_manifest(epub_file_path, file_list, options)
+        if verbose:
+            logger.info('复用了%s个文件.', len(epub_file.reused))
+    elif manifest_path.exists():
+        manifest_path.unlink()
+
+    return EpubBuild(epub_file_path.absolute(), digest, False)
+
+
+def _validate(epub_file_path: Path, verbose: bool):
+    """检查生成的ePub文件的结构, 发现问题时退出.
+
+    Args:
+        epub_file_path: Path,
+            生成的ePub文件.
+        verbose: bool,
+            是否展示检查的详细信息.
+    """
+    if validate_epub(epub_file_path, verbose):
+        logger.error('生成的%s结构不完整, 请检查原始数据文件!', epub_file_path.name)
+        sys.exit(1)
+
+
+def _generate_info(verbose: bool, info: bool):
+    """输出生成结果的提示信息.
+
+    Args:
+        verbose: bool,
+            是否展示生成ePub文件的详细信息.
+        info: bool,
+            是否输出提示信息.
+    """
+    if verbose:
+        logger.info('-' * 50)
+
+    if info:
+        logger.info('成功在当前目录生成ePub文件:)')
 
 
 def generate(rdata_file: Union[str, os.PathLike],
              verbose: bool = False,
-             info: bool = False) -> Path:
+             info: bool = False,
+             output: Optional[Union[str, os.PathLike, BinaryIO]] = None,
+             catalog_file: Optional[Union[str, os.PathLike]] = None,
+             validate: bool = False,
+             deterministic: bool = False,
+             workers: Optional[int] = None,
+             layout: Layout = 'zip',
+             callback: Optional[ProgressCallback] = None,
+             optimize_css: bool = False,
+             css_cache_file: Optional[Union[str, os.PathLike]] = None,
+             update: bool = False
+             ) -> EpubBuild:
     """根据原始数据文件生成ePub文件.
 
     生成的ePub文件参照这个目录创建:
@@ -550,6 +1707,7 @@ def generate(rdata_file: Union[str, os.PathLike],
             |
             |-- content.opf (图书的元数据)
             |-- toc.ncx (章节的导航信息)
+            |-- nav.xhtml (ePub3的导航文档)
             |-- Images (图片文件)
             |-- Styles (样式表css)
                 |
@@ -570,29 +1728,226 @@ def generate(rdata_file: Union[str, os.PathLike],
             是否展示生成ePub文件的详细信息.
         info: bool, default=False,
             是否输出提示信息.
+        output: str, os.PathLike or BinaryIO, default=None,
+            ePub文件的保存路径或可写入的二进制流(比如文件对象, socket的写入端或者标准输出),
+             默认为'原始数据文件名.epub'; 二进制流将以流式模式写入.
+        catalog_file: str or os.PathLike, default=None,
+            图书目录文件, 设置时将在生成完成后更新图书目录;
+             输出到二进制流或目录时不更新.
+        validate: bool, default=False,
+            是否在生成完成后检查ePub文件的结构, 发现问题时将退出;
+             输出到二进制流或目录时无效.
+        deterministic: bool, default=False,
+            是否可复现构建; 全部文件使用固定的时间戳和排序, 相同的原始数据文件将生成
+             逐字节相同的ePub文件, 原始数据文件的摘要保存在ePub文件的注释中,
+             已经存在的ePub文件摘要相同时将在压缩前跳过生成.
+        workers: int, default=None,
+            压缩使用的线程数量, 默认为CPU的核心数; 章节将在线程池中并行压缩,
+             再按照原来的顺序写入ePub文件.
+        layout: {'zip', 'dir'}, default='zip',
+            ePub文件的形式; 'dir'表示将`mimetype`, `META-INF`和`OEBPS`写入目录
+             (默认为'原始数据文件名'), 只重写内容发生变化的文件, 之后可以使用`pack`打包.
+        callback: Callable, default=None,
+            进度回调, 参数为`ProgressEvent`; 阶段('generate')开始, 每生成一个文件
+             和阶段结束时各调用一次, 包含累计写入的字节数, 吞吐量和预计剩余时间.
+        optimize_css: bool, default=False,
+            是否优化样式表; 解析样式表, 删除选择器没有匹配任何生成的章节的规则,
+             合并完全相同的规则并压缩剩余的规则; 无法解析的选择器和@规则将被保留.
+        css_cache_file: str or os.PathLike, default=None,
+            选择器匹配结果的缓存文件(SQLite), 按照章节内容的摘要缓存,
+             重新生成时直接复用; 默认只在内存中缓存.
+        update: bool, default=False,
+            是否增量更新已经存在的ePub文件; 比较原始数据文件和上一次生成时保存的旁路清单
+             ('ePub文件名.weread-manifest'), 没有变化的文件直接复制压缩后的数据,
+             只重新生成变化的章节, 必要时重新生成content.opf, toc.ncx和nav.xhtml;
+             清单不存在或ePub文件已经被修改时完整生成. 优化样式表时总是完整生成;
+             输出到二进制流时不可用, 输出目录时无效(目录本身只重写变化的文件).
 
     Return:
-        ePub文件的绝对路径.
+        包含ePub文件(或目录)的绝对路径, 摘要和是否跳过生成的`EpubBuild`;
+         输出到二进制流时路径为None, 不是可复现构建时摘要为None.
     """
-    # 创建ePub文件.
-    epub_file_path = str(Path(rdata_file)).split('.')[0] + '.epub'
-    epub_file = ZipFile(epub_file_path, 'w', ZIP_DEFLATED)
+    build = run_steps(_generate_steps(rdata_file,
+                                      output,
+                                      verbose,
+                                      deterministic,
+                                      workers,
+                                      layout,
+                                      callback,
+                                      optimize_css,
+                                      css_cache_file,
+                                      update))
+    if validate and build.path and not build.skipped and layout == 'zip':
+        _validate(build.path, verbose)
+    # 只有路径形式的ePub文件才记录到图书目录中.
+    if catalog_file and build.path and layout == 'zip':
+        update_catalog(catalog_file, rdata_file, build.path)
+    _generate_info(verbose, info)
+
+    return build
+
+
+async def agenerate(rdata_file: Union[str, os.PathLike],
+                    verbose: bool = False,
+                    info: bool = False,
+                    progress: Optional[AsyncProgress] = None,
+                    output: Optional[Union[str, os.PathLike, BinaryIO]] = None,
+                    catalog_file: Optional[Union[str, os.PathLike]] = None,
+                    validate: bool = False,
+                    deterministic: bool = False,
+                    workers: Optional[int] = None,
+                    layout: Layout = 'zip',
+                    callback: Optional[ProgressCallback] = None,
+                    optimize_css: bool = False,
+                    css_cache_file: Optional[Union[str, os.PathLike]] = None,
+                    update: bool = False
+                    ) -> EpubBuild:
+    """异步根据原始数据文件生成ePub文件, 逐个文件在执行器中解析和压缩, 不阻塞事件循环.
+
+    取消时将等待当前文件处理完成后删除临时文件, 不会留下不完整的ePub文件.
 
-    # 创建mimetype文件.
-    epub_file.writestr('mimetype', 'application/epub+zip')
-    if verbose:
-        logger.info('生成 mimetype 文件.')
+    Args:
+        rdata_file: str or os.PathLike,
+            原始数据文件.
+        verbose: bool, default=False,
+            是否展示生成ePub文件的详细信息.
+        info: bool, default=False,
+            是否输出提示信息.
+        progress: AsyncProgress, default=None,
+            异步进度迭代器, 每生成一个文件产出一次进度.
+        output: str, os.PathLike or BinaryIO, default=None,
+            ePub文件的保存路径或可写入的二进制流, 默认为'原始数据文件名.epub';
+             二进制流将以流式模式写入, 取消时流中会残留已写入的数据.
+        catalog_file: str or os.PathLike, default=None,
+            图书目录文件, 设置时将在生成完成后更新图书目录;
+             输出到二进制流或目录时不更新.
+        validate: bool, default=False,
+            是否在生成完成后检查ePub文件的结构, 发现问题时将退出;
+             输出到二进制流或目录时无效.
+        deterministic: bool, default=False,
+            是否可复现构建; 全部文件使用固定的时间戳和排序, 相同的原始数据文件将生成
+             逐字节相同的ePub文件, 原始数据文件的摘要保存在ePub文件的注释中,
+             已经存在的ePub文件摘要相同时将在压缩前跳过生成.
+        workers: int, default=None,
+            压缩使用的线程数量, 默认为CPU的核心数; 章节将在线程池中并行压缩,
+             再按照原来的顺序写入ePub文件.
+        layout: {'zip', 'dir'}, default='zip',
+            ePub文件的形式; 'dir'表示将`mimetype`, `META-INF`和`OEBPS`写入目录
+             (默认为'原始数据文件名'), 只重写内容发生变化的文件, 之后可以使用`pack`打包.
+        callback: Callable, default=None,
+            进度回调, 参数为`ProgressEvent`; 阶段('generate')开始, 每生成一个文件
+             和阶段结束时各调用一次, 包含累计写入的字节数, 吞吐量和预计剩余时间;
+             回调在执行器的线程中调用.
+        optimize_css: bool, default=False,
+            是否优化样式表; 解析样式表, 删除选择器没有匹配任何生成的章节的规则,
+             合并完全相同的规则并压缩剩余的规则; 无法解析的选择器和@规则将被保留.
+        css_cache_file: str or os.PathLike, default=None,
+            选择器匹配结果的缓存文件(SQLite), 按照章节内容的摘要缓存,
+             重新生成时直接复用; 默认只在内存中缓存.
+        update: bool, default=False,
+            是否增量更新已经存在的ePub文件; 比较原始数据文件和上一次生成时保存的旁路清单
+             ('ePub文件名.weread-manifest'), 没有变化的文件直接复制压缩后的数据,
+             只重新生成变化的章节, 必要时重新生成content.opf, toc.ncx和nav.xhtml;
+             清单不存在或ePub文件已经被修改时完整生成. 优化样式表时总是完整生成;
+             输出到二进制流时不可用, 输出目录时无效(目录本身只重写变化的文件).
 
-    # 创建META-INF文件夹.
-    _generate_meta_inf(epub_file, verbose)
+    Return:
+        包含ePub文件(或目录)的绝对路径, 摘要和是否跳过生成的`EpubBuild`;
+         输出到二进制流时路径为None, 不是可复现构建时摘要为None.
+    """
+    build = await arun_steps(_generate_steps(rdata_file,
+                                             output,
+                                             verbose,
+                                             deterministic,
+                                             workers,
+                                             layout,
+                                             callback,
+                                             optimize_css,
+                                             css_cache_file,
+                                             update),
+                             progress)
+    if validate and build.path and not build.skipped and layout == 'zip':
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, _validate, build.path, verbose)
+    # 只有路径形式的ePub文件才记录到图书目录中.
+    if catalog_file and build.path and layout == 'zip':
+        update_catalog(catalog_file, rdata_file, build.path)
+    _generate_info(verbose, info)
+
+    return build
+
+
+def pack(directory: Union[str, os.PathLike],
+         output: Optional[Union[str, os.PathLike]] = None,
+         deterministic: bool = False,
+         workers: Optional[int] = None,
+         verbose: bool = False,
+         info: bool = False) -> Path:
+    """将目录形式的ePub文件打包成ePub文件.
+
+    `mimetype`作为第一个未压缩的文件, 其余文件按照路径自然排序后压缩, 隐藏文件将被忽略;
+    小文件在线程池中并行压缩, 大文件流式写入. ePub文件先写入`.part`临时文件再重命名.
 
-    # 创建OEBPS文件夹.
-    _generate_oebps(rdata_file, epub_file, verbose)
+    Args:
+        directory: str or os.PathLike,
+            目录形式的ePub文件, 比如`generate(..., layout='dir')`的输出.
+        output: str or os.PathLike, default=None,
+            ePub文件的保存路径, 默认为'目录名.epub'.
+        deterministic: bool, default=False,
+            是否可复现构建; 全部文件使用固定的时间戳,
+             目录中保存的摘要将写入ePub文件的注释.
+        workers: int, default=None,
+            压缩使用的线程数量, 默认为CPU的核心数.
+        verbose: bool, default=False,
+            是否展示打包的详细信息.
+        info: bool, default=False,
+            是否输出提示信息.
+
+    Return:
+        ePub文件的绝对路径.
+    """
+    directory = Path(directory)
+    if not (directory / 'mimetype').is_file():
+        logger.error('请检查你的目录路径, 未找到目录形式的ePub文件!')
+        sys.exit(1)
+
+    epub_file_path = Path(output or str(directory) + '.epub')
+    files = sorted(
+        ((path.relative_to(directory).as_posix(), path)
+         for path in directory.rglob('*')
+         if path.is_file() and not any(part.startswith('.') for part in
+                                       path.relative_to(directory).parts)),
+        key=lambda file: _natural_key(file[0])
+    )
+
+    part_file_path = epub_file_path.with_name(epub_file_path.name + '.part')
+    completed = False
+    try:
+        with _EpubFile(part_file_path,
+                       deterministic,
+                       workers or os.cpu_count() or 1) as epub_file:
+            epub_file.writestr('mimetype',
+                               (directory / 'mimetype').read_bytes(),
+                               compress_type=ZIP_STORED)
+            for arcname, path in files:
+                if arcname == 'mimetype':
+                    continue
+                epub_file.writefile(path, arcname)
+                if verbose:
+                    logger.info('打包 %s 文件.', arcname)
+            if deterministic and (directory / _DIGEST_FILE).is_file():
+                epub_file.comment = (directory / _DIGEST_FILE).read_bytes()
+
+        os.replace(part_file_path, epub_file_path)
+        completed = True
+    finally:
+        if not completed and part_file_path.exists():
+            part_file_path.unlink()
 
     if verbose:
         logger.info('-' * 50)
 
     if info:
-        logger.info('成功在当前目录生成ePub文件:)')
+        logger.info('成功打包%s个文件到%s:)', len(files), epub_file_path.name)
 
-    return Path(epub_file_path).absolute()
+    return epub_file_path.absolute()
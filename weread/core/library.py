@@ -0,0 +1,347 @@
+import json
+import os
+import sqlite3
+import sys
+
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Union
+from zipfile import BadZipFile, ZipFile
+
+from weread import logger
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS books (
+    rdata_path TEXT PRIMARY KEY,
+    rdata_mtime REAL NOT NULL,
+    book_id TEXT,
+    title TEXT,
+    author TEXT,
+    translator TEXT,
+    isbn TEXT,
+    publisher TEXT,
+    publish_time TEXT,
+    chapter_count INTEGER,
+    epub_path TEXT,
+    epub_mtime REAL
+);
+CREATE INDEX IF NOT EXISTS books_title ON books(title);
+CREATE INDEX IF NOT EXISTS books_author ON books(author);
+CREATE INDEX IF NOT EXISTS books_publisher ON books(publisher);
+CREATE INDEX IF NOT EXISTS books_isbn ON books(isbn);
+'''
+
+# 原始数据文件的后缀.
+_RDATA_SUFFIX = '.rdata.zip'
+
+_COLUMNS = ('rdata_path', 'rdata_mtime', 'book_id', 'title', 'author',
+            'translator', 'isbn', 'publisher', 'publish_time',
+            'chapter_count', 'epub_path', 'epub_mtime')
+
+
+class BookRecord(NamedTuple):
+    """图书目录中的单条记录.
+
+    Attributes:
+        rdata_path: str,
+            原始数据文件的绝对路径.
+        rdata_mtime: float,
+            原始数据文件的修改时间.
+        book_id: str,
+            图书ID.
+        title: str,
+            图书标题.
+        author: str,
+            图书作者.
+        translator: str or None,
+            图书译者.
+        isbn: str,
+            图书ISBN.
+        publisher: str,
+            图书出版社.
+        publish_time: str,
+            图书发行日期.
+        chapter_count: int,
+            章节数量.
+        epub_path: str or None,
+            ePub文件的绝对路径.
+        epub_mtime: float or None,
+            ePub文件的修改时间.
+    """
+    rdata_path: str
+    rdata_mtime: float
+    book_id: Optional[str]
+    title: Optional[str]
+    author: Optional[str]
+    translator: Optional[str]
+    isbn: Optional[str]
+    publisher: Optional[str]
+    publish_time: Optional[str]
+    chapter_count: Optional[int]
+    epub_path: Optional[str]
+    epub_mtime: Optional[float]
+
+
+def _default_output(rdata_file: Union[str, os.PathLike], suffix: str) -> Path:
+    """原始数据文件同目录下的同名输出文件, 只替换文件名的后缀, 不受目录名中的`.`影响.
+
+    Args:
+        rdata_file: str or os.PathLike,
+            原始数据文件.
+        suffix: str,
+            输出文件的后缀, 比如'.epub'.
+
+    Return:
+        输出文件的路径.
+    """
+    rdata_file = Path(rdata_file)
+    name = rdata_file.name
+    if name.endswith(_RDATA_SUFFIX):
+        name = name[:-len(_RDATA_SUFFIX)]
+    else:
+        name = name.split('.')[0]
+
+    return rdata_file.with_name(name + suffix)
+
+
+def _connect(catalog_file: Union[str, os.PathLike]) -> sqlite3.Connection:
+    """连接图书目录数据库, 并创建数据表.
+
+    Args:
+        catalog_file: str or os.PathLike,
+            图书目录文件.
+
+    Return:
+        图书目录数据库的连接.
+    """
+    connection = sqlite3.connect(catalog_file)
+    connection.executescript(_SCHEMA)
+
+    return connection
+
+
+def _read_book_record(rdata_file: Union[str, os.PathLike],
+                      epub_file: Optional[Union[str, os.PathLike]] = None
+                      ) -> Optional[Dict]:
+    """读取原始数据文件中`content.json`和`toc.json`的元数据.
+
+    Args:
+        rdata_file: str or os.PathLike,
+            原始数据文件.
+        epub_file: str or os.PathLike, default=None,
+            对应的ePub文件, 默认为原始数据文件同目录下的同名ePub文件.
+
+    Return:
+        图书目录的记录, 原始数据文件不合法时返回None.
+    """
+    rdata_file = Path(rdata_file).absolute()
+    try:
+        with ZipFile(rdata_file) as rdata:
+            book_info = json.loads(rdata.read('content.json'))
+            chapter_infos = json.loads(rdata.read('toc.json'))
+    except (BadZipFile, FileNotFoundError, KeyError, ValueError):
+        return None
+
+    if epub_file is None:
+        epub_file = _default_output(rdata_file, '.epub')
+    epub_file = Path(epub_file).absolute()
+
+    return {
+        'rdata_path': str(rdata_file),
+        'rdata_mtime': rdata_file.stat().st_mtime,
+        'book_id': book_info.get('bookId'),
+        'title': book_info.get('title'),
+        'author': book_info.get('author'),
+        'translator': book_info.get('translator'),
+        'isbn': book_info.get('isbn'),
+        'publisher': book_info.get('publisher'),
+        'publish_time': book_info.get('publishTime'),
+        'chapter_count': len(chapter_infos),
+        'epub_path': str(epub_file) if epub_file.exists() else None,
+        'epub_mtime': epub_file.stat().st_mtime if epub_file.exists() else None
+    }
+
+
+def _upsert(connection: sqlite3.Connection, record: Dict):
+    """新增或更新图书目录的记录.
+
+    Args:
+        connection: sqlite3.Connection,
+            图书目录数据库的连接.
+        record: dict,
+            图书目录的记录.
+    """
+    connection.execute(
+        f'INSERT OR REPLACE INTO books ({", ".join(_COLUMNS)}) '
+        f'VALUES ({", ".join("?" * len(_COLUMNS))})',
+        [record[column] for column in _COLUMNS]
+    )
+
+
+def update_catalog(catalog_file: Union[str, os.PathLike],
+                   rdata_file: Union[str, os.PathLike],
+                   epub_file: Optional[Union[str, os.PathLike]] = None):
+    """更新图书目录中单个原始数据文件的记录, `download`和`generate`完成后将调用.
+
+    Args:
+        catalog_file: str or os.PathLike,
+            图书目录文件.
+        rdata_file: str or os.PathLike,
+            原始数据文件.
+        epub_file: str or os.PathLike, default=None,
+            生成的ePub文件, 默认为原始数据文件同目录下的同名ePub文件.
+    """
+    record = _read_book_record(rdata_file, epub_file)
+    if record is None:
+        logger.warning('%s 不是一个合法的原始数据文件, 无法更新图书目录.', Path(rdata_file).name)
+        return
+
+    connection = _connect(catalog_file)
+    try:
+        with connection:
+            _upsert(connection, record)
+    finally:
+        connection.close()
+
+
+def scan_library(library: Union[str, os.PathLike],
+                 catalog_file: Union[str, os.PathLike] = 'weread-library.db',
+                 workers: Optional[int] = None,
+                 verbose: bool = False,
+                 info: bool = False) -> int:
+    """使用多进程扫描目录下的全部原始数据文件, 并更新图书目录.
+
+    原始数据文件没有修改过时不会重新读取; 已经不存在的原始数据文件将从图书目录中删除.
+    图书目录中记录的ePub文件(比如`generate`指定的`output`)仍然存在时保留该路径,
+    否则使用原始数据文件同目录下的同名ePub文件.
+
+    Args:
+        library: str or os.PathLike,
+            存放原始数据文件的目录, 将递归查找全部`.rdata.zip`文件.
+        catalog_file: str or os.PathLike, default='weread-library.db',
+            图书目录文件.
+        workers: int, default=None,
+            进程的数量, 默认为CPU的核心数.
+        verbose: bool, default=False,
+            是否展示扫描的详细信息.
+        info: bool, default=False,
+            是否输出提示信息.
+
+    Return:
+        更新的原始数据文件的数量.
+    """
+    library = Path(library)
+    if not library.is_dir():
+        logger.error('请检查你的目录路径, 未找到存放原始数据文件的目录!')
+        sys.exit(1)
+
+    connection = _connect(catalog_file)
+    try:
+        catalog = {
+            rdata_path: (rdata_mtime, epub_path, epub_mtime)
+            for rdata_path, rdata_mtime, epub_path, epub_mtime in
+            connection.execute('SELECT rdata_path, rdata_mtime, epub_path, '
+                               'epub_mtime FROM books')
+        }
+
+        # 筛选新增或修改过的原始数据文件和ePub文件.
+        rdata_files, epub_files = [], []
+        for rdata_file in sorted(library.rglob('*' + _RDATA_SUFFIX)):
+            rdata_file = rdata_file.absolute()
+            rdata_mtime, epub_path, epub_mtime = catalog.pop(str(rdata_file),
+                                                             (None,) * 3)
+            if epub_path and Path(epub_path).exists():
+                epub_file = Path(epub_path)
+            else:
+                epub_file = _default_output(rdata_file, '.epub')
+            mtimes = (rdata_file.stat().st_mtime,
+                      epub_file.stat().st_mtime if epub_file.exists() else None)  # noqa: E501
+            if (rdata_mtime, epub_mtime) != mtimes:
+                rdata_files.append(rdata_file)
+                epub_files.append(epub_file)
+
+        count = 0
+        with ProcessPoolExecutor(workers) as executor, connection:
+            for rdata_file, record in zip(rdata_files,
+                                          executor.map(_read_book_record,
+                                                       rdata_files,
+                                                       epub_files,
+                                                       chunksize=16)):
+                if record is None:
+                    logger.warning('%s 不是一个合法的原始数据文件!', rdata_file.name)
+                    continue
+                _upsert(connection, record)
+                count += 1
+                if verbose:
+                    logger.info('更新 %s 的记录.', rdata_file.name)
+
+            # 删除已经不存在的原始数据文件.
+            for rdata_path in catalog:
+                connection.execute('DELETE FROM books WHERE rdata_path = ?',
+                                   (rdata_path,))
+                if verbose:
+                    logger.info('删除 %s 的记录.', Path(rdata_path).name)
+    finally:
+        connection.close()
+
+    if verbose:
+        logger.info('-' * 50)
+
+    if info:
+        logger.info('成功扫描图书目录:) 更新%s本, 删除%s本.', count, len(catalog))
+
+    return count
+
+
+def query_library(catalog_file: Union[str, os.PathLike] = 'weread-library.db',
+                  title: Optional[str] = None,
+                  author: Optional[str] = None,
+                  publisher: Optional[str] = None,
+                  isbn: Optional[str] = None,
+                  stale: bool = False) -> List[BookRecord]:
+    """查询图书目录.
+
+    Args:
+        catalog_file: str or os.PathLike, default='weread-library.db',
+            图书目录文件.
+        title: str, default=None,
+            图书标题包含的文本.
+        author: str, default=None,
+            图书作者.
+        publisher: str, default=None,
+            图书出版社.
+        isbn: str, default=None,
+            图书ISBN.
+        stale: bool, default=False,
+            是否只查询ePub文件不存在或比原始数据文件旧的图书.
+
+    Return:
+        按照图书标题排序的记录.
+    """
+    if not Path(catalog_file).is_file():
+        logger.error('请检查你的图书目录文件路径, 未找到图书目录文件!')
+        sys.exit(1)
+
+    conditions, params = [], []
+    if title is not None:
+        conditions.append('title LIKE ?')
+        params.append(f'%{title}%')
+    for column, value in (('author', author),
+                          ('publisher', publisher),
+                          ('isbn', isbn)):
+        if value is not None:
+            conditions.append(f'{column} = ?')
+            params.append(value)
+    if stale:
+        conditions.append('(epub_mtime IS NULL OR epub_mtime < rdata_mtime)')
+
+    sql = f'SELECT {", ".join(_COLUMNS)} FROM books'
+    if conditions:
+        sql += ' WHERE ' + ' AND '.join(conditions)
+    sql += ' ORDER BY title, rdata_path'
+
+    connection = _connect(catalog_file)
+    try:
+        return [BookRecord(*row) for row in connection.execute(sql, params)]
+    finally:
+        connection.close()
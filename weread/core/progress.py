@@ -0,0 +1,338 @@
+import asyncio
+import time
+
+from collections import deque
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Generator,
+    Literal,
+    NamedTuple,
+    Optional,
+    Tuple,
+    TypeVar
+)
+
+T = TypeVar('T')
+
+EventKind = Literal['start', 'advance', 'end']
+
+
+class Progress(NamedTuple):
+    """单个步骤完成后的进度信息.
+
+    Attributes:
+        current: int,
+            已完成的步骤数.
+        total: int,
+            全部的步骤数.
+        filename: str,
+            当前步骤处理的文件名.
+    """
+    current: int
+    total: int
+    filename: str
+
+
+Steps = Generator[Progress, None, T]
+
+
+class ProgressEvent(NamedTuple):
+    """结构化的进度事件, 用于图形界面或服务展示进度.
+
+    Attributes:
+        stage: str,
+            阶段的名称, 比如'download'(逐章下载), 'images'(下载图片),
+             'check', 'deep-check'和'generate'.
+        kind: {'start', 'advance', 'end'},
+            事件的类型, 阶段开始, 完成一个步骤和阶段结束.
+        current: int,
+            已完成的步骤数.
+        total: int,
+            全部的步骤数.
+        name: str,
+            当前步骤处理的章节或文件名, 阶段开始和结束时为空字符串.
+        bytes: int,
+            阶段开始后累计写入或读取的字节数.
+        elapsed: float,
+            阶段开始后经过的时间(秒).
+        rate: float,
+            最近一段时间的吞吐量(步骤/秒).
+        byte_rate: float,
+            最近一段时间的吞吐量(字节/秒).
+        eta: float or None,
+            预计剩余的时间(秒), 无法估计时为None.
+    """
+    stage: str
+    kind: EventKind
+    current: int
+    total: int
+    name: str
+    bytes: int
+    elapsed: float
+    rate: float
+    byte_rate: float
+    eta: Optional[float]
+
+
+ProgressCallback = Callable[[ProgressEvent], None]
+
+
+class ProgressTracker(object):
+    """跟踪单个阶段的进度, 计算滚动吞吐量和预计剩余时间, 并调用进度回调.
+
+    Example:
+        ```python
+        tracker = ProgressTracker('images', print)
+        tracker.start(len(image_urls))
+        for image_url in image_urls:
+            tracker.advance(image_url, len(download(image_url)))
+        tracker.finish()
+        ```
+
+    Args:
+        stage: str,
+            阶段的名称.
+        callback: Callable, default=None,
+            进度回调, 参数为`ProgressEvent`; 为None时不做任何事情.
+        window: float, default=5,
+            计算滚动吞吐量使用的时间窗口(秒).
+        clock: Callable, default=time.monotonic,
+            获取当前时间的函数.
+    """
+    def __init__(self,
+                 stage: str,
+                 callback: Optional[ProgressCallback] = None,
+                 window: float = 5,
+                 clock: Callable[[], float] = time.monotonic):
+        self.stage = stage
+        self.callback = callback
+        self.window = window
+        self.current = 0
+        self.total = 0
+        self.bytes = 0
+        self.started = False
+        self._clock = clock
+        self._start_time = 0.0
+        self._samples: Deque[Tuple[float, int, int]] = deque()  # (时间, 步骤数, 字节数).  # noqa: E501
+
+    def start(self, total: int):
+        """开始阶段.
+
+        Args:
+            total: int,
+                全部的步骤数.
+        """
+        self.current = 0
+        self.total = total
+        self.bytes = 0
+        self.started = True
+        self._start_time = self._clock()
+        self._samples.clear()
+        self._samples.append((self._start_time, 0, 0))
+        self._emit('start', '')
+
+    def advance(self, name: str, nbytes: int = 0):
+        """完成一个步骤.
+
+        Args:
+            name: str,
+                当前步骤处理的章节或文件名.
+            nbytes: int, default=0,
+                当前步骤写入或读取的字节数.
+        """
+        self.current += 1
+        self.bytes += nbytes
+        now = self._clock()
+        self._samples.append((now, self.current, self.bytes))
+        # 只保留时间窗口内的采样, 至少保留两个采样用于计算吞吐量.
+        while len(self._samples) > 2 and now - self._samples[1][0] >= self.window:  # noqa: E501
+            self._samples.popleft()
+        self._emit('advance', name)
+
+    def finish(self):
+        """结束阶段."""
+        self._emit('end', '')
+        self.started = False
+
+    def _emit(self, kind: EventKind, name: str):
+        if self.callback is None:
+            return
+
+        now = self._clock()
+        first_time, first_current, first_bytes = self._samples[0]
+        duration = now - first_time
+        rate = (self.current - first_current) / duration if duration > 0 else 0.0  # noqa: E501
+        byte_rate = (self.bytes - first_bytes) / duration if duration > 0 else 0.0  # noqa: E501
+        if kind == 'end':
+            eta = 0.0
+        elif rate > 0:
+            eta = max(self.total - self.current, 0) / rate
+        else:
+            eta = None
+
+        self.callback(ProgressEvent(stage=self.stage,
+                                    kind=kind,
+                                    current=self.current,
+                                    total=self.total,
+                                    name=name,
+                                    bytes=self.bytes,
+                                    elapsed=now - self._start_time,
+                                    rate=rate,
+                                    byte_rate=byte_rate,
+                                    eta=eta))
+
+
+def track_steps(steps: Steps[T],
+                tracker: Optional[ProgressTracker],
+                written: Optional[Callable[[], int]] = None) -> Steps[T]:
+    """包装步骤生成器, 每个步骤完成后向进度跟踪器报告进度.
+
+    步骤生成器可以在执行第一个步骤前先产出`Progress(0, total, '')`声明全部的步骤数,
+    这样跟踪器在第一个步骤开始前就进入计时, 用时和吞吐量包含第一个步骤;
+    这个声明只用于开始跟踪, 不会产出给调用方.
+
+    Args:
+        steps: Generator,
+            待执行的步骤.
+        tracker: ProgressTracker or None,
+            进度跟踪器, 为None时只过滤步骤数的声明.
+        written: Callable, default=None,
+            返回累计写入字节数的函数, 用于计算每个步骤写入的字节数.
+
+    Return:
+        包装后的步骤生成器, 产出的进度信息与原来的步骤相同.
+    """
+    last_written = written() if written else 0
+    try:
+        while True:
+            try:
+                progress = next(steps)
+            except StopIteration as stop:
+                if tracker and tracker.started:
+                    tracker.finish()
+                return stop.value
+
+            if tracker is None:
+                if progress.current:
+                    yield progress
+                continue
+
+            if not tracker.started:
+                tracker.start(progress.total)
+                if not progress.current:  # 步骤数的声明, 开始跟踪后继续执行第一个步骤.
+                    continue
+            nbytes = 0
+            if written:
+                total_written = written()
+                nbytes, last_written = total_written - last_written, total_written  # noqa: E501
+            tracker.advance(progress.filename, nbytes)
+            yield progress
+    finally:
+        steps.close()
+
+
+class AsyncProgress(object):
+    """异步进度迭代器, 用于在协程中逐个获取进度信息.
+
+    Example:
+        ```python
+        progress = AsyncProgress()
+        task = asyncio.create_task(agenerate(rdata_file, progress=progress))
+        async for current, total, filename in progress:
+            print(f'{current}/{total} {filename}')
+        build = await task
+        ```
+    """
+    def __init__(self):
+        self._queue = asyncio.Queue()
+
+    def put(self, progress: Progress):
+        """添加新的进度信息.
+
+        Args:
+            progress: Progress,
+                进度信息.
+        """
+        self._queue.put_nowait(progress)
+
+    def close(self):
+        """结束迭代."""
+        self._queue.put_nowait(None)
+
+    def __aiter__(self) -> 'AsyncProgress':
+        return self
+
+    async def __anext__(self) -> Progress:
+        progress = await self._queue.get()
+        if progress is None:
+            raise StopAsyncIteration
+
+        return progress
+
+
+def _advance(steps: Steps) -> Tuple[bool, Any]:
+    """执行一个步骤.
+
+    Args:
+        steps: Generator,
+            待执行的步骤.
+
+    Return:
+        是否全部执行完成, 和当前步骤的进度信息(全部执行完成时为返回值).
+    """
+    try:
+        return False, next(steps)
+    except StopIteration as stop:  # StopIteration无法传递给Future, 这里需要转换.
+        return True, stop.value
+
+
+def run_steps(steps: Steps[T]) -> T:
+    """同步执行全部的步骤.
+
+    Args:
+        steps: Generator,
+            待执行的步骤.
+
+    Return:
+        步骤的返回值.
+    """
+    while True:
+        finished, value = _advance(steps)
+        if finished:
+            return value
+
+
+async def arun_steps(steps: Steps[T],
+                     progress: Optional[AsyncProgress] = None) -> T:
+    """在执行器中逐个执行步骤, 不阻塞事件循环.
+
+    取消时会等待正在执行的步骤完成, 再关闭步骤生成器进行清理.
+
+    Args:
+        steps: Generator,
+            待执行的步骤.
+        progress: AsyncProgress, default=None,
+            异步进度迭代器.
+
+    Return:
+        步骤的返回值.
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            future = loop.run_in_executor(None, _advance, steps)
+            try:
+                finished, value = await asyncio.shield(future)
+            except asyncio.CancelledError:
+                await asyncio.wait([future])  # 避免清理时步骤仍在线程中执行.
+                raise
+            if finished:
+                return value
+            if progress:
+                progress.put(value)
+    finally:
+        steps.close()
+        if progress:
+            progress.close()
@@ -0,0 +1,118 @@
+import asyncio
+import random
+import time
+
+from typing import Callable
+
+
+class RateLimiter(object):
+    """自适应的令牌桶限速器, 用于控制切换章节和下载图片的速率.
+
+    每次请求前取出一个令牌, 令牌不足时等待并加入随机抖动(模拟人类操作);
+    请求完成后根据响应延迟和是否出错调整速率(AIMD):
+    响应正常时速率线性增加, 响应变慢或出错(比如被限流)时速率成倍降低.
+
+    Example:
+        ```python
+        rate_limiter = RateLimiter(rate=0.5, max_rate=1)
+        await download('怦然心动', rate_limiter=rate_limiter)
+        print(rate_limiter.rate)
+        ```
+
+    Args:
+        rate: float, default=0.5,
+            初始速率(次/秒).
+        min_rate: float, default=0.05,
+            最低速率(次/秒).
+        max_rate: float, default=1,
+            最高速率(次/秒).
+        burst: int, default=1,
+            令牌桶的容量, 即允许连续发出的请求数量.
+        jitter: float, default=0.2,
+            随机抖动占请求间隔的最大比例.
+        target_latency: float, default=2,
+            目标响应延迟(秒), 超过时视为服务器压力升高并降低速率.
+        increase: float, default=0.05,
+            每次响应正常时增加的速率(次/秒).
+        decrease: float, default=0.5,
+            每次响应变慢或出错时速率乘以的系数.
+        clock: Callable, default=time.monotonic,
+            获取当前时间的函数.
+    """
+    def __init__(self,
+                 rate: float = 0.5,
+                 min_rate: float = 0.05,
+                 max_rate: float = 1,
+                 burst: int = 1,
+                 jitter: float = 0.2,
+                 target_latency: float = 2,
+                 increase: float = 0.05,
+                 decrease: float = 0.5,
+                 clock: Callable[[], float] = time.monotonic):
+        if not 0 < min_rate <= max_rate:
+            raise ValueError('速率的范围不合法.')
+
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self.jitter = jitter
+        self.target_latency = target_latency
+        self.increase = increase
+        self.decrease = decrease
+        self.successes = 0
+        self.failures = 0
+        self._rate = min(max(rate, min_rate), max_rate)
+        self._clock = clock
+        self._tokens = float(burst)
+        self._updated = clock()
+
+    @property
+    def rate(self) -> float:
+        """当前速率(次/秒)."""
+        return self._rate
+
+    def reserve(self) -> float:
+        """取出一个令牌.
+
+        Return:
+            发出请求前需要等待的时间(秒).
+        """
+        now = self._clock()
+        self._tokens = min(self.burst,
+                           self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+        self._tokens -= 1  # 令牌不足时记为欠账, 之后的请求需要等待更久.
+
+        wait_time = max(-self._tokens, 0) / self._rate
+        if self.jitter:
+            wait_time += random.uniform(0, self.jitter) / self._rate
+
+        return wait_time
+
+    def acquire(self):
+        """等待直到可以发出请求."""
+        time.sleep(self.reserve())
+
+    async def aacquire(self):
+        """等待直到可以发出请求(异步版本)."""
+        await asyncio.sleep(self.reserve())
+
+    def record(self, latency: float, ok: bool = True):
+        """根据请求的结果调整速率.
+
+        Args:
+            latency: float,
+                请求的响应延迟(秒).
+            ok: bool, default=True,
+                请求是否成功, 被限流或服务器错误时应为False.
+        """
+        if ok:
+            self.successes += 1
+        else:
+            self.failures += 1
+
+        if ok and latency <= self.target_latency:
+            self._rate = min(self._rate + self.increase, self.max_rate)
+        else:
+            self._rate = max(self._rate * self.decrease, self.min_rate)
+            self._tokens = min(self._tokens, 0)  # 降速后不再允许连续请求.
@@ -0,0 +1,251 @@
+import json
+import os
+import shutil
+import sys
+
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Set, Union
+from zipfile import BadZipFile, ZIP_DEFLATED, ZIP_STORED, ZipFile, ZipInfo
+
+from weread import logger
+from weread.core.check import _chapter_images
+from weread.core.generate import (
+    _COPY_BUFFER_SIZE,
+    _EpubFile,
+    _natural_key,
+    _sort_files
+)
+
+# 已经压缩过的媒体文件, 重新打包时不再压缩.
+_MEDIA_SUFFIXES = ('.jpg', '.jpeg', '.png', '.gif', '.webp',
+                   '.mp3', '.m4a', '.mp4', '.woff', '.woff2')
+# `generate`最先读取的文件, 排在原始数据文件的开头.
+_HEAD_FILES = ('content.json', 'toc.json')
+
+
+class RepackResult(NamedTuple):
+    """重新打包的结果.
+
+    Attributes:
+        path: Path,
+            重新打包后的原始数据文件的绝对路径.
+        duplicates: int,
+            删除的重复文件的数量.
+        orphans: list of str,
+            删除的没有被任何章节引用的图片.
+        original_size: int,
+            重新打包前的文件大小(字节).
+        size: int,
+            重新打包后的文件大小(字节).
+        skipped: bool,
+            原始数据文件是否已经是紧凑的, 因而跳过重新打包.
+    """
+    path: Path
+    duplicates: int
+    orphans: List[str]
+    original_size: int
+    size: int
+    skipped: bool
+
+
+def _compress_type(filename: str) -> int:
+    """媒体文件不压缩直接存储, 其余文件使用DEFLATE压缩."""
+    if filename.lower().endswith(_MEDIA_SUFFIXES):
+        return ZIP_STORED
+
+    return ZIP_DEFLATED
+
+
+def _referenced_images(rdata: ZipFile, files: Dict[str, ZipInfo]) -> Set[str]:
+    """使用与`check`相同的规则收集全部章节引用的图片, 封面总是被引用.
+
+    Args:
+        rdata: ZipFile,
+            原始数据文件的文件指针.
+        files: dict,
+            文件名和保留的(最后一个同名)文件.
+
+    Return:
+        被引用的图片在原始数据文件中的路径组成的集合.
+    """
+    images = {'Images/coverpage.jpg'}
+    for filename, file in files.items():
+        if filename.startswith('Text/'):
+            images.update(_chapter_images(rdata.read(file)))
+
+    return images
+
+
+def repack(rdata_file: Union[str, os.PathLike],
+           output: Optional[Union[str, os.PathLike]] = None,
+           verbose: bool = False,
+           info: bool = False) -> RepackResult:
+    """压缩整理原始数据文件.
+
+    多次追加和重试下载可能在原始数据文件中留下同名的文件和不再被任何章节引用的图片.
+    重新打包时只保留每个文件的最后一个版本, 删除没有被引用的图片(与`check`的规则相同);
+    图片等媒体文件不压缩直接存储, 并按照`generate`读取的顺序排列文件.
+    压缩方式不变的文件直接复制压缩后的数据, 每个文件只读取一次.
+    原始数据文件已经是紧凑的时跳过; 先写入`.part`临时文件再重命名.
+
+    Example:
+        ```python
+        repack('怦然心动.rdata.zip', verbose=True)
+        ```
+
+    Args:
+        rdata_file: str or os.PathLike,
+            原始数据文件.
+        output: str or os.PathLike, default=None,
+            重新打包后的保存路径, 默认覆盖原始数据文件.
+        verbose: bool, default=False,
+            是否展示重新打包的详细信息.
+        info: bool, default=False,
+            是否输出提示信息.
+
+    Return:
+        包含路径, 删除的文件和文件大小的`RepackResult`.
+    """
+    rdata_file_path = Path(rdata_file)
+    output_path = rdata_file_path if output is None else Path(output)
+    try:
+        rdata = ZipFile(rdata_file_path)
+    except BadZipFile:
+        logger.error('%s 不是一个合法的原始数据文件!', rdata_file_path.name)
+        sys.exit(1)
+    except FileNotFoundError:
+        logger.error('请检查你的原始数据文件路径, 未找到原始数据文件!')
+        sys.exit(1)
+
+    with rdata:
+        file_list = rdata.infolist()
+        files = {file.filename: file for file in file_list}  # 保留最后一个同名文件.
+        images = _referenced_images(rdata, files)
+        orphans = {filename for filename in files
+                   if filename.startswith('Images/') and
+                   filename not in images}
+        # 按照`generate`读取的顺序排列: 先是content.json和toc.json, 章节按照toc.json的顺序.
+        try:
+            chapter_infos = json.loads(rdata.read(files['toc.json']))
+        except (KeyError, ValueError):
+            chapter_infos = []
+        kept = [files[filename] for filename in _HEAD_FILES
+                if filename in files]
+        kept += _sort_files([file for filename, file in files.items()
+                             if filename not in orphans and
+                             filename not in _HEAD_FILES],
+                            chapter_infos)
+        orphans = sorted(orphans, key=_natural_key)
+        duplicates = len(file_list) - len(files)
+        original_size = rdata_file_path.stat().st_size
+
+        # 已经是紧凑的原始数据文件, 不需要重新打包.
+        if (kept == file_list and output_path == rdata_file_path and
+                all(file.compress_type == _compress_type(file.filename)
+                    for file in kept)):
+            if verbose:
+                logger.info('%s 已经是紧凑的, 跳过重新打包.', rdata_file_path.name)
+            if info:
+                logger.info('原始数据文件不需要重新打包:)')
+            return RepackResult(rdata_file_path.absolute(), 0, [],
+                                original_size, original_size, True)
+
+        if verbose:
+            for filename in orphans:
+                logger.info('删除没有被引用的 %s.', filename)
+
+        part_file_path = output_path.with_name(output_path.name + '.part')
+        completed = False
+        try:
+            with _EpubFile(part_file_path) as packed:
+                for file in kept:
+                    compress_type = _compress_type(file.filename)
+                    if file.compress_type == compress_type:
+                        packed.copyraw(rdata, file)
+                    else:
+                        zinfo = ZipInfo(file.filename, file.date_time)
+                        zinfo.external_attr = file.external_attr
+                        zinfo.compress_type = compress_type
+                        zinfo.file_size = file.file_size
+                        with rdata.open(file) as src, \
+                                packed.open(zinfo, 'w') as dst:
+                            shutil.copyfileobj(src, dst, _COPY_BUFFER_SIZE)
+                    if verbose:
+                        logger.info('写入 %s.', file.filename)
+            os.replace(part_file_path, output_path)
+            completed = True
+        finally:
+            if not completed and part_file_path.exists():
+                part_file_path.unlink()
+
+    size = output_path.stat().st_size
+    if verbose:
+        logger.info('-' * 50)
+
+    if info:
+        logger.info('成功重新打包原始数据文件:) 删除%s个重复文件和%s张没有被引用的图片, %s字节减少到%s字节.',
+                    duplicates, len(orphans), original_size, size)
+
+    return RepackResult(output_path.absolute(), duplicates, orphans,
+                        original_size, size, False)
+
+
+def _repack_worker(rdata_file: Path) -> Optional[RepackResult]:
+    """在子进程中重新打包单个原始数据文件, 失败时返回None而不是中断整批重新打包."""
+    try:
+        return repack(rdata_file)
+    except (Exception, SystemExit):
+        return None
+
+
+def repack_many(paths: List[Union[str, os.PathLike]],
+                workers: Optional[int] = None,
+                verbose: bool = False,
+                info: bool = False) -> List[RepackResult]:
+    """使用多进程批量重新打包原始数据文件.
+
+    Args:
+        paths: list of str or os.PathLike,
+            原始数据文件或存放原始数据文件的目录组成的列表,
+             目录将递归查找全部`.rdata.zip`文件.
+        workers: int, default=None,
+            进程的数量, 默认为CPU的核心数.
+        verbose: bool, default=False,
+            是否展示重新打包的详细信息.
+        info: bool, default=False,
+            是否输出提示信息.
+
+    Return:
+        成功重新打包(或跳过)的原始数据文件的`RepackResult`组成的列表.
+    """
+    rdata_files = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            rdata_files.extend(sorted(path.rglob('*.rdata.zip')))
+        else:
+            rdata_files.append(path)
+
+    results = []
+    with ProcessPoolExecutor(workers) as executor:
+        for rdata_file, result in zip(rdata_files,
+                                      executor.map(_repack_worker,
+                                                   rdata_files)):
+            if result is None:
+                logger.warning('%s 重新打包失败!', rdata_file.name)
+                continue
+            results.append(result)
+            if verbose and result.skipped:
+                logger.info('%s 已经是紧凑的, 跳过重新打包.', rdata_file.name)
+            elif verbose:
+                logger.info('重新打包 %s, %s字节减少到%s字节.',
+                            rdata_file.name, result.original_size, result.size)
+
+    if verbose:
+        logger.info('-' * 50)
+
+    if info:
+        saved = sum(result.original_size - result.size for result in results)
+        logger.info('成功重新打包%s个原始数据文件:) 共减少%s字节.', len(results), saved)
+
+    return results
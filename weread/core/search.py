@@ -0,0 +1,275 @@
+import os
+import sqlite3
+import sys
+import zlib
+
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Set, Union
+from zipfile import BadZipFile
+
+from weread import logger
+from weread.core.chapters import _html_text, _iter_rdata_html
+from weread.core.generate import _open_rdata
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS books (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS chapters (
+    id INTEGER PRIMARY KEY,
+    book_id INTEGER NOT NULL REFERENCES books(id) ON DELETE CASCADE,
+    idx INTEGER NOT NULL,
+    uid INTEGER NOT NULL,
+    title TEXT NOT NULL,
+    text BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS chapters_book_id ON chapters(book_id);
+CREATE TABLE IF NOT EXISTS postings (
+    gram TEXT NOT NULL,
+    chapter_id INTEGER NOT NULL REFERENCES chapters(id) ON DELETE CASCADE,
+    PRIMARY KEY (gram, chapter_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_chapter_id ON postings(chapter_id);
+'''
+
+
+class SearchResult(NamedTuple):
+    """单条搜索结果.
+
+    Attributes:
+        book: str,
+            原始数据文件的绝对路径.
+        chapter_uid: int,
+            章节的uid.
+        chapter_title: str,
+            章节的标题.
+        offset: int,
+            匹配位置在章节纯文本中的偏移量(字符数).
+        snippet: str,
+            匹配位置附近的文本.
+    """
+    book: str
+    chapter_uid: int
+    chapter_title: str
+    offset: int
+    snippet: str
+
+
+def _ngrams(text: str) -> Set[str]:
+    """将文本切分成2-gram, 用于支持没有空格分词的中文.
+
+    Args:
+        text: str,
+            需要切分的文本.
+
+    Return:
+        2-gram组成的集合.
+    """
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+def _connect(index_file: Union[str, os.PathLike]) -> sqlite3.Connection:
+    """连接索引数据库, 并创建数据表.
+
+    Args:
+        index_file: str or os.PathLike,
+            索引文件.
+
+    Return:
+        索引数据库的连接.
+    """
+    connection = sqlite3.connect(index_file)
+    connection.execute('PRAGMA foreign_keys = ON')
+    connection.executescript(_SCHEMA)
+
+    return connection
+
+
+def _index_book(connection: sqlite3.Connection,
+                rdata_file: Path,
+                stat: os.stat_result):
+    """索引单个原始数据文件的全部章节.
+
+    Args:
+        connection: sqlite3.Connection,
+            索引数据库的连接.
+        rdata_file: Path,
+            原始数据文件的绝对路径.
+        stat: os.stat_result,
+            原始数据文件的状态信息.
+
+    Raises:
+        BadZipFile, zlib.error: 原始数据文件或其中的章节已损坏.
+        KeyError: 没有找到content.json或toc.json.
+        ValueError: content.json或toc.json不是合法的JSON.
+    """
+    connection.execute('DELETE FROM books WHERE path = ?', (str(rdata_file),))
+    book_id = connection.execute(
+        'INSERT INTO books (path, mtime_ns, size) VALUES (?, ?, ?)',
+        (str(rdata_file), stat.st_mtime_ns, stat.st_size)
+    ).lastrowid
+
+    # 与`iter_chapters(mode='text')`相同, 但读取失败时抛出异常而不是退出.
+    rdata, file_list, _, chapter_infos = _open_rdata(rdata_file)
+    for i, chapter_info, html in _iter_rdata_html(rdata,
+                                                  file_list,
+                                                  chapter_infos):
+        text = _html_text(html)
+        chapter_id = connection.execute(
+            'INSERT INTO chapters (book_id, idx, uid, title, text) '
+            'VALUES (?, ?, ?, ?, ?)',
+            (book_id,
+             i,
+             chapter_info['chapterUid'],
+             chapter_info['title'],
+             zlib.compress(text.encode()))
+        ).lastrowid
+        connection.executemany(
+            'INSERT INTO postings (gram, chapter_id) VALUES (?, ?)',
+            # 末尾添加换行符, 保证每个字符都是至少一个2-gram的开头.
+            ((gram, chapter_id) for gram in _ngrams(text + '\n'))
+        )
+
+
+def build_index(library: Union[str, os.PathLike],
+                index_file: Union[str, os.PathLike] = 'weread-index.db',
+                verbose: bool = False,
+                info: bool = False) -> Dict[str, int]:
+    """为目录下的全部原始数据文件建立全文搜索索引.
+
+    索引是增量更新的: 只会重新索引新增或修改过(修改时间或大小变化)的原始数据文件,
+    并删除已经不存在的原始数据文件的索引. 损坏的原始数据文件将被跳过, 下次建立索引时重试.
+
+    Args:
+        library: str or os.PathLike,
+            存放原始数据文件的目录, 将递归查找全部`.rdata.zip`文件.
+        index_file: str or os.PathLike, default='weread-index.db',
+            索引文件.
+        verbose: bool, default=False,
+            是否展示建立索引的详细信息.
+        info: bool, default=False,
+            是否输出提示信息.
+
+    Return:
+        新增或更新, 跳过和删除的原始数据文件的数量.
+    """
+    library = Path(library)
+    if not library.is_dir():
+        logger.error('请检查你的目录路径, 未找到存放原始数据文件的目录!')
+        sys.exit(1)
+
+    stats = {'indexed': 0, 'skipped': 0, 'removed': 0}
+    connection = _connect(index_file)
+    try:
+        indexed_books = {
+            path: (mtime_ns, size) for path, mtime_ns, size in
+            connection.execute('SELECT path, mtime_ns, size FROM books')
+        }
+
+        rdata_files = sorted(library.rglob('*.rdata.zip'))
+        for rdata_file in rdata_files:
+            rdata_file = rdata_file.absolute()
+            stat = rdata_file.stat()
+            if (indexed_books.pop(str(rdata_file), None) ==
+                    (stat.st_mtime_ns, stat.st_size)):
+                stats['skipped'] += 1
+                continue
+
+            # 每本书一个事务; 损坏的原始数据文件回滚并跳过, 不中断整个索引.
+            try:
+                with connection:
+                    _index_book(connection, rdata_file, stat)
+            except (BadZipFile, KeyError, ValueError, zlib.error) as err:
+                logger.warning('%s 已损坏, 跳过索引: %s', rdata_file.name, err)
+                continue
+            stats['indexed'] += 1
+            if verbose:
+                logger.info('索引 %s 完成.', rdata_file.name)
+
+        # 删除已经不存在的原始数据文件.
+        with connection:
+            for path in indexed_books:
+                connection.execute('DELETE FROM books WHERE path = ?', (path,))
+                stats['removed'] += 1
+                if verbose:
+                    logger.info('删除 %s 的索引.', Path(path).name)
+    finally:
+        connection.close()
+
+    if verbose:
+        logger.info('-' * 50)
+
+    if info:
+        logger.info('成功建立索引:) 新增或更新%s本, 跳过%s本, 删除%s本.',
+                    stats['indexed'], stats['skipped'], stats['removed'])
+
+    return stats
+
+
+def search(query: str,
+           index_file: Union[str, os.PathLike] = 'weread-index.db',
+           limit: int = 20) -> List[SearchResult]:
+    """在全文搜索索引中查找文本.
+
+    先通过2-gram倒排索引筛选出候选章节, 再在候选章节的纯文本中确认匹配位置.
+
+    Args:
+        query: str,
+            需要查找的文本.
+        index_file: str or os.PathLike, default='weread-index.db',
+            索引文件.
+        limit: int, default=20,
+            最多返回的搜索结果数量.
+
+    Return:
+        按照原始数据文件, 章节顺序和偏移量排序的搜索结果.
+    """
+    if not Path(index_file).is_file():
+        logger.error('请检查你的索引文件路径, 未找到索引文件!')
+        sys.exit(1)
+    if not query:
+        return []
+
+    connection = _connect(index_file)
+    try:
+        if len(query) == 1:
+            # 单个字符的查询, 查找以该字符开头的全部2-gram.
+            candidates = ('SELECT chapter_id FROM postings '
+                          'WHERE gram >= ? AND gram < ?')
+            params = (query, chr(ord(query) + 1))
+        else:
+            grams = _ngrams(query)
+            candidates = ('SELECT chapter_id FROM postings '
+                          f'WHERE gram IN ({", ".join("?" * len(grams))}) '
+                          'GROUP BY chapter_id HAVING COUNT(*) = ?')
+            params = (*grams, len(grams))
+
+        chapters = connection.execute(
+            'SELECT books.path, chapters.uid, chapters.title, chapters.text '
+            'FROM chapters JOIN books ON chapters.book_id = books.id '
+            f'WHERE chapters.id IN ({candidates}) '
+            'ORDER BY books.path, chapters.idx',
+            params
+        )
+
+        results = []
+        for path, uid, title, text in chapters:
+            text = zlib.decompress(text).decode()
+            offset = text.find(query)
+            while offset != -1:
+                snippet = text[max(offset - 20, 0):offset + len(query) + 20]
+                results.append(SearchResult(book=path,
+                                            chapter_uid=uid,
+                                            chapter_title=title,
+                                            offset=offset,
+                                            snippet=snippet.replace('\n', ' ')))  # noqa: E501
+                if len(results) >= limit:
+                    return results
+                offset = text.find(query, offset + 1)
+    finally:
+        connection.close()
+
+    return results
@@ -0,0 +1,280 @@
+import hashlib
+import os
+import re
+import sqlite3
+
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple, Union
+
+import soupsieve
+from bs4 import BeautifulSoup
+
+from weread import __version__
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS matches (
+    chapter TEXT NOT NULL,
+    selector TEXT NOT NULL,
+    matched INTEGER NOT NULL,
+    PRIMARY KEY (chapter, selector)
+) WITHOUT ROWID;
+'''
+
+# 样式表的词法单元: 注释, 字符串, 花括号, 分号和其余的文本.
+_TOKEN = re.compile(r'''/\*.*?(?:\*/|$)|"(?:\\.|[^"\\])*"?|'(?:\\.|[^'\\])*'?|[{};]|[^{};"'/]+|/''', re.S)  # noqa: E501
+_STRING = re.compile(r'''("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')''')
+# 包含规则列表的@规则, 内部的规则同样会被清理.
+_NESTED_AT_RULES = ('@media', '@supports', '@document', '@-moz-document')
+# 匹配时忽略的伪元素和动态伪类, 它们不影响元素本身是否存在.
+_IGNORED_PSEUDO = re.compile(r'::[\w-]+(?:\([^)]*\))?|:(?:before|after|first-line|first-letter|hover|active|focus|focus-within|focus-visible|visited|target)\b')  # noqa: E501
+
+
+class _Rule(NamedTuple):
+    """普通的样式规则, 选择器已经拆分并压缩."""
+    selectors: List[str]
+    body: str
+
+
+class _AtRule(NamedTuple):
+    """@规则; `block`为None时是语句(比如`@import`), 为列表时是嵌套的规则."""
+    prelude: str
+    block: Union[None, str, List[Union[_Rule, '_AtRule']]]
+
+
+def _collapse(text: str, punctuation: str) -> str:
+    """压缩字符串之外的空白字符, 并删除标点符号两侧的空白字符.
+
+    Args:
+        text: str,
+            样式表的片段.
+        punctuation: str,
+            可以删除两侧空白字符的标点符号.
+
+    Return:
+        压缩后的文本.
+    """
+    parts = _STRING.split(text)
+    for i in range(0, len(parts), 2):  # 奇数位置是字符串, 保持不变.
+        part = re.sub(r'\s+', ' ', parts[i])
+        parts[i] = re.sub(rf'\s*([{re.escape(punctuation)}])\s*', r'\1', part)
+
+    return ''.join(parts).strip()
+
+
+def _split_selectors(prelude: str) -> List[str]:
+    """按照括号和字符串之外的逗号拆分选择器列表, 并去除重复的选择器."""
+    selectors, depth, start = [], 0, 0
+    for match in re.finditer(r'''"(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*'|[()\[\],]''', prelude):  # noqa: E501
+        char = match.group()
+        if char in '([':
+            depth += 1
+        elif char in ')]':
+            depth -= 1
+        elif char == ',' and depth == 0:
+            selectors.append(prelude[start:match.start()])
+            start = match.end()
+    selectors.append(prelude[start:])
+
+    selectors = [_collapse(selector, '>+~') for selector in selectors]
+
+    return list(dict.fromkeys(selector for selector in selectors if selector))
+
+
+def _minify_body(body: str) -> str:
+    """压缩声明块, 删除多余的分号."""
+    return re.sub(r';{2,}', ';', _collapse(body, ':;,{}')).strip(';')
+
+
+def _parse(tokens: List[str], pos: int = 0) -> Tuple[List, int]:
+    """解析样式规则的列表, 直到遇到不匹配的右花括号或结束.
+
+    Args:
+        tokens: list of str,
+            去除注释后的词法单元.
+        pos: int, default=0,
+            开始解析的位置.
+
+    Return:
+        规则组成的列表和解析结束的位置.
+    """
+    nodes, buffer = [], []
+    while pos < len(tokens):
+        token = tokens[pos]
+        pos += 1
+        if token == '{':
+            prelude = ''.join(buffer).strip()
+            buffer = []
+            if prelude.lower().startswith(_NESTED_AT_RULES):
+                block, pos = _parse(tokens, pos)
+                nodes.append(_AtRule(_collapse(prelude, ':,'), block))
+                continue
+
+            # 读取到匹配的右花括号为止(@font-face, @keyframes等原样保留).
+            depth, start = 1, pos
+            while pos < len(tokens) and depth:
+                depth += {'{': 1, '}': -1}.get(tokens[pos], 0)
+                pos += 1
+            body = ''.join(tokens[start:pos - 1 if not depth else pos])
+            if prelude.startswith('@'):
+                nodes.append(_AtRule(_collapse(prelude, ':,'), body))
+            elif prelude:
+                nodes.append(_Rule(_split_selectors(prelude), body))
+        elif token == '}':
+            return nodes, pos
+        elif token == ';' and ''.join(buffer).lstrip().startswith('@'):
+            nodes.append(_AtRule(_collapse(''.join(buffer), ':,'), None))
+            buffer = []
+        else:
+            buffer.append(token)  # 选择器中的分号属于选择器, 与浏览器的解析一致.
+
+    return nodes, pos
+
+
+def _parse_css(css: str) -> List[Union[_Rule, _AtRule]]:
+    """将样式表解析成规则的列表, 注释将被删除."""
+    tokens = [token for token in _TOKEN.findall(css)
+              if not token.startswith('/*')]
+    nodes, pos = _parse(tokens)
+    while pos < len(tokens):  # 多余的右花括号, 跳过后继续解析.
+        more, pos = _parse(tokens, pos)
+        nodes.extend(more)
+
+    return nodes
+
+
+def _iter_selectors(nodes: List[Union[_Rule, _AtRule]]):
+    for node in nodes:
+        if isinstance(node, _Rule):
+            yield from node.selectors
+        elif isinstance(node.block, list):
+            yield from _iter_selectors(node.block)
+
+
+class _StyleOptimizer(object):
+    """清理样式表中没有被任何章节使用的规则, 并压缩剩余的规则.
+
+    选择器在生成的章节xhtml上匹配, 每个选择器只要匹配到一个章节就不再继续匹配;
+    匹配的结果按照章节内容的摘要缓存在SQLite数据库中, 重新生成时可以直接复用.
+    无法解析的选择器和@规则(比如`@font-face`)将被保留.
+
+    Args:
+        stylesheets: dict,
+            样式表的文件名和内容.
+        cache_file: str or os.PathLike, default=None,
+            匹配结果的缓存文件, 默认只在内存中缓存.
+    """
+    def __init__(self,
+                 stylesheets: Dict[str, bytes],
+                 cache_file: Optional[Union[str, os.PathLike]] = None):
+        self.cache_file = cache_file
+        self.sizes: Dict[str, int] = {}
+        self._stylesheets: Dict[str, List] = {}
+        self._patterns: Dict[str, Optional[soupsieve.SoupSieve]] = {}
+        self._used: Set[str] = set()
+        self._connection: Optional[sqlite3.Connection] = None
+
+        for name, css in stylesheets.items():
+            try:
+                self._stylesheets[name] = _parse_css(css.decode('utf-8'))
+            except UnicodeDecodeError:
+                continue  # 无法解码的样式表原样复制.
+            self.sizes[name] = len(css)
+            for selector in _iter_selectors(self._stylesheets[name]):
+                if selector not in self._patterns:
+                    self._patterns[selector] = self._compile(selector)
+
+        # 无法匹配的选择器视为已经使用.
+        self._used.update(selector
+                          for selector, pattern in self._patterns.items()
+                          if pattern is None)
+
+    @staticmethod
+    def _compile(selector: str) -> Optional[soupsieve.SoupSieve]:
+        selector = _IGNORED_PSEUDO.sub('', selector).strip()
+        if not selector or selector.endswith(('>', '+', '~')):
+            return None
+        try:
+            return soupsieve.compile(selector)
+        except (soupsieve.SelectorSyntaxError, NotImplementedError):
+            return None
+
+    def _cache(self) -> sqlite3.Connection:
+        if self._connection is None:
+            # 异步生成时每个步骤可能运行在执行器的不同线程中, 但不会同时访问.
+            self._connection = sqlite3.connect(self.cache_file or ':memory:',
+                                               check_same_thread=False)
+            self._connection.executescript(_SCHEMA)
+
+        return self._connection
+
+    def match(self, chapter_html: bytes, xhtml: BeautifulSoup):
+        """在一个章节上匹配还没有被使用的选择器.
+
+        Args:
+            chapter_html: bytes,
+                原始章节数据的html, 用于计算缓存的键.
+            xhtml: BeautifulSoup,
+                生成的章节xhtml.
+        """
+        pending = [selector for selector in self._patterns
+                   if selector not in self._used]
+        if not pending:
+            return
+
+        key = hashlib.sha256(f'weread {__version__}\n'.encode() +
+                             chapter_html).hexdigest()
+        connection = self._cache()
+        cached = dict(connection.execute(
+            'SELECT selector, matched FROM matches WHERE chapter = ?', (key,)
+        ))
+        rows = []
+        for selector in pending:
+            matched = cached.get(selector)
+            if matched is None:
+                matched = self._patterns[selector].select_one(xhtml) is not None  # noqa: E501
+                rows.append((key, selector, matched))
+            if matched:
+                self._used.add(selector)
+        connection.executemany('INSERT OR REPLACE INTO matches VALUES (?, ?, ?)', rows)  # noqa: E501
+
+    def _render(self, nodes: List[Union[_Rule, _AtRule]]) -> str:
+        parts = []
+        for node in nodes:
+            if isinstance(node, _Rule):
+                selectors = [selector for selector in node.selectors
+                             if selector in self._used]
+                body = _minify_body(node.body)
+                if selectors and body:
+                    parts.append(','.join(selectors) + '{' + body + '}')
+            elif node.block is None:
+                parts.append(node.prelude + ';')
+            elif isinstance(node.block, list):
+                block = self._render(node.block)
+                if block:
+                    parts.append(node.prelude + '{' + block + '}')
+            else:
+                parts.append(node.prelude + '{' + _minify_body(node.block) + '}')  # noqa: E501
+
+        # 完全相同的规则只保留最后一个, 层叠的结果不变.
+        seen = set()
+        for i in range(len(parts) - 1, -1, -1):
+            if parts[i] in seen:
+                parts[i] = ''
+            seen.add(parts[i])
+
+        return ''.join(parts)
+
+    def render(self) -> Dict[str, bytes]:
+        """生成清理和压缩后的样式表.
+
+        Return:
+            样式表的文件名和内容, 不包括无法解码的样式表.
+        """
+        return {name: self._render(nodes).encode('utf-8')
+                for name, nodes in self._stylesheets.items()}
+
+    def close(self):
+        """保存匹配结果的缓存."""
+        if self._connection is not None:
+            self._connection.commit()
+            self._connection.close()
+            self._connection = None
@@ -0,0 +1,172 @@
+import os
+import posixpath
+import sys
+
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple, Union
+from urllib.parse import unquote, urlsplit
+from zipfile import BadZipFile, ZIP_STORED, ZipFile
+
+from lxml import etree
+
+from weread import logger
+
+_CONTAINER_NS = {'c': 'urn:oasis:names:tc:opendocument:xmlns:container'}
+_OPF_NS = {'opf': 'http://www.idpf.org/2007/opf'}
+_NCX_NS = {'ncx': 'http://www.daisy.org/z3986/2005/ncx/'}
+_XHTML_NS = {'x': 'http://www.w3.org/1999/xhtml'}
+
+# 章节中引用其他文件的标签和属性.
+_XHTML_REFERENCES = (('x:img', 'src'), ('x:a', 'href'), ('x:link', 'href'),
+                     ('x:image', '{http://www.w3.org/1999/xlink}href'))
+
+
+def _resolve(base_file: str, href: str) -> Optional[str]:
+    """将相对地址转换成ePub文件中的文件名.
+
+    Args:
+        base_file: str,
+            引用所在的文件.
+        href: str,
+            引用的地址.
+
+    Return:
+        被引用的文件名, 外部链接和当前文件内的锚点返回None.
+    """
+    url = urlsplit(href)
+    if url.scheme or url.netloc or not url.path:
+        return None
+
+    return posixpath.normpath(posixpath.join(posixpath.dirname(base_file),
+                                             unquote(url.path)))
+
+
+def validate_epub(epub_file: Union[str, os.PathLike],
+                  verbose: bool = False,
+                  info: bool = False) -> List[str]:
+    """快速检查ePub文件的结构, 不依赖外部的epubcheck.
+
+    一次顺序读取ePub文件中的全部文件, 解析`container.xml`, `content.opf`,
+    `toc.ncx`和章节xhtml, 收集其中的引用; 最后与ePub文件的文件列表交叉检查:
+    manifest中的文件, spine引用的manifest条目, `toc.ncx`的章节地址,
+    以及章节中`img`, `a`和`link`引用的文件是否存在.
+
+    Args:
+        epub_file: str or os.PathLike,
+            ePub文件.
+        verbose: bool, default=False,
+            是否展示检查的详细信息.
+        info: bool, default=False,
+            是否输出提示信息.
+
+    Return:
+        发现的问题组成的列表, ePub文件结构完整时为空列表.
+    """
+    problems = []
+    names = set()
+    rootfiles = []
+    manifests: Dict[str, Dict[str, Tuple[str, str]]] = {}  # opf: {id: (文件名, 媒体类型)}.  # noqa: E501
+    spines: Dict[str, Tuple[List[str], Optional[str]]] = {}  # opf: (idref列表, ncx的id).  # noqa: E501
+    references: List[Tuple[str, str]] = []  # (引用所在的文件, 被引用的文件).
+
+    try:
+        with ZipFile(epub_file) as epub:
+            file_list = epub.infolist()
+            if (not file_list or file_list[0].filename != 'mimetype' or
+                    file_list[0].compress_type != ZIP_STORED or
+                    epub.read(file_list[0]) != b'application/epub+zip'):
+                problems.append('mimetype必须是第一个未压缩的文件, '
+                                '内容为`application/epub+zip`.')
+
+            for file in file_list:
+                name = file.filename
+                names.add(name)
+                if not name.endswith(('.xml', '.opf', '.ncx', '.xhtml', '.html')):  # noqa: E501
+                    continue
+
+                try:
+                    root = etree.fromstring(epub.read(file))
+                except etree.XMLSyntaxError as err:
+                    problems.append(f'{name} 不是合法的XML: {err}')
+                    continue
+
+                if name == 'META-INF/container.xml':
+                    rootfiles.extend(
+                        rootfile.get('full-path')
+                        for rootfile in root.iterfind('.//c:rootfile', _CONTAINER_NS)  # noqa: E501
+                    )
+                elif name.endswith('.opf'):
+                    manifests[name] = {
+                        item.get('id'): (_resolve(name, item.get('href', '')),
+                                         item.get('media-type'))
+                        for item in root.iterfind('.//opf:manifest/opf:item', _OPF_NS)  # noqa: E501
+                    }
+                    spine = root.find('.//opf:spine', _OPF_NS)
+                    spines[name] = (
+                        [itemref.get('idref') for itemref in root.iterfind('.//opf:spine/opf:itemref', _OPF_NS)],  # noqa: E501
+                        spine.get('toc') if spine is not None else None
+                    )
+                elif name.endswith('.ncx'):
+                    for content in root.iterfind('.//ncx:content', _NCX_NS):
+                        references.append((name, _resolve(name, content.get('src', ''))))  # noqa: E501
+                elif name.endswith(('.xhtml', '.html')):
+                    for tag, attr in _XHTML_REFERENCES:
+                        for node in root.iterfind(f'.//{tag}', _XHTML_NS):
+                            if node.get(attr):
+                                references.append((name, _resolve(name, node.get(attr))))  # noqa: E501
+    except BadZipFile:
+        logger.error('%s 不是一个合法的ePub文件!', Path(epub_file).name)
+        sys.exit(1)
+    except FileNotFoundError:
+        logger.error('请检查你的ePub文件路径, 未找到ePub文件!')
+        sys.exit(1)
+
+    # 检查元数据文件.
+    if not rootfiles:
+        problems.append('META-INF/container.xml 缺失或没有声明元数据文件.')
+    for rootfile in rootfiles:
+        if rootfile not in manifests:
+            problems.append(f'container.xml 声明的元数据文件 {rootfile} 不存在.')
+
+    # 检查manifest和spine.
+    declared: Set[str] = set()
+    for opf, manifest in manifests.items():
+        for item_id, (href, _) in manifest.items():
+            declared.add(href)
+            if href not in names:
+                problems.append(f'{opf} 的manifest条目 {item_id} 指向的文件 {href} 不存在.')  # noqa: E501
+        itemrefs, toc = spines[opf]
+        if not itemrefs:
+            problems.append(f'{opf} 的spine为空.')
+        for idref in itemrefs:
+            if idref not in manifest:
+                problems.append(f'{opf} 的spine引用了不存在的manifest条目 {idref}.')  # noqa: E501
+        if toc is not None and toc not in manifest:
+            problems.append(f'{opf} 的spine引用了不存在的目录 {toc}.')
+
+    # 检查toc.ncx和章节中的引用.
+    for source, target in references:
+        if target is not None and target not in names:
+            problems.append(f'{source} 引用的文件 {target} 不存在.')
+
+    # 检查没有在manifest中声明的文件.
+    if manifests:
+        for name in sorted(names):
+            if (name != 'mimetype' and not name.startswith('META-INF/') and
+                    not name.endswith('/') and name not in manifests and
+                    name not in declared):
+                problems.append(f'文件 {name} 没有在manifest中声明.')
+
+    for problem in problems:
+        logger.warning(problem)
+
+    if verbose:
+        logger.info('检查了%s个文件和%s个引用.', len(names), len(references))
+        logger.info('-' * 50)
+
+    if info and not problems:
+        logger.info('ePub文件的结构完整:)')
+    elif info:
+        logger.info('ePub文件的结构有%s个问题.', len(problems))
+
+    return problems
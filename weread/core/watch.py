@@ -0,0 +1,275 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+
+from concurrent.futures import Future, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple, Union
+from zipfile import BadZipFile, ZipFile
+
+from weread import logger
+from weread.core.check import check
+from weread.core.generate import EpubBuild, generate
+from weread.core.library import _default_output
+
+# inotify的事件, 文件写入完成后关闭或被移动到目录中.
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+# inotify_event的头部: wd, mask, cookie, len.
+_EVENT_HEADER = struct.Struct('iIII')
+
+
+class _Inotify(object):
+    """使用ctypes调用Linux的inotify, 监听目录中写入完成的文件.
+
+    Args:
+        directory: Path,
+            监听的目录.
+
+    Raises:
+        OSError: 当前系统不支持inotify.
+    """
+    def __init__(self, directory: Path):
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+            inotify_init1 = libc.inotify_init1
+            inotify_add_watch = libc.inotify_add_watch
+        except (AttributeError, OSError, TypeError):
+            raise OSError('当前系统不支持inotify.')
+
+        self._fd = inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify初始化失败.')
+        if inotify_add_watch(self._fd,
+                             os.fsencode(directory),
+                             _IN_CLOSE_WRITE | _IN_MOVED_TO) < 0:
+            errno = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(errno, 'inotify监听目录失败.')
+
+    def read(self, timeout: float) -> Set[str]:
+        """等待文件写入完成的事件.
+
+        Args:
+            timeout: float,
+                最长等待时间(秒).
+
+        Return:
+            写入完成的文件名组成的集合, 超时时为空集合.
+        """
+        names = set()
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return names
+
+        data = os.read(self._fd, 64 * 1024)
+        offset = 0
+        while offset < len(data):
+            *_, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            names.add(os.fsdecode(data[offset:offset + length].rstrip(b'\0')))
+            offset += length
+
+        return names
+
+    def close(self):
+        os.close(self._fd)
+
+
+def _scan(directory: Path) -> Dict[Path, Tuple[int, int]]:
+    """查找目录中的原始数据文件.
+
+    Args:
+        directory: Path,
+            监听的目录.
+
+    Return:
+        原始数据文件和对应的(文件大小, 修改时间)组成的字典.
+    """
+    snapshot = {}
+    for rdata_file in directory.glob('*.rdata.zip'):
+        try:
+            stat = rdata_file.stat()
+        except FileNotFoundError:  # 扫描过程中被删除.
+            continue
+        snapshot[rdata_file] = (stat.st_size, stat.st_mtime_ns)
+
+    return snapshot
+
+
+def _is_complete(rdata_file: Path) -> bool:
+    """原始数据文件是否已经写入完成(中央目录可以正常读取).
+
+    Args:
+        rdata_file: Path,
+            原始数据文件.
+
+    Return:
+        是否写入完成.
+    """
+    try:
+        with ZipFile(rdata_file):
+            return True
+    except (BadZipFile, OSError):
+        return False
+
+
+def _build(rdata_file: Path,
+           output_dir: Optional[Path],
+           verbose: bool) -> EpubBuild:
+    """检查原始数据文件并可复现构建ePub文件, ePub文件已经是最新时由`generate`跳过.
+
+    Args:
+        rdata_file: Path,
+            原始数据文件.
+        output_dir: Path or None,
+            ePub文件的保存目录, None表示保存在原始数据文件所在的目录.
+        verbose: bool,
+            是否展示检查和生成的详细信息.
+
+    Return:
+        生成的结果; 原始数据文件不完整时`path`和`digest`为None.
+    """
+    epub_file_path = _default_output(rdata_file, '.epub')
+    if output_dir is not None:
+        epub_file_path = output_dir / epub_file_path.name
+
+    if not check(rdata_file, verbose):
+        return EpubBuild(None, None, False)
+
+    return generate(rdata_file,
+                    verbose,
+                    output=epub_file_path,
+                    deterministic=True,
+                    workers=1)
+
+
+def watch(directory: Union[str, os.PathLike],
+          output_dir: Optional[Union[str, os.PathLike]] = None,
+          workers: Optional[int] = None,
+          interval: float = 2,
+          polling: bool = False,
+          timeout: Optional[float] = None,
+          verbose: bool = False,
+          info: bool = False) -> List[EpubBuild]:
+    """监听目录, 自动检查新的原始数据文件并生成ePub文件.
+
+    优先使用inotify监听写入完成的文件, 不支持时使用轮询: 文件大小和修改时间在一个
+    轮询间隔内没有变化时视为写入完成. 两种方式都要求原始数据文件的中央目录可以正常读取,
+    之后在进程池中依次执行`check`和可复现构建的`generate`;
+    ePub文件的摘要与原始数据文件一致时跳过. 只监听目录本身, 不包括子目录.
+
+    Args:
+        directory: str or os.PathLike,
+            监听的目录.
+        output_dir: str or os.PathLike, default=None,
+            ePub文件的保存目录, 默认保存在原始数据文件所在的目录.
+        workers: int, default=None,
+            进程的数量, 默认为CPU的核心数.
+        interval: float, default=2,
+            轮询的间隔(秒); 使用inotify时为没有事件时的最长等待时间.
+        polling: bool, default=False,
+            是否强制使用轮询.
+        timeout: float, default=None,
+            监听的时长(秒), 默认一直监听直到键盘中断;
+             结束时将等待正在处理的原始数据文件完成.
+        verbose: bool, default=False,
+            是否展示监听和生成的详细信息.
+        info: bool, default=False,
+            是否输出提示信息.
+
+    Return:
+        处理过的原始数据文件的生成结果组成的列表.
+    """
+    directory = Path(directory)
+    if not directory.is_dir():
+        logger.error('请检查你的目录路径, 未找到监听的目录!')
+        sys.exit(1)
+    if output_dir is not None:
+        output_dir = Path(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+    inotify = None
+    if not polling:
+        try:
+            inotify = _Inotify(directory)
+        except OSError as err:
+            if verbose:
+                logger.info('%s 使用轮询监听目录.', err)
+
+    deadline = None if timeout is None else time.monotonic() + timeout
+    seen: Dict[Path, Tuple[int, int]] = {}  # 已经提交处理的文件和对应的状态.
+    previous: Dict[Path, Tuple[int, int]] = {}
+    closed: Set[str] = set()
+    futures: Dict[Future, Path] = {}
+    builds = []
+
+    def _collect(wait_time: Optional[float] = 0):
+        done, _ = wait(futures, wait_time)
+        for future in done:
+            rdata_file = futures.pop(future)
+            try:
+                build = future.result()
+            except (Exception, SystemExit) as err:
+                logger.warning('%s 处理失败: %s', rdata_file.name, err)
+                continue
+
+            builds.append(build)
+            if build.path is None:
+                logger.warning('%s 不完整, 跳过生成.', rdata_file.name)
+            elif verbose and build.skipped:
+                logger.info('%s 已经是最新的, 跳过生成.', build.path.name)
+            elif verbose:
+                logger.info('生成 %s.', build.path.name)
+
+    if verbose:
+        logger.info('开始监听 %s.', directory)
+
+    try:
+        with ProcessPoolExecutor(workers) as executor:
+            while True:
+                snapshot = _scan(directory)
+                for rdata_file, state in snapshot.items():
+                    if seen.get(rdata_file) == state:
+                        continue
+                    if ((rdata_file.name in closed or
+                         previous.get(rdata_file) == state) and
+                            _is_complete(rdata_file)):
+                        seen[rdata_file] = state
+                        future = executor.submit(_build,
+                                                 rdata_file,
+                                                 output_dir,
+                                                 verbose)
+                        futures[future] = rdata_file
+                previous = snapshot
+                closed.clear()
+                _collect()
+
+                wait_time = interval
+                if deadline is not None:
+                    wait_time = min(wait_time, deadline - time.monotonic())
+                    if wait_time <= 0:
+                        break
+                if inotify is not None:
+                    closed.update(inotify.read(wait_time))
+                else:
+                    time.sleep(wait_time)
+
+            _collect(None)
+    finally:
+        if inotify is not None:
+            inotify.close()
+
+    if verbose:
+        logger.info('-' * 50)
+
+    if info:
+        generated = sum(build.path is not None and not build.skipped
+                        for build in builds)
+        logger.info('监听结束:) 生成%s本, 跳过%s本.', generated, len(builds) - generated)
+
+    return builds
@@ -0,0 +1,144 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import sys
+
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional, TextIO, Union
+
+# 工具使用的logger, 不修改root logger; 没有配置时警告和错误仍然会输出到标准错误.
+logger = logging.getLogger('weread')
+
+# LogRecord的标准属性, JSON Lines格式只额外输出通过`extra`传入的字段.
+_RECORD_ATTRS = frozenset(vars(logging.makeLogRecord({}))) | {'message'}
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """将日志格式化为JSON Lines, 每条日志一行, 便于日志系统解析.
+
+    每条日志包含时间戳`time`, 级别`level`, logger的名称`logger`, 日志内容`message`,
+    距离日志系统启动的时间`elapsed`(秒), 距离上一条日志的时间`duration`(秒),
+    以及通过`extra`传入的字段.
+    """
+    def __init__(self):
+        super().__init__()
+        self._last_created: Optional[float] = None
+
+    def format(self, record: logging.LogRecord) -> str:
+        previous, self._last_created = self._last_created, record.created
+        event = {
+            'time': round(record.created, 6),
+            'level': record.levelname.lower(),
+            'logger': record.name,
+            'message': record.getMessage(),
+            'elapsed': round(record.relativeCreated / 1000, 6),
+            'duration': round(record.created - previous, 6) if previous else 0.0,  # noqa: E501
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                event[key] = value
+        if record.exc_info:
+            event['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            event['exception'] = record.exc_text
+
+        return json.dumps(event, ensure_ascii=False, default=str)
+
+
+class _QueueHandler(QueueHandler):
+    """将日志放入队列, 由后台线程格式化和输出, 不阻塞调用日志的线程.
+
+    进程池中的子进程(fork)没有后台线程, 在子进程中直接使用目标handler输出.
+
+    Args:
+        log_queue: queue.SimpleQueue,
+            日志队列.
+        handler: logging.Handler,
+            实际输出日志的handler.
+    """
+    def __init__(self, log_queue: queue.SimpleQueue, handler: logging.Handler):
+        super().__init__(log_queue)
+        self._handler = handler
+        self._pid = os.getpid()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # 只合并日志的参数, 格式化留给后台线程.
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)  # noqa: E501
+            record.exc_info = None
+
+        return record
+
+    def emit(self, record: logging.LogRecord):
+        if os.getpid() != self._pid:
+            self._handler.handle(record)
+        else:
+            super().emit(record)
+
+
+_listener: Optional[QueueListener] = None
+_handler: Optional[logging.Handler] = None
+
+
+def setup_logging(level: Union[int, str] = logging.INFO,
+                  json_lines: bool = False,
+                  stream: Optional[TextIO] = None) -> QueueListener:
+    """配置工具的logger, 日志由后台线程异步输出.
+
+    只配置`weread` logger(不再传递给root logger), 不影响调用方自己的日志配置;
+    重复调用时将替换之前的配置.
+
+    Example:
+        ```python
+        setup_logging(json_lines=True)
+        generate('怦然心动.rdata.zip', verbose=True)
+        ```
+
+    Args:
+        level: int or str, default=logging.INFO,
+            logger输出的级别.
+        json_lines: bool, default=False,
+            是否使用JSON Lines格式输出日志, 默认只输出日志内容.
+        stream: TextIO, default=None,
+            输出日志的文本流, 默认为标准错误.
+
+    Return:
+        后台输出日志的QueueListener, 程序退出时将自动停止并输出剩余的日志.
+    """
+    global _listener, _handler
+    shutdown_logging()
+
+    handler = logging.StreamHandler(stream or sys.stderr)
+    if json_lines:
+        handler.setFormatter(JsonLinesFormatter())
+    else:
+        handler.setFormatter(logging.Formatter('%(message)s'))
+
+    log_queue = queue.SimpleQueue()
+    _handler = _QueueHandler(log_queue, handler)
+    _listener = QueueListener(log_queue, handler)
+    _listener.start()
+
+    logger.addHandler(_handler)
+    logger.setLevel(level.upper() if isinstance(level, str) else level)
+    logger.propagate = False
+
+    return _listener
+
+
+def shutdown_logging():
+    """停止后台线程并输出队列中剩余的日志, 恢复logger的默认配置."""
+    global _listener, _handler
+    if _listener is not None:
+        _listener.stop()
+        logger.removeHandler(_handler)
+        logger.setLevel(logging.NOTSET)
+        logger.propagate = True
+        _listener = _handler = None
+
+
+atexit.register(shutdown_logging)